@@ -0,0 +1,9 @@
+#!/bin/sh
+# Runs the API with the configuration of APP_MODE: a single autoreloading worker for development,
+# or the pools of workers of uwsgi.prod.ini in production.
+if [ "$APP_MODE" = "prod" ]
+then
+    cp /app/conf/nginx.prod.conf /etc/nginx/conf.d/nginx.conf
+    exec /usr/bin/supervisord -c /app/conf/supervisord.prod.conf
+fi
+exec /usr/bin/supervisord
@@ -33,6 +33,9 @@ def create_app(config_name):
     from .api import restful_api
     restful_api.init_app(app)
 
+    from . import commands
+    commands.init_app(app)
+
     # TODO: create a blueprint that handles errors
     from .utils import general as er
     app.register_error_handler(er.CustomException, lambda e: er.custom_response(e.status_code, e.data, e.errors))
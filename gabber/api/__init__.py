@@ -8,19 +8,31 @@ from .projects import Projects
 from .project import Project
 from .membership import ProjectMembership, ProjectInvites, ProjectInviteVerification
 from .sessions import ProjectSessions, Recommendations
+from .uploads import ProjectSessionUploads, ProjectSessionUpload
 from .session import ProjectSession
+from .waveform import SessionWaveform
+from .events import SessionEvents
+from .batch import Batch
+from .timeline import SessionTimeline
+from .export import ProjectExports, ProjectExport
+from .codebook import CodebookStats
 from .consent import SessionConsent
 from .annotations import UserAnnotations, UserAnnotation
 from .comments import Comments, Comment, CommentsReplies
 from .auth import TokenRefresh, UserRegistration, UserLogin, ForgotPassword, ResetPassword, UserAsMe
 from .auth import VerifyRegistration
 from .misc import SearchImages
+from .transcode import TranscodeNotifications
 
 restful_api.add_resource(SearchImages, '/api/misc/photos/')
+restful_api.add_resource(TranscodeNotifications, '/api/transcode/notifications/')
 restful_api.add_resource(SupportedLanguages, '/api/help/languages/')
 restful_api.add_resource(TokenForUser, '/api/fcm/')
 restful_api.add_resource(Projects, '/api/projects/')
 restful_api.add_resource(Project, '/api/projects/<int:pid>/')
+restful_api.add_resource(ProjectExports, '/api/projects/<int:pid>/export/')
+restful_api.add_resource(ProjectExport, '/api/projects/<int:pid>/export/<string:eid>/')
+restful_api.add_resource(CodebookStats, '/api/projects/<int:pid>/codebook/stats/')
 restful_api.add_resource(ProjectMembership, '/api/projects/<int:pid>/membership/')
 restful_api.add_resource(ProjectInvites,
                          '/api/projects/<int:pid>/membership/invites/',
@@ -28,7 +40,13 @@ restful_api.add_resource(ProjectInvites,
 restful_api.add_resource(ProjectInviteVerification, '/api/projects/invites/<token>/')
 restful_api.add_resource(Recommendations, '/api/sessions/recommendations/')
 restful_api.add_resource(ProjectSessions, '/api/projects/<int:pid>/sessions/')
+restful_api.add_resource(ProjectSessionUploads, '/api/projects/<int:pid>/sessions/uploads/')
+restful_api.add_resource(ProjectSessionUpload, '/api/projects/<int:pid>/sessions/uploads/<int:uid>/')
 restful_api.add_resource(ProjectSession, '/api/projects/<int:pid>/sessions/<string:sid>/')
+restful_api.add_resource(SessionWaveform, '/api/projects/<int:pid>/sessions/<string:sid>/waveform/')
+restful_api.add_resource(SessionEvents, '/api/projects/<int:pid>/sessions/<string:sid>/events/')
+restful_api.add_resource(Batch, '/api/batch/')
+restful_api.add_resource(SessionTimeline, '/api/projects/<int:pid>/sessions/<string:sid>/timeline/')
 restful_api.add_resource(SessionConsent, '/api/consent/<string:token>/')
 restful_api.add_resource(UserAnnotations, '/api/projects/<int:pid>/sessions/<string:sid>/annotations/')
 restful_api.add_resource(UserAnnotation, '/api/projects/<int:pid>/sessions/<string:sid>/annotations/<int:aid>/')
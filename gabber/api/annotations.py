@@ -5,12 +5,14 @@ All annotations for a session
 from .. import db
 from ..utils.general import custom_response
 from ..utils.fcm import fcm
+from ..utils import events
 from ..api.schemas.annotations import UserAnnotationSchema
-from ..models.projects import Connection as UserAnnotationModel, Code as Tags, Project, InterviewSession
-from ..models.user import User
+from ..api.schemas import compiled
+from ..models.projects import Connection as UserAnnotationModel, Code as Tags, Project, InterviewSession, \
+    SessionEvent, update_counter, update_maximum
 from flask import request
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, jwt_optional, get_jwt_identity
+from flask_jwt_extended import jwt_required, jwt_optional
 import gabber.utils.helpers as helpers
 
 
@@ -21,12 +23,17 @@ class UserAnnotations(Resource):
     @jwt_optional
     def get(self, pid, sid):
         """
-        Returns a list of all annotations for an existing session
+        Returns a list of all annotations for an existing session, or those that overlap
+        a time range (in seconds) of the recording, e.g. /?start=60&end=120
         """
         helpers.abort_if_invalid_parameters(pid, sid)
         project = Project.query.get(pid)
-        annotations = UserAnnotationModel.query.filter_by(session_id=sid).all()
-        annotations = UserAnnotationSchema(many=True).dump(annotations)
+        start = request.args.get('start', None, type=int)
+        end = request.args.get('end', None, type=int)
+        if (start is not None and start < 0) or (end is not None and end < (start or 0)):
+            return custom_response(400, errors=['annotations.INVALID_RANGE'])
+        annotations = UserAnnotationModel.overlapping(InterviewSession.query.get(sid), start, end).all()
+        annotations = compiled.user_annotations.dump(annotations, many=True)
         if project.is_public:
             return custom_response(200, data=annotations)
         helpers.abort_if_unauthorized(project)
@@ -47,7 +54,7 @@ class UserAnnotations(Resource):
         schema = UserAnnotationSchema()
         helpers.abort_if_errors_in_validation(errors=schema.validate(json_data))
 
-        user = User.query.filter_by(email=get_jwt_identity()).first()
+        user = helpers.current_user()
         user_annotation = UserAnnotationModel(
             content=json_data['content'],
             start_interval=json_data['start_interval'],
@@ -59,6 +66,12 @@ class UserAnnotations(Resource):
         if json_data.get('tags', None):
             user_annotation.tags.extend([Tags.query.filter_by(id=cid).first() for cid in json_data['tags']])
         db.session.add(user_annotation)
+        update_counter(InterviewSession.num_annotations, sid)
+        update_maximum(InterviewSession.max_annotation_length, sid,
+                       user_annotation.end_interval - user_annotation.start_interval)
+        # The annotation is written first so that the event has its ID
+        db.session.flush()
+        events.publish(sid, SessionEvent.ANNOTATION_CREATED, compiled.user_annotations.dump(user_annotation))
         db.session.commit()
 
         InterviewSession.email_participants(user, sid)
@@ -83,7 +96,10 @@ class UserAnnotation(Resource):
         helpers.abort_if_unknown_annotation(annotation)
         helpers.abort_if_not_user_made(user.id, annotation.user_id)
 
-        UserAnnotationModel.query.filter_by(id=aid).update({'is_active': 0})
+        # The soft-delete query only matches active annotations, hence the counter is only decremented once
+        if UserAnnotationModel.query.filter_by(id=aid).update({'is_active': 0}):
+            update_counter(InterviewSession.num_annotations, annotation.session_id, -1)
+            events.publish(annotation.session_id, SessionEvent.ANNOTATION_DELETED, {'id': aid})
         db.session.commit()
 
         return custom_response(200)
@@ -2,7 +2,7 @@
 """
 JWT configuration and authentication (registration, login and logout).
 """
-from .. import db
+from .. import db, jwt
 from ..api.schemas.auth import AuthRegisterSchema, AuthLoginSchema, \
     ResetPasswordSchema, ForgotPasswordSchema, UserSchemaHasAccess
 from ..models.user import User, ResetTokens
@@ -16,6 +16,18 @@ from flask_jwt_extended import create_access_token, \
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 
 
+@jwt.user_claims_loader
+def membership_claims(identity):
+    """
+    Optionally embeds the membership claims of the user in access tokens
+    created at login, registration, verification and refresh.
+    """
+    if not app.config['JWT_MEMBERSHIP_CLAIMS']:
+        return {}
+    user = User.query.filter_by(email=identity).first()
+    return user.membership_claims() if user else {}
+
+
 def invalidate_other_user_tokens(email):
     """
     Once a request has been made to reset the password or the password was updated,
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Several requests of the API in one, e.g. the project, session, annotations and replies a session page shows
+"""
+from .. import db
+from ..utils.general import custom_response
+from flask import current_app, g, request
+from flask_restful import Resource
+import gabber.utils.helpers as helpers
+import json
+
+METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+# Headers of the batch that are passed on to each request
+HEADERS = ['Authorization', 'Accept-Language']
+
+
+def parse(sub_request):
+    """
+    :return: a tuple of the method, path and body of a request of the batch, or None if it is invalid.
+    """
+    if not isinstance(sub_request, dict):
+        return None
+    method, path = str(sub_request.get('method', 'GET')).upper(), sub_request.get('path')
+    # Strings are decoded from JSON as unicode, and batches cannot be nested
+    if method not in METHODS or not isinstance(path, type(u'')) or not path.startswith('/api/') or \
+            path.startswith('/api/batch/'):
+        return None
+    return method, path, sub_request.get('body')
+
+
+def body(response):
+    return json.loads(response.get_data(as_text=True))
+
+
+def dispatch(method, path, data):
+    """
+    Runs a request of the batch within the application context of the batch, hence requests share the
+    database session (and the rows it has loaded), the user (see helpers.current_user) and their memberships.
+
+    :return: a tuple of the status code and the JSON body of the response
+    """
+    headers = [(name, request.headers[name]) for name in HEADERS if name in request.headers]
+    data = json.dumps(data) if data is not None else None
+    with current_app.test_request_context(path, method=method, headers=headers, data=data,
+                                          content_type='application/json',
+                                          environ_base={'REMOTE_ADDR': request.remote_addr}):
+        try:
+            response = current_app.full_dispatch_request()
+        except Exception:
+            current_app.logger.exception('Request %s %s of a batch failed', method, path)
+            response = custom_response(500, errors=['batch.REQUEST_FAILED'])
+        # e.g. streams of events and exports, which cannot be part of the body of the batch
+        if response.mimetype != 'application/json':
+            response.close()
+            response = custom_response(400, errors=['batch.UNSUPPORTED_REQUEST'])
+        status, data = response.status_code, body(response)
+
+    # Changes of a request that failed are not committed by the requests after it
+    if status >= 400:
+        db.session.rollback()
+    # Memberships are read again after a request that may have changed them
+    if method != 'GET':
+        g.batch_memberships = {}
+    return status, data
+
+
+class Batch(Resource):
+    """
+    Mapped to: /api/batch/
+    """
+    def post(self):
+        """
+        Runs requests of the API in order, e.g.
+
+            {"requests": [{"method": "GET", "path": "/api/projects/1/"},
+                          {"method": "POST", "path": "/api/projects/1/sessions/<sid>/annotations/", "body": {...}}]}
+
+        Each request is run as if it were sent with the Authorization header of the batch, and does not
+        stop the requests after it when it fails. At most BATCH_MAX_REQUESTS requests can be sent.
+
+        :return: the status and body of the response of each request, in the order of the requests.
+        """
+        json_data = helpers.jsonify_request_or_abort()
+        requests = json_data.get('requests') if isinstance(json_data, dict) else None
+        if not isinstance(requests, list) or not requests:
+            return custom_response(400, errors=['batch.INVALID_REQUESTS'])
+        if len(requests) > current_app.config['BATCH_MAX_REQUESTS']:
+            return custom_response(400, errors=['batch.TOO_MANY_REQUESTS'])
+
+        g.batch_memberships = {}
+        responses = []
+        for sub_request in requests:
+            parsed = parse(sub_request)
+            if parsed:
+                status, data = dispatch(*parsed)
+            else:
+                status, data = 400, body(custom_response(400, errors=['batch.INVALID_REQUEST']))
+            responses.append({'status': status, 'body': data})
+        return custom_response(200, data=responses)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Analytics of how the codes of a project's codebook are used to tag annotations (see utils/analytics.py)
+"""
+from ..models.projects import Project
+from ..models.user import User
+from ..utils import analytics
+from ..utils.general import custom_response
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import gabber.utils.helpers as helpers
+
+
+class CodebookStats(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/codebook/stats/
+    """
+    @jwt_required
+    def get(self, pid):
+        """
+        The use of each code across the annotations of all sessions of the project:
+
+            annotations: the number of tagged annotations
+            codes: each code with the number of annotations tagged with it
+            sessions: for each session with tagged annotations, the counts of each code (ordered as codes)
+            cooccurrence: the number of annotations tagged with both codes, for each pair of codes
+
+        As these aggregate over all sessions, only administrators and researchers can view them.
+        """
+        project = Project.query.get(pid)
+        helpers.abort_if_unknown_project(project)
+        user = User.query.filter_by(email=get_jwt_identity()).first()
+        helpers.abort_if_unknown_user(user)
+        helpers.abort_if_not_admin_or_staff(user, pid, action='codebook.STATS')
+        return custom_response(200, data=analytics.codebook_stats(pid))
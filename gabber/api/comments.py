@@ -4,12 +4,15 @@ READ a list of the comments for an annotation or CREATE a new comment.
 """
 from .. import db
 from ..api.schemas.annotations import UserAnnotationCommentSchema
-from ..models.projects import ConnectionComments as CommentsModel, Project, InterviewSession, Connection as RootComment
+from ..api.schemas import compiled
+from ..models.projects import ConnectionComments as CommentsModel, Project, InterviewSession, Connection as RootComment, \
+    SessionEvent, update_counter
 from ..models.user import User
 from ..utils.general import custom_response
 from ..utils.fcm import fcm
+from ..utils import events
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, jwt_optional, get_jwt_identity
+from flask_jwt_extended import jwt_required, jwt_optional
 import gabber.utils.helpers as helpers
 
 
@@ -30,6 +33,10 @@ def create_comment(project_id, session_id, annotation_id, comment_id=None):
     # Note: comment_id can be null, which represents that it is a parent
     comment = CommentsModel(data['content'], comment_id, user.id, annotation_id)
     db.session.add(comment)
+    update_counter(RootComment.num_comments, annotation_id)
+    # The comment is written first so that the event has its ID
+    db.session.flush()
+    events.publish(session_id, SessionEvent.COMMENT_CREATED, compiled.user_annotation_comments.dump(comment))
     db.session.commit()
 
     # Determine which type of comment the response is to: nested or a root comment
@@ -78,10 +85,10 @@ class CommentsReplies(Resource):
         project = Project.query.get(pid)
 
         if not project.is_public:
-            user = User.query.filter_by(email=get_jwt_identity()).first()
+            user = helpers.current_user()
             helpers.abort_if_not_a_member_and_private(user, project)
         children = CommentsModel.query.filter_by(parent_id=cid).all()
-        return custom_response(200, data=UserAnnotationCommentSchema(many=True).dump(children))
+        return custom_response(200, data=compiled.user_annotation_comments.dump(children, many=True))
 
 
 class Comment(Resource):
@@ -107,6 +114,8 @@ class Comment(Resource):
         helpers.abort_if_unknown_comment(cid, aid)
         comment = CommentsModel.query.filter_by(id=cid)
         helpers.abort_if_not_user_made_comment(user.id, comment.first().user_id)
-        comment.update({'is_active': False})
+        if comment.filter_by(is_active=True).update({'is_active': False}):
+            update_counter(RootComment.num_comments, aid, -1)
+            events.publish(sid, SessionEvent.COMMENT_DELETED, {'id': cid, 'annotation_id': aid})
         db.session.commit()
         return custom_response(200)
@@ -43,7 +43,10 @@ class SessionConsent(Resource):
         data = helpers.jsonify_request_or_abort()
         helpers.abort_if_errors_in_validation(ConsentType().validate(data))
         consent = SessionConsentModel.query.get(consent_id)
+        # Locked before the consent changes so that concurrent changes of a session's consents are serialized
+        session = InterviewSession.query.with_for_update().filter_by(id=consent.session_id).one()
         consent.type = data['consent']
+        session.update_visibility()
         db.session.commit()
         return custom_response(200)
 
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+A stream of the annotations and comments created or deleted on a session (see utils/events.py)
+"""
+from ..models.projects import Project
+from ..utils import events
+from ..utils.general import custom_response
+from flask import current_app, request, Response
+from flask_restful import Resource
+from flask_jwt_extended import jwt_optional
+import gabber.utils.helpers as helpers
+import time
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+
+def stream(relay, subscription, replayed, heartbeat, lifetime):
+    """
+    The events of the stream as bytes: those replayed, then those the relay queues for the subscription.
+    Runs after the request has ended, hence does not use the database or the application context.
+    """
+    try:
+        # Clients reconnect after this time (milliseconds) once the stream ends
+        yield b'retry: 3000\n\n'
+        for event in replayed:
+            yield events.format_event(*event)
+        end = time.time() + lifetime
+        while time.time() < end and not subscription.overflowed:
+            try:
+                event = subscription.queue.get(timeout=min(heartbeat, max(end - time.time(), 0)))
+            except Empty:
+                # A comment, which keeps proxies from closing an idle stream and detects closed clients
+                yield b': heartbeat\n\n'
+                continue
+            yield events.format_event(*event)
+    finally:
+        relay.unsubscribe(subscription)
+
+
+class SessionEvents(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/sessions/<string:sid>/events/
+
+    Note: this is a stream of server-sent events (text/event-stream), and the ID of the last event
+    received can be set as a query parameter for clients that cannot set headers, i.e. /?last_event_id=42
+    """
+    @jwt_optional
+    def get(self, pid, sid):
+        """
+        Streams events as they are committed, where the data of each is JSON:
+
+            annotation.created: the annotation, as returned by UserAnnotations.get
+            annotation.deleted: {"id": <annotation>}
+            comment.created: the comment, as returned by CommentsReplies.get
+            comment.deleted: {"id": <comment>, "annotation_id": <annotation>}
+            reset: sent once to a client that missed too many events, which should fetch the annotations again
+
+        The stream ends after EVENTS_STREAM_LIFETIME, or once the client is too far behind, after which
+        clients reconnect with the ID of the last event they received (Last-Event-ID) to replay missed events.
+        """
+        helpers.abort_if_invalid_parameters(pid, sid)
+        project = Project.query.get(pid)
+        if not project.is_public:
+            helpers.abort_if_unauthorized(project)
+
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return custom_response(400, errors=['events.INVALID_LAST_EVENT_ID'])
+
+        relay = events.relay(current_app._get_current_object())
+        subscription = relay.subscribe(sid, events.max_streams(current_app), last_event_id)
+        if not subscription:
+            response = custom_response(503, errors=['events.TOO_MANY_STREAMS'])
+            response.headers['Retry-After'] = str(current_app.config['EVENTS_HEARTBEAT'])
+            return response
+
+        # Events up to the cursor of the subscription are replayed here, and all after are queued by the relay
+        replayed = []
+        if last_event_id is not None:
+            try:
+                missed = events.since(sid, last_event_id, subscription.cursor, subscription.late)
+            except Exception:
+                relay.unsubscribe(subscription)
+                raise
+            if missed is None:
+                replayed = [(subscription.cursor, 'reset', '{}')]
+            else:
+                replayed = [(event.id, event.type, event.data) for event in missed]
+
+        response = Response(stream(
+            relay, subscription, replayed,
+            current_app.config['EVENTS_HEARTBEAT'], current_app.config['EVENTS_STREAM_LIFETIME']
+        ), mimetype='text/event-stream')
+        # The stream is not started if the client disconnects first, which would otherwise keep the subscription
+        response.call_on_close(lambda: relay.unsubscribe(subscription))
+        response.headers['Cache-Control'] = 'no-cache'
+        # Otherwise nginx buffers events until its buffer is full
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of the sessions, annotations and comments of a project (see utils/export.py)
+"""
+from .. import db
+from ..models.projects import Project, ProjectExport as ProjectExportModel
+from ..models.user import User
+from ..utils import export
+from ..utils.general import custom_response, CustomException
+from flask import current_app, request, send_file, stream_with_context, Response
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from tempfile import TemporaryFile
+from uuid import uuid4
+import gabber.utils.helpers as helpers
+import threading
+import time
+
+
+def run_export(app, export_id):
+    """
+    Writes an export to a temporary file and uploads it to S3; run in a background thread.
+    """
+    from ..utils import amazon
+    last_heartbeat = [time.time()]
+
+    def heartbeat():
+        if time.time() - last_heartbeat[0] < ProjectExportModel.HEARTBEAT.total_seconds():
+            return
+        last_heartbeat[0] = time.time()
+        ProjectExportModel.query.filter_by(id=export_id, status=ProjectExportModel.PENDING).update(
+            {'updated_on': db.func.now()}, synchronize_session=False)
+        db.session.commit()
+
+    with app.app_context():
+        job = ProjectExportModel.query.get(export_id)
+        project, user = Project.query.get(job.project_id), User.query.get(job.user_id)
+        extension = export.FORMATS[job.format][1]
+        try:
+            with TemporaryFile() as output:
+                export.write(export.records(project, user, heartbeat=heartbeat), output, job.format)
+                output.seek(0)
+                amazon.upload_export(output, project.id, export_id, extension)
+            status = ProjectExportModel.COMPLETE
+        except Exception:
+            app.logger.exception('Exporting project %s (%s) failed', project.id, export_id)
+            db.session.rollback()
+            status = ProjectExportModel.ERROR
+        # The rows that were exported (including the job) are expunged, hence update by ID. Exports that were
+        # reported as failed (see ProjectExport.get) are not changed, as the client may have requested another
+        ProjectExportModel.query.filter_by(id=export_id, status=ProjectExportModel.PENDING).update({'status': status})
+        db.session.commit()
+
+
+def abort_if_unknown_format(export_format):
+    if export_format not in export.FORMATS:
+        raise CustomException(400, errors=['export.UNSUPPORTED_FORMAT'])
+
+
+class ProjectExports(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/export/
+
+    Note: the format can be set as a query parameter, i.e. /?format=ndjson (default) or /?format=csv
+    """
+    @staticmethod
+    def __user_and_project(pid):
+        project = Project.query.get(pid)
+        helpers.abort_if_unknown_project(project)
+        user = User.query.filter_by(email=get_jwt_identity()).first()
+        helpers.abort_if_unknown_user(user)
+        helpers.abort_if_not_a_member_and_private(user, project)
+        return user, project
+
+    @jwt_required
+    def get(self, pid):
+        """
+        Streams the sessions of the project that the user can view, with their prompts, participants,
+        consents, annotations and comments, as NDJSON or a zip of CSV files.
+        """
+        user, project = self.__user_and_project(pid)
+        export_format = request.args.get('format', 'ndjson')
+        abort_if_unknown_format(export_format)
+        mimetype, extension = export.FORMATS[export_format]
+        filename = 'gabber-project-{}.{}'.format(pid, extension)
+
+        rows = export.records(project, user)
+        if export_format == 'ndjson':
+            response = Response(stream_with_context(export.ndjson(rows)), mimetype=mimetype)
+            response.headers['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+            return response
+        # A zip archive cannot be streamed as it is written, hence it is written to disk first
+        output = TemporaryFile()
+        export.write(rows, output, export_format)
+        output.seek(0)
+        return send_file(output, mimetype=mimetype, as_attachment=True, attachment_filename=filename)
+
+    @jwt_required
+    def post(self, pid):
+        """
+        Exports the project in the background to S3, for projects too large to export within a request.
+        The status (and URL once complete) of the export is available at the URL of its ID.
+        """
+        user, project = self.__user_and_project(pid)
+        export_format = request.args.get('format', 'ndjson')
+        abort_if_unknown_format(export_format)
+
+        job = ProjectExportModel(id=uuid4().hex, project_id=project.id, user_id=user.id, format=export_format)
+        db.session.add(job)
+        db.session.commit()
+
+        thread = threading.Thread(target=run_export, args=(current_app._get_current_object(), job.id))
+        thread.daemon = True
+        thread.start()
+        return custom_response(202, data={'id': job.id, 'status': job.status, 'format': job.format})
+
+
+class ProjectExport(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/export/<string:eid>/
+    """
+    @jwt_required
+    def get(self, pid, eid):
+        """
+        The status of a background export, which includes a temporary URL to download it once complete.
+        Exports without a heartbeat for ProjectExport.STALE failed, e.g. as the worker was recycled, and
+        can be requested again.
+        """
+        user = User.query.filter_by(email=get_jwt_identity()).first()
+        helpers.abort_if_unknown_user(user)
+        job = ProjectExportModel.query.get(eid)
+        # Exports are only visible to the user who requested them
+        if not job or job.project_id != pid or job.user_id != user.id:
+            return custom_response(404, errors=['export.UNKNOWN_EXPORT'])
+        if job.is_stale():
+            # Unless the export had a heartbeat since it was read
+            ProjectExportModel.query.filter_by(
+                id=job.id, status=ProjectExportModel.PENDING, updated_on=job.updated_on
+            ).update({'status': ProjectExportModel.ERROR}, synchronize_session=False)
+            db.session.commit()
+            db.session.refresh(job)
+
+        data = {'id': job.id, 'status': job.status, 'format': job.format}
+        if job.status == ProjectExportModel.COMPLETE:
+            from ..utils import amazon
+            data['url'] = amazon.signed_export_url(pid, job.id, export.FORMATS[job.format][1])
+        return custom_response(200, data=data)
@@ -3,9 +3,43 @@
 Uses an external API (unsplash) to search for images to use to represent a project
 """
 from ..utils.general import custom_response
-from flask import request
+from ..utils import cache, clients
+from flask import request, current_app as app
 from flask_restful import Resource
-from pyunsplash import PyUnsplash
+
+
+def normalize(query):
+    """
+    Queries that differ only by case or whitespace share the same results (and cache entry).
+    """
+    return ' '.join(query.lower().split())
+
+
+def search_photos(query):
+    """
+    Searches Unsplash for photos that match the query.
+
+    :return: a list of thumbnail URLs
+    :raises: requests.RequestException if the API is unavailable, slow or the rate limit is exceeded.
+    """
+    import requests
+    session = clients.get('unsplash', requests.Session)
+    response = session.get(
+        app.config['PHOTOS_API_URL'].rstrip('/') + '/search/photos',
+        params={'query': query},
+        headers={'Authorization': 'Client-ID {}'.format(app.config['PHOTOS_API_KEY'])},
+        timeout=app.config['PHOTOS_API_TIMEOUT']
+    )
+    response.raise_for_status()
+    return [photo['urls']['thumb'] for photo in response.json()['results']]
+
+
+def photos_cache():
+    return clients.get('unsplash_cache', lambda: cache.Cache(
+        ttl=app.config['PHOTOS_CACHE_TTL'],
+        max_size=app.config['PHOTOS_CACHE_SIZE'],
+        wait_timeout=app.config['PHOTOS_API_TIMEOUT']
+    ))
 
 
 class SearchImages(Resource):
@@ -18,14 +52,13 @@ class SearchImages(Resource):
         """
         Retrieves a list of thumbnails
         """
-        from flask import current_app as app
-        query = request.args.get('query', None)
+        query = normalize(request.args.get('query', ''))
 
         if query:
-            pu = PyUnsplash(api_key=app.config['PHOTOS_API_KEY'])
-            search = pu.search(type_='photos', query=query)
-            thumbnails = [photo.body['urls']['thumb'] for photo in list(search.entries)]
+            try:
+                thumbnails = photos_cache().get(query, lambda: search_photos(query))
+            except Exception:
+                app.logger.exception('Searching photos for "%s" failed', query)
+                return custom_response(503, errors=['general.PHOTOS_UNAVAILABLE'])
             return custom_response(200, data={'thumbnails': thumbnails})
         return custom_response(500, errors=['general.NO_PHOTOS'])
-
-
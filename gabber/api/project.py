@@ -4,19 +4,80 @@ Content for all projects that a user has access to
 """
 from .. import db
 from ..models.user import User
-from ..models.projects import Project as ProjectModel, TopicLanguage, Code, Codebook
-from ..utils.general import custom_response
-from ..api.schemas.project import ProjectModelSchema, ProjectLanguageSchema, \
-    TopicLanguageSchema, CodebookSchema, TagsSchema
+from ..models.projects import Project as ProjectModel, ProjectLanguage, TopicLanguage, Code, Codebook
+from ..models.language import SupportedLanguage
+from ..utils.general import custom_response, CustomException
+from ..api.schemas.project import ProjectModelSchema, CodebookSchema
+from ..api.schemas import compiled
+from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity, jwt_optional
 from gabber.utils import helpers
 from slugify import slugify
 
 
+def dump_options():
+    """
+    The fields (e.g. /?fields=content,image) and the languages of the content (e.g. /?lang=en,it) of projects
+    requested, as arguments of compiled.projects.dump; all fields and languages are returned by default.
+    The ID of projects is always returned, and only the relations of the requested fields are read.
+    """
+    options = {}
+    fields = request.args.get('fields')
+    if fields is not None:
+        only = set(field for field in fields.split(',') if field)
+        if not only <= compiled.projects.keys:
+            raise CustomException(400, errors=['projects.INVALID_FIELDS'])
+        options['only'] = only | {'id'}
+    codes = request.args.get('lang')
+    if codes is not None:
+        codes = set(code for code in codes.split(',') if code)
+        languages = SupportedLanguage.query.filter(SupportedLanguage.code.in_(codes)).all() if codes else []
+        if not codes or len(languages) != len(codes):
+            raise CustomException(400, errors=['projects.UNSUPPORTED_LANGUAGE'])
+        options['lang_ids'] = [language.id for language in languages]
+    return options
+
+
+def bulk_upsert(model, existing, items, fields, new=None, insert=None, unknown='projects.ID_NOT_PROJECT'):
+    """
+    Applies the difference between rows and items sent by a client: items without an ID are inserted, and the
+    fields of the rows of the other items are updated where they changed (e.g. is_active of soft-deleted rows).
+    Rows are read by the caller in one query, and written with one statement per kind of change.
+
+    :param model: the model of the rows, e.g. Code
+    :param existing: the rows by ID that items can update, e.g. the codes of a codebook
+    :param items: dictionaries of the fields of rows
+    :param fields: the fields that items can update
+    :param new: the fields of each inserted row, e.g. its codebook
+    :param insert: the fields of items that are inserted
+    :param unknown: the error if an item has the ID of a row that is not in existing
+    """
+    inserts, updates = [], {}
+    for item in items:
+        if not item.get('id'):
+            row = dict(new or {})
+            row.update((field, item[field]) for field in insert or [] if field in item)
+            inserts.append(row)
+            continue
+        row = existing.get(item['id'])
+        if row is None:
+            raise CustomException(400, errors=[unknown])
+        changes = dict((field, item[field]) for field in fields if field in item and item[field] != getattr(row, field))
+        if changes:
+            # Rows are updated by the fields that changed, as each set of fields is one statement
+            updates.setdefault(tuple(sorted(changes)), []).append(dict(changes, id=item['id']))
+    if inserts:
+        db.session.bulk_insert_mappings(model, inserts)
+    for mappings in updates.values():
+        db.session.bulk_update_mappings(model, mappings)
+
+
 class Project(Resource):
     """
     Mapped to: /api/projects/<pid>/
+
+    Note: the fields and languages of the project can be set as query parameters (see dump_options)
     """
     @jwt_optional
     def get(self, pid):
@@ -29,16 +90,17 @@ class Project(Resource):
         helpers.abort_on_unknown_project_id(pid)
         project = ProjectModel.query.filter_by(id=pid).first()
         helpers.abort_if_unknown_project(project)
+        options = dump_options()
 
         if project.is_public:
-            return custom_response(200, ProjectModelSchema().dump(project))
+            return custom_response(200, compiled.projects.dump(project, **options))
 
         current_user = get_jwt_identity()
         if current_user:
-            user = User.query.filter_by(email=current_user).first()
+            user = helpers.current_user()
             helpers.abort_if_unknown_user(user)
             helpers.abort_if_not_a_member_and_private(user, project)
-            return custom_response(200, ProjectModelSchema(user_id=user.id).dump(project))
+            return custom_response(200, compiled.projects.dump(project, user_id=user.id, **options))
         # If the user is not authenticated and the project is private
         return custom_response(200, errors=['PROJECT_DOES_NOT_EXIST'])
 
@@ -68,6 +130,8 @@ class Project(Resource):
         project = ProjectModel.query.get(pid)
         # TODO: it's unclear why schema.load does not load image correctly, hence needing to manually set it.
         project.image = json_data['image'] if json_data.get('image', None) else project.image
+        if project.is_public and json_data['privacy'] != 'public':
+            project.unpublished_on = db.func.now()
         project.is_public = json_data['privacy'] == 'public'
 
         # Loads project data: relations are not loaded in their own schemas
@@ -76,18 +140,25 @@ class Project(Resource):
         self.add_codebook(project.id, json_data['codebook'])
 
         # Note: it may be better to move this to schema's pre-load
+        contents = dict((content.id, content) for content in data.content)
+        content_changes, topics = [], []
         for language, content in json_data['content'].items():
+            plang = contents.get(content['id'])
+            if not plang:
+                continue
             # As the title may have changed, we must create a new slug
             content['slug'] = slugify(content['title'])
             # Overrides the title/description for the specific language that has changed
-            plang = ProjectLanguageSchema().load(content, instance=data.content.filter_by(id=content['id']).first())
-            for topic in content['topics']:
-                # Updates the topic if it changes, otherwise adds a new topic
-                if 'id' in topic:
-                    TopicLanguageSchema().load(topic, instance=data.content.filter_by(id=topic['id']).first())
-                else:
-                    new_topic = TopicLanguage(project_id=project.id, lang_id=plang.lang_id, text=topic['text'])
-                    db.session.add(new_topic)
+            content_changes.append(dict(content, lang_id=plang.lang_id))
+            # Updates the topic if it changes, otherwise adds a new topic in the language of the content
+            topics.extend(dict(topic, lang_id=plang.lang_id) for topic in content['topics'])
+        bulk_upsert(ProjectLanguage, dict((content.id, content) for content in contents.values()),
+                    content_changes, ['title', 'description', 'slug'])
+        existing_topics = db.session.query(TopicLanguage.id, TopicLanguage.text, TopicLanguage.is_active).filter(
+            TopicLanguage.project_id == project.id)
+        bulk_upsert(TopicLanguage, dict((topic.id, topic) for topic in existing_topics), topics,
+                    ['text', 'is_active'], new={'project_id': project.id}, insert=['lang_id', 'text'],
+                    unknown='projects.TOPICS_ID_NOT_PROJECT')
         # Changes are stored in memory; if error occurs, wont be left with half-changed state.
         db.session.commit()
         return custom_response(200, schema.dump(data))
@@ -98,25 +169,29 @@ class Project(Resource):
         user = User.query.filter_by(email=get_jwt_identity()).first()
         helpers.abort_if_unknown_user(user)
         helpers.abort_if_not_admin_or_staff(user, pid, action="projects.DELETE")
-        ProjectModel.query.filter_by(id=pid).update({'is_active': False})
+        ProjectModel.query.filter_by(id=pid).update({'is_active': False, 'unpublished_on': db.case(
+            [(ProjectModel.is_public == True, db.func.now())], else_=ProjectModel.unpublished_on)},
+            synchronize_session=False)
         db.session.commit()
         return custom_response(200)
 
     @staticmethod
     def add_codebook(project_id, json_codebook):
+        """
+        Creates the codebook of the project if it has none, and inserts or updates its codes in bulk
+        (see bulk_upsert) in the transaction of the request, which commits them.
+        """
         codebook = CodebookSchema().dump(json_codebook)
 
         if 'id' not in codebook or not codebook.get('id', None):
             new_codebook = Codebook(project_id=project_id)
             db.session.add(new_codebook)
-            db.session.commit()
+            db.session.flush()
             # To access below if it exists
             codebook['id'] = new_codebook.id
+        elif not Codebook.query.filter_by(id=codebook['id'], project_id=project_id).count():
+            raise CustomException(400, errors=['projects.CODEBOOK_NOT_PROJECT'])
 
-        for tag in codebook['tags']:
-            if tag.get('id', None):
-                TagsSchema().load(tag)
-            else:
-                new_tag = Code(text=tag['text'], codebook_id=codebook['id'])
-                db.session.add(new_tag)
-        db.session.commit()
+        existing = db.session.query(Code.id, Code.text, Code.is_active).filter(Code.codebook_id == codebook['id'])
+        bulk_upsert(Code, dict((code.id, code) for code in existing), codebook['tags'], ['text', 'is_active'],
+                    new={'codebook_id': codebook['id']}, insert=['text'], unknown='projects.CODES_ID_NOT_PROJECT')
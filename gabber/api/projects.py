@@ -4,15 +4,18 @@ Content for all projects that a user has access to
 """
 from .. import db
 from ..api.schemas.project import ProjectPostSchema, ProjectModelSchema
+from ..api.schemas import compiled
 from ..models.user import User
 from ..models.projects import Membership, Project as ProjectModel, ProjectLanguage, TopicLanguage, Roles
 from ..models.language import SupportedLanguage
-from ..utils.general import custom_response
+from ..utils import sync
+from ..utils.general import custom_response, streamed_response, keyset_chunks
+from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, jwt_optional, get_jwt_identity
 from sqlalchemy import or_
 import gabber.utils.helpers as helpers
-from ..api.project import Project
+from ..api.project import Project, bulk_upsert, dump_options
 
 
 class Projects(Resource):
@@ -24,19 +27,42 @@ class Projects(Resource):
     def get():
         """
         The projects the JWT user is a member of, otherwise all public projects.
+
+        Note: with a cursor as a query parameter, i.e. /?since=<cursor>, only the projects, content, topics,
+        codes and members that changed since the cursor are returned along with the cursor of the next sync
+        (see utils/sync.py); /?since= returns all of them. Projects that the client does not have should be
+        fetched from /api/projects/<pid>/, as only the changed rows of their content, topics, etc are returned.
+
+        Note: the fields and languages of projects can be set as query parameters, e.g. a list of project
+        cards only needs /?fields=content,image,privacy&lang=en (see dump_options)
         """
         current_user = get_jwt_identity()
+        if 'since' in request.args:
+            user = helpers.current_user()
+            if current_user:
+                helpers.abort_if_unknown_user(user)
+            try:
+                since = sync.parse_cursor(request.args['since'])
+            except ValueError:
+                return custom_response(400, errors=['projects.INVALID_CURSOR'])
+            return custom_response(200, data=sync.changes(user, since))
+
         if current_user:
-            user = User.query.filter_by(email=current_user).first()
+            user = helpers.current_user()
             helpers.abort_if_unknown_user(user)
             projects = ProjectModel.query.filter(or_(
                 ProjectModel.members.any(Membership.user_id == user.id),
-                ProjectModel.is_public)).order_by(ProjectModel.id.desc()).all()
+                ProjectModel.is_public)).order_by(ProjectModel.id.desc())
             # Pass optional argument to show more details of members if the user is an admin.creator of the project.
-            return custom_response(200, data=ProjectModelSchema(many=True, user_id=user.id).dump(projects))
+            user_id = user.id
         else:
-            projects = ProjectModel.query.filter_by(is_public=True).order_by(ProjectModel.id.desc()).all()
-            return custom_response(200, data=ProjectModelSchema(many=True).dump(projects))
+            projects = ProjectModel.query.filter_by(is_public=True).order_by(ProjectModel.id.desc())
+            user_id = None
+        options = dump_options()
+        # Serializing projects lazy-loads their content, topics, members and codebook, hence each chunk is
+        # fetched by its own query before it is serialized
+        return streamed_response(200, keyset_chunks(projects, ProjectModel.id),
+                                 lambda chunk: compiled.projects.dump(chunk, many=True, user_id=user_id, **options))
 
     @jwt_required
     def post(self):
@@ -79,8 +105,8 @@ class Projects(Resource):
 
         project.content.extend([ProjectLanguage(
             pid=project.id, lid=english_lang.id, description=content['description'], title=content['title'])])
-        project.topics.extend([TopicLanguage(
-            project_id=project.id, lang_id=english_lang.id, text=t['text']) for t in content['topics']])
+        bulk_upsert(TopicLanguage, {}, content['topics'], [], new={'project_id': project.id, 'lang_id': english_lang.id},
+                    insert=['text'], unknown='projects.TOPICS_ID_NOT_PROJECT')
         db.session.commit()
 
         return custom_response(201, data=ProjectModelSchema().dump(project))
@@ -11,7 +11,7 @@ from gabber.api.schemas.project import HelperSchemaValidator, validate_length
 class UserAnnotationTagSchema(ma.ModelSchema):
     class Meta:
         model = Tags
-        exclude = ['codebook', 'connections']
+        exclude = ['codebook', 'connections', 'updated_on']
 
 
 class UserAnnotationCommentSchema(ma.ModelSchema):
@@ -66,6 +66,7 @@ class UserAnnotationSchema(ma.ModelSchema):
         model = UserAnnotations
         include_fk = True
         exclude = ['interview', 'user', 'user_id']
+        dump_only = ['num_comments']
 
     @staticmethod
     def validate_intervals(attribute, data, validator):
@@ -113,7 +113,7 @@ class UserSchemaHasAccess(ma.ModelSchema):
     class Meta:
         model = User
         include_fk = True
-        exclude = ['connection_comments', 'connections', 'password', 'member_of']
+        exclude = ['connection_comments', 'connections', 'password', 'member_of', 'claims_version']
 
     @pre_load()
     def __validate(self, data):
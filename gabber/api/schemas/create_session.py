@@ -1,11 +1,6 @@
 from ... import ma
-from marshmallow import ValidationError, validates_schema
-from ...models.projects import TopicLanguage
-
-
-def is_known_topic(data):
-    if data not in [i.id for i in TopicLanguage.query.all()]:
-        raise ValidationError("The topic with the ID (%i) does not exist" % data)
+from marshmallow import ValidationError, validates, validates_schema, pre_load
+from .helpers import validation_context
 
 
 def required_message(attribute, parent):
@@ -23,10 +18,23 @@ class RecordingAnnotationSchema(ma.Schema):
     )
     PromptID = ma.Int(
         required=True,
-        error_messages={'required': required_message('Topic ID known to Gabber', 'region')},
-        validate=is_known_topic
+        error_messages={'required': required_message('Topic ID known to Gabber', 'region')}
     )
 
+    @pre_load(pass_many=True)
+    def __prefetch_topics(self, data, many):
+        """
+        Reads which topics of all regions exist in one query, rather than one per region.
+        """
+        regions = data if many and isinstance(data, list) else [data]
+        topic_ids = [region.get('PromptID') for region in regions if isinstance(region, dict)]
+        validation_context(self).prefetch_topics(topic_id for topic_id in topic_ids if isinstance(topic_id, int))
+
+    @validates('PromptID')
+    def is_known_topic(self, data):
+        if not validation_context(self).is_known_topic(data):
+            raise ValidationError("The topic with the ID (%i) does not exist" % data)
+
     @validates_schema
     def validate_region_range(self, data):
         if data['Start'] > data['End']:
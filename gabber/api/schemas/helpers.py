@@ -1,6 +1,95 @@
 from marshmallow import ValidationError
+from ... import db
+from ...models.language import SupportedLanguage
+from ...models.projects import Project, ProjectLanguage, TopicLanguage
 
 
 def is_not_empty(data, message):
     if not data or len(data) <= 0:
         raise ValidationError(message)
+
+
+class ValidationContext(object):
+    """
+    The IDs and slugs that the pre-load hooks of schemas validate items against, which are read once for all
+    items of a request rather than once per item, hence validation runs a bounded number of queries.
+
+    The context is kept in the context of a schema (see validation_context), hence is shared by the validate
+    and load of a request that use the same schema.
+    """
+    def __init__(self):
+        self.__language_codes = None
+        self.__projects = {}
+        self.__project_topics = {}
+        self.__topics = {}
+        self.__slugs = {}
+        self.__content_slugs = {}
+
+    @staticmethod
+    def __prefetch(cache, column, values):
+        """
+        Reads which of the values of a column exist, in one query for the values that were not read before.
+        """
+        values = set(values) - set(cache)
+        if values:
+            found = set(value for value, in db.session.query(column).filter(column.in_(values)))
+            cache.update((value, value in found) for value in values)
+
+    def language_codes(self):
+        if self.__language_codes is None:
+            self.__language_codes = set(code for code, in db.session.query(SupportedLanguage.code))
+        return self.__language_codes
+
+    def project_exists(self, project_id):
+        """
+        Includes projects that were soft-deleted.
+        """
+        if project_id not in self.__projects:
+            self.__projects[project_id] = Project.query.with_deleted().filter_by(id=project_id).count() > 0
+        return self.__projects[project_id]
+
+    def project_topics(self, project_id):
+        """
+        :return: the topics of a project by ID. Topics are kept by the context, hence fields that load topics
+        by ID (i.e. ProjectModelSchema.topics) find them in the session rather than query each.
+        """
+        if project_id not in self.__project_topics:
+            self.__project_topics[project_id] = dict(
+                (topic.id, topic) for topic in TopicLanguage.query.filter_by(project_id=project_id))
+        return self.__project_topics[project_id]
+
+    def prefetch_topics(self, topic_ids):
+        self.__prefetch(self.__topics, TopicLanguage.id, topic_ids)
+
+    def is_known_topic(self, topic_id):
+        self.prefetch_topics([topic_id])
+        return self.__topics[topic_id]
+
+    def prefetch_slugs(self, slugs):
+        self.__prefetch(self.__slugs, ProjectLanguage.slug, slugs)
+
+    def slug_exists(self, slug):
+        self.prefetch_slugs([slug])
+        return self.__slugs[slug]
+
+    def content_slugs(self, content_ids):
+        """
+        :return: the slugs of the content (ProjectLanguage) of the IDs by ID, where unknown IDs are not returned.
+        """
+        content_ids = set(content_ids)
+        missing = content_ids - set(self.__content_slugs)
+        if missing:
+            self.__content_slugs.update((content_id, None) for content_id in missing)
+            self.__content_slugs.update(db.session.query(ProjectLanguage.id, ProjectLanguage.slug).filter(
+                ProjectLanguage.id.in_(missing)))
+        return dict((content_id, self.__content_slugs[content_id]) for content_id in content_ids
+                    if self.__content_slugs[content_id] is not None)
+
+
+def validation_context(schema):
+    """
+    :return: the ValidationContext of a schema, which is created on first use
+    """
+    if 'validation' not in schema.context:
+        schema.context['validation'] = ValidationContext()
+    return schema.context['validation']
@@ -3,6 +3,7 @@ from ...models.projects import Project, ProjectLanguage, \
     TopicLanguage, Membership, Codebook, Code as Tags, Organisation
 from ...models.language import SupportedLanguage
 from ...models.user import User
+from .helpers import validation_context
 from marshmallow import pre_load, ValidationError
 from slugify import slugify
 
@@ -73,7 +74,7 @@ class HelperSchemaValidator:
 class TagsSchema(ma.ModelSchema):
     class Meta:
         model = Tags
-        exclude = ['codebook', 'connections']
+        exclude = ['codebook', 'connections', 'updated_on']
 
 
 class CodebookSchema(ma.ModelSchema):
@@ -104,14 +105,17 @@ class ProjectPostSchema(ma.Schema):
         if privacy_valid and data['privacy'] not in ['private', 'public']:
             validator.errors.append('PRIVACY_INVALID')
 
-        supported_langs = [i.code for i in SupportedLanguage.query.all()]
+        context = validation_context(self)
+        supported_langs = context.language_codes()
+        context.prefetch_slugs(slugify(content['title']) for content in data['content'].values()
+                               if not validator.is_not_str(content.get('title')))
 
         for language, content in data['content'].items():
             if language not in supported_langs:
                 validator.errors.append("UNSUPPORTED_LANGUAGE")
 
             title_valid = validator.validate('title', 'str', content)
-            if title_valid and ProjectLanguage.query.filter_by(slug=slugify(content['title'])).first():
+            if title_valid and context.slug_exists(slugify(content['title'])):
                 validator.errors.append("TITLE_EXISTS")
 
             validator.validate('description', 'str', content)
@@ -155,7 +159,7 @@ class ProjectLanguageSchema(ma.ModelSchema):
     class Meta:
         model = ProjectLanguage
         include_fk = True
-        exclude = ['content', 'project_id']
+        exclude = ['content', 'project_id', 'updated_on']
 
 
 class TopicLanguageSchema(ma.ModelSchema):
@@ -163,10 +167,12 @@ class TopicLanguageSchema(ma.ModelSchema):
     class Meta:
         model = TopicLanguage
         include_fk = True
+        exclude = ['updated_on']
 
 
 class ProjectModelSchema(ma.ModelSchema):
     image = ma.Method("_from_amazon")
+    images = ma.Method("_renditions_from_amazon", dump_only=True)
     content = ma.Method("_content_by_language")
     codebook = ma.Function(lambda o: CodebookSchema().dump(o.codebook.first()) if o.codebook.first() else None)
     members = ma.Method("_members")
@@ -175,22 +181,24 @@ class ProjectModelSchema(ma.ModelSchema):
     organisation_id = ma.Function(lambda d: d.organisation)
     creator_id = ma.Function(lambda d: d.creator)
     privacy = ma.Function(lambda obj: "public" if obj.is_public else "private")
-    sessions = ma.Function(lambda o: len(o.sessions))
+    sessions = ma.Function(lambda o: o.num_sessions)
 
     def __init__(self, **kwargs):
         """
         When Schema is created, it can optionally take a user_id, which is used
-        to provide fullname/email for members of projects where the user is an admin/creator.
+        to provide fullname/email for members of projects where the user is an admin/creator,
+        and the IDs of the languages (lang_ids) of the content to show, which is all languages by default.
         """
-        # Remove this as parent ModelSchema does not expect this argument
+        # Remove these as parent ModelSchema does not expect these arguments
         self.user_id = kwargs.pop('user_id', None)
+        self.lang_ids = kwargs.pop('lang_ids', None)
         # Need to initialise parent manually
         ma.ModelSchema.__init__(self,  **kwargs)
 
-    @staticmethod
-    def _content_by_language(data):
+    def _content_by_language(self, data):
         """
-        Groups content by language to simplify lookup by clients.
+        Groups content by language to simplify lookup by clients, where only the content and topics
+        of lang_ids are read if set.
 
         Returns dict:
             {
@@ -203,8 +211,12 @@ class ProjectModelSchema(ma.ModelSchema):
                 }
             }
         """
-        projects = ProjectLanguageSchema(many=True).dump(data.content)
-        topics = TopicLanguageSchema(many=True).dump(data.topics)
+        content, topics = data.content, data.topics
+        if self.lang_ids is not None:
+            content = content.filter(ProjectLanguage.lang_id.in_(self.lang_ids))
+            topics = topics.filter(TopicLanguage.lang_id.in_(self.lang_ids))
+        projects = ProjectLanguageSchema(many=True).dump(content)
+        topics = TopicLanguageSchema(many=True).dump(topics)
 
         grouped_content = {}
         for project in projects:
@@ -216,8 +228,21 @@ class ProjectModelSchema(ma.ModelSchema):
 
     @staticmethod
     def _from_amazon(data):
+        """
+        The image sized for project cards, which is the original for images uploaded before renditions existed.
+        """
         from ...utils import amazon
-        return amazon.static_file_by_name(data.image)
+        return amazon.static_file_by_name(data.image, 'card')
+
+    @staticmethod
+    def _renditions_from_amazon(data):
+        """
+        The URL of the original image and each of its renditions, e.g. {"original": "", "thumb": "", "card": ""}
+        """
+        from ...utils import amazon, images
+        urls = {name: amazon.static_file_by_name(data.image, name) for name in images.RENDITIONS}
+        urls['original'] = amazon.static_file_by_name(data.image)
+        return urls
 
     def _members(self, data):
         """
@@ -249,7 +274,7 @@ class ProjectModelSchema(ma.ModelSchema):
         model = Project
         # We include FKs to gain access to Topics, Creator and Members
         include_fk = True
-        exclude = ['prompts']
+        exclude = ['prompts', 'num_sessions', 'unpublished_on']
 
     @pre_load
     def __validate(self, data):
@@ -258,9 +283,13 @@ class ProjectModelSchema(ma.ModelSchema):
 
         pid_valid = validator.validate('id', 'int', data)
 
-        if pid_valid and data['id'] not in [p.id for p in Project.query.with_deleted().all()]:
+        context = validation_context(self)
+        if pid_valid and not context.project_exists(data['id']):
             validator.errors.append("ID_404")
             pid_valid = False
+        elif pid_valid:
+            # Read once, as the topics of the project are validated and loaded (by ID) item by item
+            context.project_topics(data['id'])
 
         # This must be a known user, and must be a member of this project
         creator_valid = validator.validate('creator', 'int', data)
@@ -272,7 +301,11 @@ class ProjectModelSchema(ma.ModelSchema):
             # TODO: because the name is different, it does not update the model.
             data['is_public'] = data['privacy'] == 'public'
 
-        supported_langs = [i.code for i in SupportedLanguage.query.all()]
+        supported_langs = context.language_codes()
+        # The slugs of the content and titles of all languages are read at once
+        content_slugs = context.content_slugs(content.get('id') for content in data['content'].values())
+        context.prefetch_slugs(slugify(content['title']) for content in data['content'].values()
+                               if not validator.is_not_str(content.get('title')))
         for language, content in data['content'].items():
             if language not in supported_langs:
                 validator.errors.append("UNSUPPORTED_LANGUAGE")
@@ -291,9 +324,9 @@ class ProjectModelSchema(ma.ModelSchema):
 
             if pid_valid and title_valid:
                 # The title is different from the previous one, hence it changed.
-                if ProjectLanguage.query.get(content['id']).slug != title_as_slug:
+                if content_slugs.get(content.get('id')) != title_as_slug:
                     # The slug does not exist, so it is a unique new title
-                    if ProjectLanguage.query.filter_by(slug=title_as_slug).first():
+                    if context.slug_exists(title_as_slug):
                         validator.errors.append("TITLE_EXISTS")
                     else:
                         # Note: this is not passed up and is always calculated in the backend
@@ -316,7 +349,7 @@ class ProjectModelSchema(ma.ModelSchema):
                                     validator.errors.append('TOPICS_IS_ACTIVE_MUST_BE_0_OR_1')
 
                             # Note: the ID will not appear as we implemented a primary join for only active sessions ...
-                            all_project_topics = [i.id for i in TopicLanguage.query.filter_by(project_id=item['project_id']).all()]
+                            all_project_topics = context.project_topics(item['project_id'])
                             if item.get('id') and (item['id'] not in all_project_topics):
                                 validator.errors.append('TOPICS_ID_NOT_PROJECT')
 
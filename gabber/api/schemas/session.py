@@ -35,7 +35,7 @@ class SessionAnnotationSchema(ma.ModelSchema):
 class RecordingSessionsSchema(ma.ModelSchema):
     topics = ma.Nested(RecordingTopicSchema, many=True, attribute="prompts")
     participants = ma.Nested(RecordingParticipantsSchema, many=True, attribute="participants")
-    num_user_annotations = ma.Function(lambda data: len(data.connections))
+    num_user_annotations = ma.Function(lambda data: data.num_annotations)
     creator = ma.Method("_creator")
 
     @staticmethod
@@ -46,7 +46,8 @@ class RecordingSessionsSchema(ma.ModelSchema):
     class Meta:
         model = InterviewSession
         include_fk = True
-        exclude = ['prompts', 'creator_id', 'connections', 'consents']
+        exclude = ['prompts', 'creator_id', 'connections', 'consents', 'num_annotations', 'max_annotation_length',
+                   'visibility', 'embargoed_until']
 
 
 class RecordingSessionSchema(RecordingSessionsSchema):
@@ -55,7 +56,7 @@ class RecordingSessionSchema(RecordingSessionsSchema):
 
 class Recommendation(ma.ModelSchema):
     participants = ma.Function(lambda data: len(data.participants))
-    comments = ma.Function(lambda data: len(data.connections))
+    comments = ma.Function(lambda data: data.num_annotations)
     pid = ma.String(attribute="project_id")
     image = ma.Method("_project_image_from_amazon")
     content = ma.Method("_project_title")
@@ -70,9 +71,10 @@ class Recommendation(ma.ModelSchema):
     def _project_image_from_amazon(data):
         from ...utils import amazon
         project = Project.query.get(data.project_id)
-        return amazon.static_file_by_name(project.image)
+        return amazon.static_file_by_name(project.image, 'card')
 
     class Meta:
         model = InterviewSession
         include_fk = True
-        exclude = ['prompts', 'creator_id', 'connections', 'consents', 'created_on', 'lang_id']
+        exclude = ['prompts', 'creator_id', 'connections', 'consents', 'created_on', 'lang_id', 'num_annotations',
+                   'max_annotation_length', 'visibility', 'embargoed_until']
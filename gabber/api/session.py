@@ -4,7 +4,6 @@ REST Actions for a Gabber session, e.g. the recording between participants
 """
 from ..api.schemas.session import RecordingSessionSchema
 from ..models.projects import InterviewSession, Project
-from ..models.user import User
 from ..utils.general import custom_response
 from flask_restful import Resource
 from flask_jwt_extended import jwt_optional, get_jwt_identity
@@ -30,7 +29,7 @@ class ProjectSession(Resource):
         helpers.abort_if_session_not_in_project(session, pid)
 
         jwt_user = get_jwt_identity()
-        user = User.query.filter_by(email=jwt_user).first()
+        user = helpers.current_user()
 
         if jwt_user or not project.is_public:
             helpers.abort_if_not_a_member_and_private(user, project)
@@ -4,19 +4,23 @@ Viewing all Gabber sessions and creating a new one
 """
 from .. import db
 from ..api.schemas.create_session import ParticipantScheme, RecordingAnnotationSchema
-from ..api.schemas.session import RecordingSessionsSchema, Recommendation
+from ..api.schemas.session import Recommendation
+from ..api.schemas import compiled
 from ..api.schemas.helpers import is_not_empty
-from ..models.projects import InterviewSession, InterviewParticipants, InterviewPrompts, Project, TopicLanguage
+from ..models.projects import InterviewSession, InterviewParticipants, InterviewPrompts, Project, TopicLanguage, \
+    TranscodeJob, SessionUpload, update_counter
 from ..models.user import User, SessionConsent
-from ..utils.general import custom_response
+from ..utils.general import custom_response, streamed_response, CustomException
 from marshmallow import ValidationError
+from flask import request
 from flask_restful import Resource, reqparse, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity, jwt_optional
+from sqlalchemy.exc import IntegrityError
 from uuid import uuid4
 from ..utils.mail import MailClient
 import gabber.utils.helpers as helpers
-from itertools import chain
 from random import sample
+import hashlib
 import json
 
 
@@ -27,9 +31,8 @@ class Recommendations(Resource):
         View recommendations for users to view on the homepage
         :return: A dictionary of recommendations
         """
-        projects = Project.query.filter_by(is_public=True).all()
-        __sessions = [InterviewSession.all_consented_sessions_by_project(i) for i in projects]
-        __sessions = list(chain(*__sessions))
+        __sessions = InterviewSession.query.join(Project, Project.id == InterviewSession.project_id).filter(
+            Project.is_public == True, Project.is_active == True, InterviewSession.viewable(True)).all()
         # TODO: assumes at least num recommendations exist ...
         return custom_response(200, data=Recommendation(many=True).dump(sample(__sessions, num)))
 
@@ -50,7 +53,7 @@ class ProjectSessions(Resource):
         helpers.abort_if_unknown_project(project)
 
         current_user = get_jwt_identity()
-        user = User.query.filter_by(email=current_user).first()
+        user = helpers.current_user()
         # Only show private projects to authenticated users
         if current_user or not project.is_public:
             helpers.abort_if_not_a_member_and_private(user, project)
@@ -61,7 +64,7 @@ class ProjectSessions(Resource):
         else:
             # They are an anonymous user but can still view public projects
             sessions = InterviewSession.all_consented_sessions_by_project(project)
-        return custom_response(200, data=RecordingSessionsSchema(many=True).dump(sessions))
+        return streamed_response(200, sessions, lambda chunk: compiled.recording_sessions.dump(chunk, many=True))
 
     @jwt_required
     def post(self, pid):
@@ -69,9 +72,16 @@ class ProjectSessions(Resource):
         CREATES a new session: only members of projects can upload to private projects.
         Anyone can upload to public projects as long as they are logged in via JWT;
 
+        Retries of an upload, i.e. with the same Idempotency-Key header or the same recording, return the
+        response of the first upload (with an Idempotent-Replayed header) rather than create another session,
+        or 409 while the first upload is in progress.
+
         :param pid: the project to CREATE a new session for
         :return: the session serialized
         """
+        idempotency_key = request.headers.get('Idempotency-Key') or None
+        if idempotency_key and len(idempotency_key) > 255:
+            return custom_response(400, errors=['sessions.INVALID_IDEMPOTENCY_KEY'])
         user = User.query.filter_by(email=get_jwt_identity()).first()
         helpers.abort_if_unknown_user(user)
         project = Project.query.get(pid)
@@ -100,20 +110,47 @@ class ProjectSessions(Resource):
         prompts = self.validate_and_serialize(args['prompts'], 'prompts', RecordingAnnotationSchema(many=True))
         participants = self.validate_and_serialize(args['participants'], 'participants', ParticipantScheme(many=True))
 
-        interview_session_id = uuid4().hex
+        sha256 = self.__hash_recording(args['recording'])
+        upload = self.claim_upload(user.id, pid, idempotency_key, sha256)
+        if upload.status == SessionUpload.COMPLETE:
+            return {}, 201, {'Idempotent-Replayed': 'true'}
+        try:
+            return self.create_session(user, project, args, prompts, participants, upload, args['recording'])
+        except Exception:
+            # The upload can be retried, unless it failed once the session was created (e.g. sending emails)
+            db.session.rollback()
+            SessionUpload.query.filter_by(id=upload.id, status=SessionUpload.PENDING).delete()
+            db.session.commit()
+            raise
+
+    @classmethod
+    def create_session(cls, user, project, args, prompts, participants, upload, recording=None):
+        """
+        Uploads the recording, creates the session and completes the upload, then emails the participants.
+
+        :param args: the language, creation time and consent of the session
+        :param recording: the audio file to upload, or None if it was uploaded directly to S3 (see api/uploads.py)
+        """
+        pid = project.id
+        interview_session_id = upload.recording_id
         lang_id = args['lang']
         from datetime import datetime
         created_on = datetime.strptime(args['created_on'], "%m/%d/%Y %H:%M:%S")
         interview_session = InterviewSession(
             id=interview_session_id, lang_id=lang_id, creator_id=user.id, project_id=pid, created_on=created_on)
-        self.__upload_interview_recording(args['recording'], interview_session_id, pid)
-        self.__transcode_recording(interview_session_id, pid)
-        interview_session.prompts.extend(self.__add_structural_prompts(prompts, interview_session_id))
-        interview_session.participants.extend(self.__add_participants(participants, interview_session_id, project.id, lang_id))
-        interview_session.consents.extend(
-            self.__create_consent(interview_session.participants, interview_session.id, args['consent'])
-        )
+        if recording:
+            cls.__upload_interview_recording(recording, interview_session_id, pid)
+            cls.__store_waveform(recording, interview_session_id, pid)
+        transcode_job_id = cls.__transcode_recording(interview_session_id, pid)
+        interview_session.prompts.extend(cls.__add_structural_prompts(prompts, interview_session_id))
+        interview_session.participants.extend(cls.__add_participants(participants, interview_session_id, project.id, lang_id))
+        consents = cls.__create_consent(interview_session.participants, interview_session.id, args['consent'])
+        interview_session.consents.extend(consents)
+        interview_session.update_visibility([consent.type for consent in consents])
         db.session.add(interview_session)
+        db.session.add(TranscodeJob(job_id=transcode_job_id, session=interview_session))
+        update_counter(Project.num_sessions, pid)
+        upload.status, upload.session_id = SessionUpload.COMPLETE, interview_session_id
         db.session.commit()
 
         # Once the session is saved, generate tokens as they require knowing the consent ID.
@@ -133,9 +170,54 @@ class ProjectSessions(Resource):
         title = project.content.filter_by(lang_id=lang).first().title
 
         for participant in participants:
-            send_mail.consent(participant, self.names(participants), title, interview_session.id, args['consent'])
+            send_mail.consent(participant, cls.names(participants), title, interview_session.id, args['consent'])
         return {}, 201
 
+    @staticmethod
+    def __hash_recording(recording):
+        """
+        :return: the SHA-256 of the recording, which is read in chunks rather than into memory.
+        """
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: recording.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+        recording.stream.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def claim_upload(user_id, project_id, idempotency_key, sha256, status=SessionUpload.PENDING):
+        """
+        Claims the upload before any of the recording is uploaded, which is committed so that other requests
+        of the same upload see it; the unique constraints of uploads decide between concurrent duplicates.
+
+        :param status: UPLOADING for a recording that the device uploads directly to S3, which is claimed
+        again by retries until its session is created, otherwise PENDING.
+        :return: the upload claimed by this request, or the complete upload of a previous request.
+        """
+        for _ in range(2):
+            upload = SessionUpload.existing(user_id, project_id, idempotency_key, sha256)
+            # The hash of a direct upload is optional, hence a key is only reused for another recording if
+            # both hashes are known
+            if upload and upload.idempotency_key == idempotency_key and upload.sha256 and sha256 and \
+                    upload.sha256 != sha256:
+                raise CustomException(422, errors=['sessions.IDEMPOTENCY_KEY_REUSED'])
+            if upload and not upload.is_stale():
+                if upload.status == SessionUpload.COMPLETE or upload.status == status == SessionUpload.UPLOADING:
+                    return upload
+                raise CustomException(409, errors=['sessions.UPLOAD_IN_PROGRESS'])
+            if upload:
+                SessionUpload.query.filter_by(id=upload.id, status=upload.status).delete()
+            upload = SessionUpload(user_id=user_id, project_id=project_id, idempotency_key=idempotency_key,
+                                   sha256=sha256, status=status, recording_id=uuid4().hex)
+            db.session.add(upload)
+            try:
+                db.session.commit()
+                return upload
+            except IntegrityError:
+                # A concurrent request of the same upload claimed it first
+                db.session.rollback()
+        raise CustomException(409, errors=['sessions.UPLOAD_IN_PROGRESS'])
+
     @staticmethod
     def names(_participants):
         participants = map(unicode, [p['Name'].decode('UTF-8') if isinstance(p, str) else p["Name"] for p in _participants])
@@ -149,8 +231,11 @@ class ProjectSessions(Resource):
 
     @staticmethod
     def validate_and_serialize(data, message, scheme):
+        """
+        :param data: JSON of a multi-form request, or already decoded from the body of a JSON request
+        """
         try:
-            json_data = json.loads(data)
+            json_data = data if isinstance(data, (list, dict)) else json.loads(data)
             # Checking for empty lists is required due to bug in marshmallow
             is_not_empty(json_data, message="The %s list should not be empty" % message)
             return scheme.load(json_data)
@@ -175,6 +260,24 @@ class ProjectSessions(Resource):
         except Exception:
             abort(500, message={'errors': 'There was an issue UPLOADING this session (%s).'.format(session_id)})
 
+    @staticmethod
+    def __store_waveform(recording, session_id, project_id):
+        """
+        Decodes the recording to store its waveform, which players draw before the audio is downloaded.
+        This is optional, hence the session is still created if it fails (see `flask waveform generate`).
+
+        :param recording: the audio file that was uploaded
+        :param session_id: the ID of the session associated with the recording
+        :param project_id: the project associated with the session
+        """
+        from flask import current_app as app
+        from ..utils import amazon, waveform
+        try:
+            levels = waveform.peaks(waveform.decode(recording.stream))
+            amazon.upload_waveform(waveform.encode(levels), project_id, session_id)
+        except Exception:
+            app.logger.exception('Storing the waveform of session %s failed', session_id)
+
     @staticmethod
     def __transcode_recording(session_id, project_id):
         """
@@ -182,10 +285,11 @@ class ProjectSessions(Resource):
 
         :param session_id: the ID of the session associated with the recording
         :param project_id: the project associated with the session
+        :return: the ID of the transcoder job
         """
         from ..utils import amazon
         try:
-            amazon.transcode(project_id, session_id)
+            return amazon.transcode(project_id, session_id)
         except Exception:
             abort(500, message={'errors': 'There was an issue TRANSCODING this session (%s).'.format(session_id)})
 
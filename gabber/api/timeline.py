@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Where in the recording of a session annotations cluster, so clients can plot it without every annotation
+"""
+from ..models.projects import InterviewSession, Project
+from ..utils import analytics
+from ..utils.general import custom_response
+from flask import request
+from flask_restful import Resource
+from flask_jwt_extended import jwt_optional, get_jwt_identity
+import gabber.utils.helpers as helpers
+
+DEFAULT_BINS = 100
+MAX_BINS = 1000
+
+
+class SessionTimeline(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/sessions/<string:sid>/timeline/
+
+    Note: the number of bins can be set as a query parameter, e.g. /?bins=50
+    """
+    @jwt_optional
+    def get(self, pid, sid):
+        """
+        The density of annotations over the recording and for each topic discussed (see utils/analytics.py):
+
+            duration: the length (in seconds) of the recording, as known from its prompts and annotations
+            bin_width: the number of seconds of each bin
+            density: for each bin, the number of annotations that cover it
+            topics: each topic with its segments ([start, end]) and duration, the number of annotations that
+                    overlap its segments, and the number of seconds they overlap
+        """
+        helpers.abort_on_unknown_project_id(pid)
+        project = Project.query.get(pid)
+        session = InterviewSession.query.get(sid)
+        helpers.abort_if_unknown_session(session)
+        helpers.abort_if_session_not_in_project(session, pid)
+
+        jwt_user = get_jwt_identity()
+        user = helpers.current_user()
+        if jwt_user or not project.is_public:
+            helpers.abort_if_not_a_member_and_private(user, project)
+        helpers.abort_if_session_not_viewable(user, project, session)
+
+        bins = request.args.get('bins', DEFAULT_BINS, type=int)
+        if bins < 1 or bins > MAX_BINS:
+            return custom_response(400, errors=['timeline.INVALID_BINS'])
+        return custom_response(200, data=analytics.session_timeline(session, bins))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Notifications (through Amazon SNS) of the Elastic Transcoder pipeline that transcodes session recordings
+"""
+from .. import db
+from ..models.projects import TranscodeJob
+from ..utils.general import custom_response
+from flask import request
+from flask_restful import Resource
+import json
+
+
+class TranscodeNotifications(Resource):
+    """
+    Mapped to: /api/transcode/notifications/
+    """
+    @staticmethod
+    def post():
+        """
+        Handles the SNS messages of the pipeline: the subscription confirmation and job state changes.
+
+        As notifications are not authenticated, the status of the job is read from Elastic Transcoder
+        rather than trusting the message, which only identifies the job to update.
+        """
+        # SNS sends messages as text/plain
+        data = request.get_json(force=True, silent=True)
+        if not data:
+            return custom_response(400, errors=['transcode.INVALID_NOTIFICATION'])
+
+        if data.get('Type') == 'SubscriptionConfirmation':
+            return TranscodeNotifications.__confirm_subscription(data.get('SubscribeURL', ''))
+
+        try:
+            job_id = json.loads(data.get('Message', '')).get('jobId')
+        except (ValueError, AttributeError):
+            return custom_response(400, errors=['transcode.INVALID_NOTIFICATION'])
+
+        job = TranscodeJob.query.filter_by(job_id=job_id).first() if job_id else None
+        if not job:
+            return custom_response(404, errors=['transcode.UNKNOWN_JOB'])
+        job.refresh()
+        db.session.commit()
+        return custom_response(200, data={'status': job.status})
+
+    @staticmethod
+    def __confirm_subscription(url):
+        import requests
+        from werkzeug.urls import url_parse
+        # Only visit the URL if it is from SNS, otherwise anyone could make the API request any URL
+        location = url_parse(url)
+        if location.scheme != 'https' or not (location.host or '').endswith('.amazonaws.com'):
+            return custom_response(400, errors=['transcode.INVALID_SUBSCRIPTION'])
+        requests.get(url, timeout=10).raise_for_status()
+        return custom_response(200)
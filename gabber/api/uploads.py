@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Creating a session from a recording that the device uploads directly to S3, rather than through the API
+(see ProjectSessions.post), in two steps:
+
+    1. POST /api/projects/<pid>/sessions/uploads/ returns where to upload the recording: the URL and fields of
+       a form (POST), or the URL of each part (PUT) of a multipart upload for recordings larger than
+       UPLOAD_MULTIPART_THRESHOLD.
+    2. POST /api/projects/<pid>/sessions/uploads/<uid>/ once uploaded, with the participants, prompts and consent
+       of the session, which creates the session and transcodes the recording.
+
+Uploads are claims (see SessionUpload) that are deduplicated by the Idempotency-Key header and the SHA-256 of
+the recording, if sent, hence a device that retries either step continues the same upload.
+"""
+from .. import db
+from ..api.schemas.create_session import ParticipantScheme, RecordingAnnotationSchema
+from ..api.schemas.project import HelperSchemaValidator
+from ..api.sessions import ProjectSessions
+from ..models.projects import Project, SessionUpload
+from ..utils.general import custom_response, CustomException
+from flask import current_app, request
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required
+from datetime import datetime
+from tempfile import TemporaryFile
+import gabber.utils.helpers as helpers
+import re
+import threading
+
+SHA256 = re.compile(r'^[0-9a-fA-F]{64}$')
+# The most parts of a multipart upload that S3 allows, beyond which parts are larger than UPLOAD_PART_SIZE
+MAX_PARTS = 10000
+
+
+def store_waveform(app, project_id, session_id):
+    """
+    Downloads the recording from S3 to store its waveform (see ProjectSessions.__store_waveform); run in a
+    background thread as the recording was not uploaded through the API.
+    """
+    from ..utils import amazon, waveform
+
+    with app.app_context():
+        try:
+            with TemporaryFile() as recording:
+                amazon.download(project_id, session_id, recording)
+                levels = waveform.peaks(waveform.decode(recording))
+            amazon.upload_waveform(waveform.encode(levels), project_id, session_id)
+        except Exception:
+            app.logger.exception('Storing the waveform of session %s failed', session_id)
+
+
+def user_and_project(pid):
+    """
+    Only members of projects can upload to private projects, as with ProjectSessions.post
+    """
+    user = helpers.current_user()
+    helpers.abort_if_unknown_user(user)
+    project = Project.query.get(pid)
+    helpers.abort_if_unknown_project(project)
+    helpers.abort_if_not_a_member_and_private(user, project)
+    return user, project
+
+
+def serialize_upload(upload, destination=None):
+    return {'id': upload.id, 'status': upload.status, 'session_id': upload.session_id, 'upload': destination}
+
+
+class ProjectSessionUploads(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/sessions/uploads/
+    """
+    @jwt_required
+    def post(self, pid):
+        """
+        STARTS an upload of a recording directly to S3, where the body is the size (bytes) of the recording and
+        optionally its SHA-256, i.e. {"size": 52428800, "sha256": "..."}
+
+        :param pid: the project to create a session for
+        :return: the upload and where to upload the recording, i.e. either of:
+
+            {"method": "POST", "url": "...", "fields": {...}}: a multipart/form-data POST of the fields, then
+                the recording as the "file" field.
+            {"method": "PUT", "part_size": 16777216, "parts": ["...", ...]}: a PUT of each part of the recording
+                (part_size bytes, except the last) to its URL.
+
+        or the complete upload if it was finalized by a previous request.
+        """
+        idempotency_key = request.headers.get('Idempotency-Key') or None
+        if idempotency_key and len(idempotency_key) > 255:
+            return custom_response(400, errors=['sessions.INVALID_IDEMPOTENCY_KEY'])
+        user, project = user_and_project(pid)
+
+        data = helpers.jsonify_request_or_abort()
+        validator = HelperSchemaValidator('sessions')
+        if validator.validate('size', 'int', data) and not 0 < data['size'] <= current_app.config['UPLOAD_MAX_SIZE']:
+            validator.errors.append('SIZE_IS_INVALID')
+        sha256 = data.get('sha256')
+        if sha256 is not None and validator.validate('sha256', 'str', data) and not SHA256.match(sha256):
+            validator.errors.append('SHA256_IS_INVALID')
+        helpers.abort_if_errors_in_validation(['sessions.%s' % error for error in validator.errors])
+
+        upload = ProjectSessions.claim_upload(
+            user.id, pid, idempotency_key, sha256.lower() if sha256 else None, SessionUpload.UPLOADING)
+        if upload.status == SessionUpload.COMPLETE:
+            return custom_response(200, data=serialize_upload(upload))
+        if upload.size != data['size']:
+            upload.size = data['size']
+            db.session.commit()
+        return custom_response(201, data=serialize_upload(upload, self.__destination(upload, data['size'])))
+
+    @staticmethod
+    def __destination(upload, size):
+        """
+        Signs the URLs of the upload, which are signed again when an upload is retried as they may have expired.
+        """
+        from ..utils import amazon
+        config = current_app.config
+
+        if not upload.multipart_upload_id and size <= config['UPLOAD_MULTIPART_THRESHOLD']:
+            form = amazon.presigned_recording_post(upload.project_id, upload.recording_id, size)
+            return {'method': 'POST', 'url': form['url'], 'fields': form['fields']}
+
+        if not upload.multipart_upload_id:
+            multipart_upload_id = amazon.create_multipart_recording(upload.project_id, upload.recording_id)
+            # A concurrent retry of the upload may have started a multipart upload first, which is then used
+            SessionUpload.query.filter_by(id=upload.id, multipart_upload_id=None).update(
+                {'multipart_upload_id': multipart_upload_id}, synchronize_session=False)
+            db.session.commit()
+        part_size = max(config['UPLOAD_PART_SIZE'], -(-size // MAX_PARTS))
+        parts = amazon.presigned_recording_parts(
+            upload.project_id, upload.recording_id, upload.multipart_upload_id, -(-size // part_size))
+        return {'method': 'PUT', 'part_size': part_size, 'parts': parts}
+
+
+class ProjectSessionUpload(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/sessions/uploads/<int:uid>/
+    """
+    @jwt_required
+    def post(self, pid, uid):
+        """
+        FINALIZES an upload once the recording is uploaded, which creates the session. The body is as the form of
+        ProjectSessions.post without the recording, where participants and prompts are lists rather than JSON.
+
+        Finalizing an upload again returns the response of the first (with an Idempotent-Replayed header),
+        or 409 while the first is in progress.
+
+        :param pid: the project to create the session for
+        :param uid: the upload that the recording was uploaded to
+        """
+        user, project = user_and_project(pid)
+        upload = SessionUpload.query.get(uid)
+        if not upload or upload.user_id != user.id or upload.project_id != pid:
+            return custom_response(404, errors=['sessions.UNKNOWN_UPLOAD'])
+        if upload.status == SessionUpload.COMPLETE:
+            return {}, 201, {'Idempotent-Replayed': 'true'}
+
+        data = helpers.jsonify_request_or_abort()
+        validator = HelperSchemaValidator('sessions')
+        for attribute, _type in [('participants', 'list'), ('prompts', 'list'), ('consent', 'str'),
+                                 ('created_on', 'str'), ('lang', None)]:
+            validator.validate(attribute, _type, data)
+        helpers.abort_if_errors_in_validation(['sessions.%s' % error for error in validator.errors])
+        try:
+            datetime.strptime(data['created_on'], "%m/%d/%Y %H:%M:%S")
+        except ValueError:
+            return custom_response(400, errors=['sessions.CREATED_ON_IS_INVALID'])
+        prompts = ProjectSessions.validate_and_serialize(data['prompts'], 'prompts', RecordingAnnotationSchema(many=True))
+        participants = ProjectSessions.validate_and_serialize(
+            data['participants'], 'participants', ParticipantScheme(many=True))
+
+        # Only one request finalizes an upload; the time it became pending is when it becomes stale from
+        claimed = SessionUpload.query.filter_by(id=uid, status=SessionUpload.UPLOADING).update(
+            {'status': SessionUpload.PENDING, 'created_on': db.func.now()}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return custom_response(409, errors=['sessions.UPLOAD_IN_PROGRESS'])
+        try:
+            self.__verify_recording(upload)
+            response = ProjectSessions.create_session(user, project, data, prompts, participants, upload)
+        except Exception:
+            # The recording can be uploaded (or the upload finalized) again, unless the session was created
+            db.session.rollback()
+            SessionUpload.query.filter_by(id=uid, status=SessionUpload.PENDING).update(
+                {'status': SessionUpload.UPLOADING}, synchronize_session=False)
+            db.session.commit()
+            raise
+
+        thread = threading.Thread(
+            target=store_waveform, args=(current_app._get_current_object(), pid, upload.recording_id))
+        thread.daemon = True
+        thread.start()
+        return response
+
+    @staticmethod
+    def __verify_recording(upload):
+        """
+        Completes a multipart upload, then confirms that the recording on S3 is the size the device started the
+        upload with. Otherwise, the recording is deleted (and a multipart upload started again by a retry).
+        """
+        from ..utils import amazon
+        if upload.multipart_upload_id and not amazon.complete_multipart_recording(
+                upload.project_id, upload.recording_id, upload.multipart_upload_id, upload.size):
+            raise CustomException(400, errors=['sessions.RECORDING_NOT_UPLOADED'])
+
+        size = amazon.recording_size(upload.project_id, upload.recording_id)
+        if size is not None and size != upload.size:
+            amazon.delete_recording(upload.project_id, upload.recording_id)
+            upload.multipart_upload_id = None
+            db.session.commit()
+            size = None
+        if size is None:
+            raise CustomException(400, errors=['sessions.RECORDING_NOT_UPLOADED'])
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+The waveform of the recording of a session, which players draw before (or without) downloading the audio
+"""
+from ..models.projects import InterviewSession, Project
+from ..utils import cache, clients
+from ..utils.general import custom_response
+from flask import request
+from flask_restful import Resource
+from flask_jwt_extended import jwt_optional, get_jwt_identity
+import gabber.utils.helpers as helpers
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 10000
+
+
+def waveforms_cache():
+    """
+    Waveforms do not change once stored, hence the decoded sidecars are kept for the most viewed sessions.
+    """
+    return clients.get('waveforms_cache', lambda: cache.Cache(ttl=60 * 60, max_size=32))
+
+
+class WaveformNotGenerated(Exception):
+    pass
+
+
+def load_waveform(session):
+    """
+    :return: the decoded waveform of the session (see waveform.load), or None if it has not been generated.
+    """
+    from ..utils import amazon, waveform
+
+    def fetch():
+        data = amazon.download_waveform(session.project_id, session.id)
+        # Raised rather than returned so that it is not cached, as the waveform may be generated later
+        if not data:
+            raise WaveformNotGenerated()
+        return waveform.load(data)
+
+    try:
+        return waveforms_cache().get(session.id, fetch)
+    except WaveformNotGenerated:
+        return None
+
+
+class SessionWaveform(Resource):
+    """
+    Mapped to: /api/projects/<int:pid>/sessions/<string:sid>/waveform/
+
+    Note: the number of peaks can be set as a query parameter, e.g. /?points=800
+    """
+    @jwt_optional
+    def get(self, pid, sid):
+        """
+        The min/max peaks of the recording in the JSON format of audiowaveform (see utils/waveform.py)
+        """
+        helpers.abort_on_unknown_project_id(pid)
+        project = Project.query.get(pid)
+        session = InterviewSession.query.get(sid)
+        helpers.abort_if_unknown_session(session)
+        helpers.abort_if_session_not_in_project(session, pid)
+
+        jwt_user = get_jwt_identity()
+        user = helpers.current_user()
+        if jwt_user or not project.is_public:
+            helpers.abort_if_not_a_member_and_private(user, project)
+        helpers.abort_if_session_not_viewable(user, project, session)
+
+        points = request.args.get('points', DEFAULT_POINTS, type=int)
+        if points < 1 or points > MAX_POINTS:
+            return custom_response(400, errors=['waveform.INVALID_POINTS'])
+
+        waveform = load_waveform(session)
+        if not waveform:
+            return custom_response(404, errors=['waveform.NOT_GENERATED'])
+
+        from ..utils.waveform import view
+        return custom_response(200, data=view(*waveform, points=points))
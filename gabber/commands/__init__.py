@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Maintenance commands available through the Flask CLI, e.g. `flask indexes verify`
+"""
+
+
+def init_app(app):
+    from .indexes import indexes
+    from .counters import counters
+    from .bench import bench
+    from .transcode import transcode
+    from .waveform import waveform
+    from .synthetic import synthetic
+    app.cli.add_command(indexes)
+    app.cli.add_command(counters)
+    app.cli.add_command(bench)
+    app.cli.add_command(transcode)
+    app.cli.add_command(waveform)
+    app.cli.add_command(synthetic)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the hot paths of the API, which should be run against a database seeded with data.
+
+Usage: `flask bench responses --dataset sessions`
+"""
+import click
+import os
+import resource
+import time
+from flask import current_app as app
+from flask.cli import AppGroup
+from .. import db
+
+bench = AppGroup('bench', help='Benchmark the hot paths of the API.')
+
+
+def _rss_kb():
+    """
+    The current resident set size of this process in KB (Linux only).
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def measure(func):
+    """
+    Runs the function in a forked process so that memory held by earlier runs does not skew the result.
+
+    :return: a tuple of the increase of the peak resident memory (KB) and the duration (seconds) of func.
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        # The connections of the parent must not be shared with the child
+        db.engine.dispose()
+        before, start = _rss_kb(), time.time()
+        func()
+        duration = time.time() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(write, ('%d %f' % (peak - before, duration)).encode('ascii'))
+        os._exit(0)
+    os.close(write)
+    result = os.read(read, 64).decode('ascii')
+    os.close(read)
+    os.waitpid(pid, 0)
+    if not result:
+        raise click.ClickException('The benchmark process failed')
+    peak, duration = result.split()
+    return int(peak), float(duration)
+
+
+def _dataset(name, project_id):
+    """
+    :return: a tuple of functions that return (all rows as a list, the rows as an iterable) and the schema
+    """
+    from ..api.schemas.project import ProjectModelSchema
+    from ..api.schemas.session import RecordingSessionsSchema
+    from ..models.projects import Project, InterviewSession
+    from ..utils.general import keyset_chunks
+
+    if name == 'projects':
+        query = Project.query.order_by(Project.id.desc())
+        return query.all, lambda: keyset_chunks(query, Project.id), ProjectModelSchema(many=True)
+
+    if not project_id:
+        project_id = db.session.query(Project.id).order_by(Project.num_sessions.desc()).limit(1).scalar()
+    query = InterviewSession.query.filter_by(project_id=project_id)
+    return query.all, query.all, RecordingSessionsSchema(many=True)
+
+
+@bench.command('responses')
+@click.option('--dataset', type=click.Choice(['sessions', 'projects']), default='sessions',
+              help='Serialize the sessions of a project or all projects.')
+@click.option('--project', 'project_id', type=int, default=None,
+              help='The project of the sessions; defaults to the project with most sessions.')
+def responses(dataset, project_id):
+    """
+    Peak memory and duration of buffered (custom_response) and streamed (streamed_response) list responses.
+    """
+    from ..utils.general import custom_response, streamed_response
+
+    def buffered():
+        with app.test_request_context():
+            rows, _, schema = _dataset(dataset, project_id)
+            custom_response(200, data=schema.dump(rows())).get_data()
+
+    def streamed():
+        with app.test_request_context():
+            _, rows, schema = _dataset(dataset, project_id)
+            for _ in streamed_response(200, rows(), schema.dump).response:
+                pass
+
+    for name, func in [('buffered', buffered), ('streamed', streamed)]:
+        peak, duration = measure(func)
+        click.echo('{:<10} peak memory +{:>8} KB {:>8.3f} s'.format(name, peak, duration))
+
+
+def _rate(func, count, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return count * repeat / (time.time() - start)
+
+
+@bench.command('serializers')
+@click.option('--limit', type=int, default=500, help='The maximum number of objects to serialize per schema.')
+@click.option('--repeat', type=int, default=3, help='How many times each serializer dumps the objects.')
+def serializers(limit, repeat):
+    """
+    Parity and objects per second of the compiled serializers against marshmallow.
+    """
+    from ..api.schemas import compiled
+    from ..api.schemas.annotations import UserAnnotationSchema, UserAnnotationCommentSchema
+    from ..api.schemas.project import ProjectModelSchema
+    from ..api.schemas.session import RecordingSessionsSchema
+    from ..models.projects import Project, InterviewSession, Connection, ConnectionComments
+
+    cases = [
+        ('RecordingSessionsSchema', RecordingSessionsSchema, compiled.recording_sessions, InterviewSession.query),
+        ('UserAnnotationSchema', UserAnnotationSchema, compiled.user_annotations, Connection.query),
+        ('UserAnnotationCommentSchema', UserAnnotationCommentSchema, compiled.user_annotation_comments,
+         ConnectionComments.query),
+        ('ProjectModelSchema', ProjectModelSchema, compiled.projects, Project.query),
+    ]
+    mismatches = 0
+    for name, schema_class, serializer, query in cases:
+        rows = query.limit(limit).all()
+        if not rows:
+            click.echo('{:<28} no seeded data'.format(name))
+            continue
+        expected, actual = schema_class(many=True).dump(rows), serializer.dump(rows, many=True)
+        parity = 'OK' if expected == actual else 'MISMATCH'
+        mismatches += expected != actual
+        # A new schema is created for each dump as the API does per request
+        marshmallow_rate = _rate(lambda: schema_class(many=True).dump(rows), len(rows), repeat)
+        compiled_rate = _rate(lambda: serializer.dump(rows, many=True), len(rows), repeat)
+        click.echo('{:<28} parity {:<8} marshmallow {:>9.0f} obj/s  compiled {:>9.0f} obj/s  ({:.1f}x)'.format(
+            name, parity, marshmallow_rate, compiled_rate, compiled_rate / marshmallow_rate))
+    if mismatches:
+        raise click.ClickException('%i compiled serializers differ from marshmallow' % mismatches)
+
+
+# Run in a new interpreter by `flask bench startup`, which prints the durations as JSON
+_STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.time()
+import run
+imported = time.time()
+response = run.app.test_client().get(sys.argv[1])
+first_request = time.time()
+print(json.dumps({
+    'import': imported - start,
+    'first_request': first_request - imported,
+    'status': response.status_code,
+    'modules': [name for name in sys.argv[2:] if name in sys.modules]
+}))
+'''
+
+
+@bench.command('startup')
+@click.option('--repeat', type=int, default=5, help='How many new interpreters to start.')
+@click.option('--url', default='/api/help/languages/', help='The URL of the first request.')
+def startup(repeat, url):
+    """
+    Import time of run.py and the time to (respond to) the first request, which is the median of new interpreters.
+    """
+    import json
+    import subprocess
+    import sys
+
+    heavy = ['boto3', 'botocore', 'pyfcm', 'numpy', 'PIL']
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', _STARTUP_SCRIPT, url] + heavy,
+                                         cwd=os.path.dirname(app.root_path))
+        results.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+
+    def median(key):
+        values = sorted(result[key] for result in results)
+        return values[len(values) // 2]
+
+    click.echo('import run.py   {:>8.3f} s'.format(median('import')))
+    click.echo('first request   {:>8.3f} s  (GET {} {})'.format(median('first_request'), url, results[-1]['status']))
+    click.echo('heavy modules   {}'.format(', '.join(results[-1]['modules']) or 'none'))
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))] if values else 0
+
+
+@bench.command('load')
+@click.option('--url', default='http://localhost:5000', help='The server to load, i.e. nginx in front of uWSGI.')
+@click.option('--duration', type=float, default=30, help='How long (seconds) to send requests for.')
+@click.option('--readers', type=int, default=16, help='The number of concurrent clients of fast reads.')
+@click.option('--read-path', default='/api/help/languages/', help='The path of the fast reads.')
+@click.option('--upload-url', default=None, help='The server of the slow requests, if not --url, e.g. a pool directly.')
+@click.option('--uploaders', type=int, default=4, help='The number of concurrent clients of slow requests.')
+@click.option('--upload-path', default=None,
+              help='The path of the slow requests; defaults to the CSV export of the project with most sessions.')
+@click.option('--as-user', 'email', default=None,
+              help='The email of the user requests are made as; defaults to the creator of the project.')
+def load(url, duration, readers, read_path, upload_url, uploaders, upload_path, email):
+    """
+    Throughput and latency of fast reads while slow requests (uploads, exports) are served at the same time.
+
+    Run against each server profile (APP_MODE=dev and APP_MODE=prod) to compare them: with a single pool,
+    reads wait for workers that are held by slow requests.
+    """
+    import requests
+    import threading
+    from flask_jwt_extended import create_access_token
+    from ..models.projects import Project
+    from ..models.user import User
+
+    if not upload_path or not email:
+        project = Project.query.order_by(Project.num_sessions.desc()).first()
+        if not project:
+            raise click.ClickException('Seed a project, or set --upload-path and --as-user')
+        upload_path = upload_path or '/api/projects/%i/export/?format=csv' % project.id
+        email = email or User.query.get(project.creator).email
+    headers = {'Authorization': 'Bearer %s' % create_access_token(identity=email)}
+
+    results = {'reads': [], 'uploads': []}
+    deadline = time.time() + duration
+
+    def client(kind, path):
+        session = requests.Session()
+        while time.time() < deadline:
+            start = time.time()
+            try:
+                ok = session.get(path, headers=headers, timeout=duration).status_code < 400
+            except requests.RequestException:
+                ok = False
+            # list.append is atomic, hence the results of threads are not locked
+            results[kind].append((time.time() - start, ok))
+
+    threads = [threading.Thread(target=client, args=('reads', url + read_path)) for _ in range(readers)]
+    threads += [threading.Thread(target=client, args=('uploads', (upload_url or url) + upload_path))
+                for _ in range(uploaders)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for kind, path in [('reads', read_path), ('uploads', upload_path)]:
+        latencies = [latency * 1000 for latency, _ in results[kind]]
+        errors = len([ok for _, ok in results[kind] if not ok])
+        click.echo('{:<8} {:>7} requests {:>8.1f} req/s  p50 {:>7.0f} ms  p95 {:>7.0f} ms  p99 {:>7.0f} ms  '
+                   '{} errors  (GET {})'.format(
+                       kind, len(latencies), len(latencies) / float(duration), _percentile(latencies, 50),
+                       _percentile(latencies, 95), _percentile(latencies, 99), errors, path))
+
+
+@bench.command('payloads')
+@click.option('--query', 'queries', multiple=True,
+              help='The query string of a request, e.g. "fields=content&lang=en"; defaults to typical clients.')
+@click.option('--repeat', type=int, default=5, help='How many times each request is made.')
+@click.option('--as-user', 'email', default=None, help='The email of the user requests are made as; anonymous if not set.')
+def payloads(queries, repeat, email):
+    """
+    Payload size, latency and number of queries of Projects.get with sparse fields and languages.
+    """
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+
+    queries = queries or ['', 'lang=en', 'fields=content,image,privacy&lang=en', 'fields=content&lang=en']
+    headers = {'Authorization': 'Bearer %s' % create_access_token(identity=email)} if email else {}
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        client = app.test_client()
+        for query in queries:
+            durations, size = [], 0
+            for _ in range(repeat):
+                del statements[:]
+                start = time.time()
+                response = client.get('/api/projects/?' + query, headers=headers)
+                size = len(response.get_data())
+                durations.append(time.time() - start)
+                if response.status_code != 200:
+                    raise click.ClickException('GET /api/projects/?%s returned %i' % (query, response.status_code))
+            click.echo('{:<40} {:>10} bytes  p50 {:>7.1f} ms  {:>5} queries'.format(
+                query or '(all fields and languages)', size, _percentile(durations, 50) * 1000, len(statements)))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
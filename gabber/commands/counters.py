@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Recomputes the denormalized counters (sessions, annotations and comments), the longest annotation
+and the visibility of each session from the source tables.
+
+Usage: `flask counters repair`
+"""
+import click
+from flask.cli import AppGroup
+from .. import db
+from ..models.projects import Project, InterviewSession, Connection, ConnectionComments
+from ..models.user import SessionConsent
+
+counters = AppGroup('counters', help='Maintain the denormalized counter columns.')
+
+
+def _count(column, *criteria):
+    """
+    A correlated COUNT subquery, i.e. evaluated for each row of the table being updated.
+    """
+    return db.select([db.func.count(column)]).where(db.and_(*criteria)).as_scalar()
+
+
+def repair_counters():
+    """
+    Recomputes every counter in bulk: one UPDATE statement per counter column.
+
+    :return: a dictionary of the counter column name and the number of rows updated
+    """
+    updates = [
+        (Project.num_sessions, _count(InterviewSession.id, InterviewSession.project_id == Project.id)),
+        (InterviewSession.num_annotations, _count(
+            Connection.id, Connection.session_id == InterviewSession.id, Connection.is_active == True)),
+        (Connection.num_comments, _count(
+            ConnectionComments.id, ConnectionComments.connection_id == Connection.id,
+            ConnectionComments.is_active == True)),
+        # Includes soft-deleted annotations, as the maximum only needs to be an upper bound
+        (InterviewSession.max_annotation_length, db.select([
+            db.func.coalesce(db.func.max(Connection.end_interval - Connection.start_interval), 0)
+        ]).where(Connection.session_id == InterviewSession.id).as_scalar()),
+    ]
+    # Use the session query directly as the model query of some models excludes soft-deleted rows.
+    updated = dict((column.key, db.session.query(column.class_).update({column: count}, synchronize_session=False))
+                   for column, count in updates)
+    updated.update(repair_visibility())
+    db.session.commit()
+    return updated
+
+
+def _consents(*criteria):
+    return db.exists().where(db.and_(SessionConsent.session_id == InterviewSession.id, *criteria))
+
+
+def repair_visibility(chunk_size=1000):
+    """
+    Recomputes the visibility of every session in one UPDATE (see InterviewSession.visibility_from),
+    and the end of their embargo in chunks, as date arithmetic differs between databases.
+
+    :return: a dictionary of the column name and the number of rows updated
+    """
+    visibility = db.case([
+        (_consents(SessionConsent.type == InterviewSession.PRIVATE), InterviewSession.PRIVATE),
+        (db.and_(_consents(), ~_consents(db.or_(SessionConsent.type != InterviewSession.PUBLIC,
+                                                 SessionConsent.type == None))), InterviewSession.PUBLIC),
+    ], else_=InterviewSession.MEMBERS)
+    updated = {'visibility': db.session.query(InterviewSession).update(
+        {InterviewSession.visibility: visibility}, synchronize_session=False)}
+
+    embargoes, last_id = 0, ''
+    while True:
+        sessions = db.session.query(InterviewSession.id, InterviewSession.created_on).filter(
+            InterviewSession.id > last_id, InterviewSession.created_on != None
+        ).order_by(InterviewSession.id).limit(chunk_size).all()
+        if not sessions:
+            break
+        last_id = sessions[-1].id
+        db.session.bulk_update_mappings(InterviewSession, [
+            {'id': session.id, 'embargoed_until': session.created_on + InterviewSession.EMBARGO}
+            for session in sessions])
+        embargoes += len(sessions)
+    updated['embargoed_until'] = embargoes
+    return updated
+
+
+@counters.command('repair')
+def repair():
+    """
+    Recompute the session, annotation and comment counters, the longest annotations and session visibility.
+    """
+    for column, rows in sorted(repair_counters().items()):
+        click.echo('{:<20} {} rows'.format(column, rows))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Verifies (through EXPLAIN) that the hot queries of the models and helpers are served by an index.
+
+Usage: `flask indexes verify` against a database that has been seeded with data, as the query
+planner may otherwise choose a full scan for (near) empty tables.
+"""
+import click
+from flask.cli import AppGroup
+from .. import db
+from ..models.projects import Membership, Roles, Project, ProjectLanguage, TopicLanguage, InterviewSession, \
+    InterviewPrompts, InterviewParticipants, Connection, ConnectionComments
+from ..models.user import User, SessionConsent
+
+indexes = AppGroup('indexes', help='Inspect the database indexes used by the API.')
+
+
+def _sample(column):
+    """
+    A value of the column from the seeded data, which is used as the literal in the query to EXPLAIN.
+    """
+    row = db.session.query(column).filter(column.isnot(None)).first()
+    return row[0] if row else None
+
+
+def _checks():
+    """
+    The queries to verify as (name, table, builder), where the builder returns None
+    when there is no seeded data to build the query with.
+    """
+    return [
+        # models/projects.py
+        ('Membership.leave_project', 'membership', lambda uid, pid: Membership.query.filter_by(
+            user_id=uid, project_id=pid, deactivated=False).order_by(Membership.id.desc()),
+         Membership.user_id, Membership.project_id),
+        ('Project.members', 'membership', lambda pid: Membership.query.filter(
+            Membership.project_id == pid, Membership.deactivated == False),
+         Membership.project_id),
+        ('Roles.user_role', 'roles', lambda: Roles.query.filter_by(name='participant')),
+        ('Project.topics', 'topic_language', lambda pid: TopicLanguage.query.filter_by(project_id=pid),
+         TopicLanguage.project_id),
+        ('InterviewSession.all_consented_sessions_by_project', 'interview_session',
+         lambda pid: InterviewSession.query.filter_by(project_id=pid).order_by(InterviewSession.created_on),
+         InterviewSession.project_id),
+        ('InterviewSession.viewable', 'interview_session',
+         lambda pid: InterviewSession.query.filter(
+             InterviewSession.project_id == pid, InterviewSession.viewable(True)),
+         InterviewSession.project_id),
+        ('InterviewSession.prompts', 'interview_prompts',
+         lambda sid: InterviewPrompts.query.filter_by(interview_id=sid), InterviewPrompts.interview_id),
+        ('InterviewSession.consents', 'session_consent',
+         lambda sid: SessionConsent.query.filter_by(session_id=sid), SessionConsent.session_id),
+        ('InterviewSession.user_is_participant', 'interview_participants',
+         lambda sid, uid: InterviewParticipants.query.filter_by(interview_id=sid, user_id=uid),
+         InterviewParticipants.interview_id, InterviewParticipants.user_id),
+        ('InterviewSession.connections', 'connection',
+         lambda sid: Connection.query.filter_by(session_id=sid), Connection.session_id),
+        ('Connection.overlapping', 'connection',
+         lambda sid: Connection.overlapping(InterviewSession.query.get(sid), 60, 120), Connection.session_id),
+        ('Connection.comments', 'connection_comments',
+         lambda aid: ConnectionComments.query.filter(
+             ConnectionComments.connection_id == aid, ConnectionComments.parent_id == None),
+         ConnectionComments.connection_id),
+        ('ConnectionComments.replies', 'connection_comments',
+         lambda cid: ConnectionComments.query.filter_by(parent_id=cid), ConnectionComments.parent_id),
+        ('ProjectLanguage.slug', 'project_language',
+         lambda slug: ProjectLanguage.query.filter_by(slug=slug), ProjectLanguage.slug),
+        # utils/helpers.py
+        ('helpers.abort_on_unknown_project_id', 'project',
+         lambda pid: Project.query.filter_by(id=pid), Project.id),
+        ('helpers.abort_if_unauthorized', 'user',
+         lambda email: User.query.filter_by(email=email), User.email),
+        ('helpers.abort_if_unknown_comment', 'connection_comments',
+         lambda cid: ConnectionComments.query.filter_by(id=cid), ConnectionComments.id),
+        ('helpers.abort_if_invalid_parameters', 'interview_session',
+         lambda sid: InterviewSession.query.filter_by(id=sid), InterviewSession.id),
+        ('helpers.abort_if_not_a_member_and_private', 'membership',
+         lambda uid: Membership.query.filter_by(user_id=uid), Membership.user_id),
+    ]
+
+
+def _compile(query):
+    # Eager loads are disabled so that only the table being verified is part of the plan.
+    statement = query.enable_eagerloads(False).statement
+    return str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _index_used(sql, table):
+    """
+    Runs EXPLAIN for the SQL and returns the name of the index used to access the table, otherwise None.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        for row in db.session.execute('EXPLAIN ' + sql):
+            row = dict(row.items())
+            if row.get('table') == table:
+                return row.get('key')
+    elif dialect == 'sqlite':
+        for row in db.session.execute('EXPLAIN QUERY PLAN ' + sql):
+            detail = row[-1]
+            if table in detail.split() and 'USING' in detail:
+                return detail.split('USING', 1)[1].strip()
+    else:
+        raise click.ClickException('EXPLAIN is not supported for the %s dialect' % dialect)
+    return None
+
+
+@indexes.command('verify')
+def verify():
+    """
+    EXPLAIN each hot query and report whether it uses an index.
+    """
+    missing = 0
+    for check in _checks():
+        name, table, builder, columns = check[0], check[1], check[2], check[3:]
+        values = [_sample(column) for column in columns]
+        if any(value is None for value in values):
+            click.echo('SKIP  {:<55} no seeded data'.format(name))
+            continue
+        index = _index_used(_compile(builder(*values)), table)
+        if index:
+            click.echo('OK    {:<55} {}'.format(name, index))
+        else:
+            missing += 1
+            click.echo('MISS  {:<55} full scan of {}'.format(name, table))
+    if missing:
+        raise click.ClickException('%i queries do not use an index' % missing)
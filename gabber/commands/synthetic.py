@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+Fills the database with synthetic users, projects, sessions, consents, annotations, codes and comments to
+reproduce production-scale behaviour locally, and snapshots datasets so that benchmarks (see bench.py) can be
+run again against the same data.
+
+Usage: `flask synthetic generate --projects 100 --sessions 50 --seed 1`, then `flask synthetic snapshot <path>`
+and `flask synthetic restore <path>`
+"""
+import bcrypt
+import click
+import gzip
+import json
+import random
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app as app
+from flask.cli import AppGroup
+from itsdangerous import URLSafeSerializer
+from slugify import slugify
+from .. import db
+from ..api.membership import ROLES
+from ..models.language import SupportedLanguage
+from ..models.projects import Project, ProjectLanguage, TopicLanguage, Membership, Roles, Organisation, \
+    Codebook, Code, InterviewSession, InterviewPrompts, InterviewParticipants, Connection, ConnectionComments, \
+    codes_for_connections
+from ..models.user import User, SessionConsent
+
+synthetic = AppGroup('synthetic', help='Generate synthetic datasets and snapshot them.')
+
+# Sessions are created over this period, so that a seed always generates the same dataset
+EPOCH = datetime(2018, 1, 1)
+PERIOD = timedelta(days=730)
+LANGUAGES = [('en', 'English', 'English'), ('it', 'Italian', 'Italiano'), ('es', 'Spanish', u'Español')]
+CONSENTS = [InterviewSession.PUBLIC, InterviewSession.MEMBERS, InterviewSession.PRIVATE]
+BCRYPT_ALPHABET = './ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+
+FIRST_NAMES = ['Ann', 'Bob', 'Chioma', 'Dev', 'Elif', 'Femi', 'Grace', 'Hamid', 'Ines', 'Jamal', 'Kai', 'Lena',
+               'Marta', 'Nika', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sami', 'Tom', 'Uma', 'Vik', 'Wen', 'Yusuf']
+LAST_NAMES = ['Adams', 'Bianchi', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ivanova', 'Jones',
+              'Khan', 'Lopez', 'Morgan', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Smith', 'Tanaka', 'Williams']
+WORDS = ('we talked about the community garden and how it brought neighbours together after the library closed '
+         'she remembers when the river flooded every spring and the school became a shelter for families '
+         'young people want more places to meet while older residents worry about the cost of living '
+         'volunteers organise the market each week but funding for the centre is uncertain next year').split()
+
+
+def _text(rng, low, high, limit):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))[:limit]
+
+
+def _around(rng, average):
+    """
+    A count between zero and twice the average, so that the dataset has the same size on average
+    but projects, sessions and annotations differ in size.
+    """
+    return rng.randint(0, 2 * average)
+
+
+def _password_hash(rng, password):
+    """
+    A bcrypt hash as User.set_password creates, but salted from the seed rather than at random, so that
+    a seed generates the same dataset.
+    """
+    salt = '$2a$%02d$%s%s' % (app.config.get('BCRYPT_LOG_ROUNDS', 12),
+                             ''.join(rng.choice(BCRYPT_ALPHABET) for _ in range(21)), rng.choice('.Oeu'))
+    return bcrypt.hashpw(password.encode('utf-8'), salt.encode('ascii')).decode('ascii')
+
+
+def _consent_mix(ctx, param, value):
+    """
+    Parses the weights of each consent type, e.g. 'public=6,members=3,private=1'
+    """
+    try:
+        weights = dict((consent, float(weight)) for consent, weight in (i.split('=') for i in value.split(',')))
+    except ValueError:
+        raise click.BadParameter('expected e.g. public=6,members=3,private=1')
+    if not set(weights).issubset(CONSENTS) or sum(weights.values()) <= 0:
+        raise click.BadParameter('the consent types are %s' % ', '.join(CONSENTS))
+    return [weights.get(consent, 0) for consent in CONSENTS]
+
+
+def _weighted(rng, weights):
+    point, total = rng.random() * sum(weights), 0
+    for index, weight in enumerate(weights):
+        total += weight
+        if point < total:
+            return index
+    return len(weights) - 1
+
+
+def _allow_explicit_zero_ids():
+    """
+    Organisations and roles have zero as a primary key, which MySQL otherwise replaces with the next ID.
+    """
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute("SET SESSION sql_mode = CONCAT(@@sql_mode, ',NO_AUTO_VALUE_ON_ZERO')")
+
+
+class BulkInserter(object):
+    """
+    Buffers rows by table and inserts them with one multi-row INSERT (executemany) per table and chunk,
+    as creating models through the session is too slow for millions of rows.
+
+    Each chunk is inserted in the order of the foreign keys between tables, hence rows must be added
+    after the rows they refer to, and is committed so that transactions stay small.
+    """
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.rows = OrderedDict((table, []) for table in db.metadata.sorted_tables)
+        self.buffered = 0
+        self.inserted = Counter()
+
+    def add(self, model, **row):
+        table = getattr(model, '__table__', model)
+        self.rows[table].append(row)
+        self.buffered += 1
+        if self.buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for table, rows in self.rows.items():
+            if rows:
+                db.session.execute(table.insert(), rows)
+                self.inserted[table.name] += len(rows)
+                del rows[:]
+        db.session.commit()
+        self.buffered = 0
+
+
+def _next_ids(*models):
+    return dict((model, (db.session.query(db.func.max(model.id)).scalar() or 0) + 1) for model in models)
+
+
+def _reference_data(inserter):
+    """
+    The languages, roles and organisation that projects and users refer to, which are created if missing.
+
+    :return: a tuple of the language IDs and a dictionary of role names and their IDs
+    """
+    languages = [language.id for language in SupportedLanguage.query.order_by(SupportedLanguage.id)]
+    if not languages:
+        for index, (code, iso_name, endonym) in enumerate(LANGUAGES, 1):
+            inserter.add(SupportedLanguage, id=index, code=code, iso_name=iso_name, endonym=endonym)
+            languages.append(index)
+    roles = dict((role.name, role.id) for role in Roles.query)
+    for name, role_id in sorted(ROLES.items(), key=lambda role: role[1]):
+        if name not in roles:
+            inserter.add(Roles, id=role_id, name=name)
+            roles[name] = role_id
+    if not Organisation.query.get(0):
+        inserter.add(Organisation, id=0, name='Individual', description='Projects without an organisation')
+    inserter.flush()
+    return languages, roles
+
+
+def generate_dataset(rng, options, chunk_size=10000):
+    """
+    Inserts a synthetic dataset with the denormalized counters and visibility of sessions already computed,
+    i.e. as if it were created through the API.
+
+    :param rng: the random.Random that generates the dataset
+    :param options: a dictionary of the parameters of the dataset (see the options of `flask synthetic generate`)
+    :param chunk_size: the number of rows inserted per statement
+    :return: a Counter of the table names and the number of rows inserted
+    """
+    _allow_explicit_zero_ids()
+    inserter = BulkInserter(chunk_size)
+    languages, roles = _reference_data(inserter)
+    ids = _next_ids(User, Project, ProjectLanguage, TopicLanguage, Membership, Codebook, Code, InterviewPrompts,
+                    InterviewParticipants, SessionConsent, Connection, ConnectionComments)
+
+    def next_id(model):
+        ids[model] += 1
+        return ids[model] - 1
+
+    # bcrypt is deliberately slow, hence all users have the same password
+    password = _password_hash(rng, options['password'])
+    users = []
+    for _ in range(options['users']):
+        user_id = next_id(User)
+        created_on = EPOCH + timedelta(seconds=rng.randint(0, PERIOD.days * 86400 // 2))
+        registered = rng.random() >= options['unregistered']
+        inserter.add(User, id=user_id, email='user%d@example.org' % user_id, password=password,
+                     fullname='%s %s' % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+                     lang=rng.choice(languages), registered=registered, verified=registered and rng.random() < 0.9,
+                     fcm_token=None, claims_version=0, created_on=created_on, updated_on=created_on)
+        users.append(user_id)
+
+    tokens = URLSafeSerializer(app.config['SECRET_KEY'])
+    for _ in range(options['projects']):
+        project_id = next_id(Project)
+        created_on = EPOCH + timedelta(seconds=rng.randint(0, PERIOD.days * 86400 // 2))
+        members = rng.sample(users, min(len(users), max(1, _around(rng, options['members']))))
+        project_languages = rng.sample(languages, rng.randint(1, min(len(languages), options['languages'])))
+        num_sessions = _around(rng, options['sessions'])
+        inserter.add(Project, id=project_id, image='default', is_active=rng.random() >= options['deleted'],
+                     is_public=rng.random() < 0.7, organisation=0, creator=members[0],
+                     default_lang=project_languages[0], num_sessions=num_sessions,
+                     created_on=created_on, updated_on=created_on)
+
+        for lang_id in project_languages:
+            content_id = next_id(ProjectLanguage)
+            title = _text(rng, 2, 6, 64).capitalize()
+            inserter.add(ProjectLanguage, id=content_id, project_id=project_id, lang_id=lang_id, title=title,
+                         description=_text(rng, 10, 60, 768), slug='%s-%d' % (slugify(title), content_id),
+                         updated_on=created_on)
+        topics = dict((lang_id, []) for lang_id in project_languages)
+        for _ in range(max(1, _around(rng, options['topics']))):
+            for lang_id in project_languages:
+                topic_id = next_id(TopicLanguage)
+                inserter.add(TopicLanguage, id=topic_id, project_id=project_id, lang_id=lang_id,
+                             text=_text(rng, 3, 12, 260), is_active=1, updated_on=created_on)
+                topics[lang_id].append(topic_id)
+
+        for index, user_id in enumerate(members):
+            role = 'administrator' if index == 0 else 'researcher' if rng.random() < 0.2 else 'participant'
+            inserter.add(Membership, id=next_id(Membership), user_id=user_id, project_id=project_id,
+                         role_id=roles[role], confirmed=index == 0 or rng.random() < 0.9, deactivated=False,
+                         date_sent=created_on, date_accepted=created_on)
+
+        codebook_id = next_id(Codebook)
+        inserter.add(Codebook, id=codebook_id, project_id=project_id, name=None)
+        codes = [next_id(Code) for _ in range(options['codes'])]
+        for code_id in codes:
+            inserter.add(Code, id=code_id, text=_text(rng, 1, 3, 64), is_active=1, codebook_id=codebook_id,
+                         updated_on=created_on)
+
+        for _ in range(num_sessions):
+            _generate_session(rng, options, inserter, next_id, tokens, project_id, created_on, members,
+                              topics, codes)
+    inserter.flush()
+    return inserter.inserted
+
+
+def _generate_session(rng, options, inserter, next_id, tokens, project_id, project_created_on, members,
+                      topics, codes):
+    """
+    Inserts a session of the project, its participants and their consents, its prompts, and its annotations,
+    their codes and the trees of comments on each annotation.
+    """
+    session_id = '%032x' % rng.getrandbits(128)
+    created_on = project_created_on + timedelta(seconds=rng.randint(0, PERIOD.days * 86400 // 2))
+    lang_id = rng.choice(list(topics))
+    duration = rng.randint(60, 3600)
+    participants = rng.sample(members, rng.randint(1, min(len(members), options['participants'])))
+
+    consent = CONSENTS[_weighted(rng, options['consent_mix'])]
+    consents = [rng.choice(CONSENTS) if rng.random() < options['changed_consents'] else consent
+                for _ in participants]
+
+    annotations = []
+    for _ in range(_around(rng, options['annotations'])):
+        start = rng.randint(0, duration - 5)
+        comments = _comment_tree(rng, options, participants + members[:1])
+        annotations.append((start, min(duration, start + rng.randint(5, 120)), rng.random() >= options['deleted'],
+                            comments, rng.sample(codes, rng.randint(0, min(len(codes), options['tags'])))))
+
+    inserter.add(InterviewSession, id=session_id, lang_id=lang_id, creator_id=participants[0],
+                 project_id=project_id, created_on=created_on,
+                 num_annotations=sum(1 for annotation in annotations if annotation[2]),
+                 max_annotation_length=max([end - start for start, end, _, _, _ in annotations] or [0]),
+                 visibility=InterviewSession.visibility_from(consents),
+                 embargoed_until=created_on + InterviewSession.EMBARGO)
+
+    for index, (user_id, consent_type) in enumerate(zip(participants, consents)):
+        inserter.add(InterviewParticipants, id=next_id(InterviewParticipants), user_id=user_id,
+                     interview_id=session_id, consent_type=0, role=index == 0)
+        consent_id = next_id(SessionConsent)
+        inserter.add(SessionConsent, id=consent_id, type=consent_type, session_id=session_id,
+                     participant_id=user_id, token=tokens.dumps(consent_id, app.config['SALT']),
+                     created_on=created_on, updated_on=created_on)
+
+    prompts = rng.sample(topics[lang_id], rng.randint(1, min(3, len(topics[lang_id]))))
+    for index, prompt_id in enumerate(prompts):
+        inserter.add(InterviewPrompts, id=next_id(InterviewPrompts), prompt_id=prompt_id, interview_id=session_id,
+                     start_interval=duration * index // len(prompts),
+                     end_interval=duration * (index + 1) // len(prompts))
+
+    for start, end, is_active, comments, tags in annotations:
+        annotation_id = next_id(Connection)
+        annotated_on = created_on + timedelta(minutes=rng.randint(10, 60 * 24 * 30))
+        inserter.add(Connection, id=annotation_id, content=_text(rng, 5, 40, 1024), start_interval=start,
+                     end_interval=end, is_active=is_active,
+                     num_comments=sum(1 for comment in comments if comment[2]),
+                     user_id=rng.choice(participants), session_id=session_id,
+                     created_on=annotated_on, updated_on=annotated_on)
+        for code_id in tags:
+            inserter.add(codes_for_connections, connection_id=annotation_id, code_id=code_id)
+
+        comment_ids = []
+        for parent, user_id, comment_is_active in comments:
+            comment_ids.append(next_id(ConnectionComments))
+            commented_on = annotated_on + timedelta(minutes=len(comment_ids) * rng.randint(1, 600))
+            inserter.add(ConnectionComments, id=comment_ids[-1], content=_text(rng, 3, 30, 1024),
+                         is_active=comment_is_active, parent_id=comment_ids[parent] if parent is not None else None,
+                         user_id=user_id, connection_id=annotation_id,
+                         created_on=commented_on, updated_on=commented_on)
+
+
+def _comment_tree(rng, options, users):
+    """
+    The comments of an annotation: replies to the annotation and, up to the comment depth, to each other.
+
+    :return: a list of (index of the parent comment in the list or None, user, is active), where parents
+        precede their replies
+    """
+    comments, parents = [], [(None, 1)]
+    while parents:
+        parent, depth = parents.pop(0)
+        for _ in range(_around(rng, options['comments'] if parent is None else options['replies'])):
+            comments.append((parent, rng.choice(users), rng.random() >= options['deleted']))
+            if depth < options['comment_depth']:
+                parents.append((len(comments) - 1, depth + 1))
+    return comments
+
+
+@synthetic.command('generate')
+@click.option('--seed', default=0, help='Generates the same dataset given the same seed and database.')
+@click.option('--users', default=1000, help='The number of users.')
+@click.option('--projects', default=20, help='The number of projects.')
+@click.option('--members', default=50, help='The average number of members of each project.')
+@click.option('--languages', default=2, help='The most languages of the content of each project.')
+@click.option('--topics', default=8, help='The average number of topics of each project.')
+@click.option('--codes', default=20, help='The number of codes of the codebook of each project.')
+@click.option('--sessions', default=50, help='The average number of sessions of each project.')
+@click.option('--participants', default=4, help='The most participants of each session.')
+@click.option('--consent-mix', default='public=6,members=3,private=1', callback=_consent_mix,
+              help='The weights of the consent that participants agree to when a session is created.')
+@click.option('--changed-consents', default=0.1, help='The fraction of participants that changed their consent.')
+@click.option('--annotations', default=10, help='The average number of annotations of each session.')
+@click.option('--tags', default=3, help='The most codes of each annotation.')
+@click.option('--comments', default=2, help='The average number of comments on each annotation.')
+@click.option('--replies', default=1, help='The average number of replies to each comment.')
+@click.option('--comment-depth', default=3, help='The most levels of the tree of comments of each annotation.')
+@click.option('--unregistered', default=0.3, help='The fraction of users that have not registered.')
+@click.option('--deleted', default=0.05, help='The fraction of projects, annotations and comments that are deleted.')
+@click.option('--password', default='password', help='The password of every user.')
+@click.option('--chunk-size', default=10000, help='The number of rows inserted per statement.')
+def generate(seed, chunk_size, **options):
+    """
+    Insert a synthetic dataset, in addition to existing data.
+    """
+    if options['participants'] < 1 or options['comment_depth'] < 1:
+        raise click.UsageError('sessions have at least one participant and comments a depth of one')
+    start = time.time()
+    # The next user ID is part of the seed, so that generating a dataset again adds different sessions
+    next_user_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    inserted = generate_dataset(random.Random('%d:%d' % (seed, next_user_id)), options, chunk_size)
+    for table, rows in sorted(inserted.items()):
+        click.echo('{:<24} {} rows'.format(table, rows))
+    duration = time.time() - start
+    total = sum(inserted.values())
+    click.echo('Inserted {} rows in {:.1f}s ({:.0f} rows/s)'.format(total, duration, total / max(duration, 1e-3)))
+
+
+def _revision():
+    """
+    The migration the database is at, as a snapshot can only be restored to the same schema.
+    """
+    try:
+        return db.session.execute('SELECT version_num FROM alembic_version').scalar()
+    except Exception:
+        db.session.rollback()
+        return None
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _decoder(column):
+    if isinstance(column.type, db.DateTime):
+        return lambda value: value and datetime.strptime(
+            value, '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S')
+    return lambda value: value
+
+
+@synthetic.command('snapshot')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--chunk-size', default=10000, help='The number of rows per line of the snapshot.')
+def snapshot(path, chunk_size):
+    """
+    Save every row of the database to PATH (gzipped JSON lines).
+    """
+    with gzip.open(path, 'wb') as output:
+        output.write((json.dumps({'revision': _revision()}) + '\n').encode('utf-8'))
+        for table in db.metadata.sorted_tables:
+            columns = [column.name for column in table.columns]
+            result = db.session.connection().execution_options(stream_results=True).execute(
+                table.select().order_by(*(table.primary_key.columns or table.columns)))
+            rows = 0
+            while True:
+                chunk = result.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                line = {'table': table.name, 'columns': columns, 'rows': [[_encode(v) for v in r] for r in chunk]}
+                output.write((json.dumps(line) + '\n').encode('utf-8'))
+                rows += len(chunk)
+            click.echo('{:<24} {} rows'.format(table.name, rows))
+
+
+@synthetic.command('restore')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.confirmation_option(prompt='Every row of the database is replaced by the snapshot. Continue?')
+def restore(path):
+    """
+    Replace every row of the database with the snapshot at PATH.
+    """
+    start = time.time()
+    tables = dict((table.name, table) for table in db.metadata.sorted_tables)
+    with gzip.open(path, 'rb') as snapshot_file:
+        header = json.loads(snapshot_file.readline().decode('utf-8'))
+        if header['revision'] and header['revision'] != _revision():
+            raise click.ClickException('The snapshot is of revision {} but the database is at {}; run '
+                                       '`flask db upgrade {}` first.'.format(header['revision'], _revision(),
+                                                                             header['revision']))
+        _allow_explicit_zero_ids()
+        for table in reversed(db.metadata.sorted_tables):
+            # Comments refer to each other, which MySQL checks for each row deleted
+            for key in table.foreign_keys:
+                if key.column.table is table:
+                    db.session.execute(table.update().values({key.parent.name: None}))
+            db.session.execute(table.delete())
+
+        inserted = Counter()
+        for line in snapshot_file:
+            chunk = json.loads(line.decode('utf-8'))
+            table = tables[chunk['table']]
+            decoders = [_decoder(table.columns[name]) for name in chunk['columns']]
+            db.session.execute(table.insert(), [
+                dict((name, decode(value)) for name, decode, value in zip(chunk['columns'], decoders, row))
+                for row in chunk['rows']])
+            inserted[table.name] += len(chunk['rows'])
+    db.session.commit()
+    for table, rows in sorted(inserted.items()):
+        click.echo('{:<24} {} rows'.format(table, rows))
+    click.echo('Restored {} rows in {:.1f}s'.format(sum(inserted.values()), time.time() - start))
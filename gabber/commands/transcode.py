@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Tracks the Elastic Transcoder jobs of session recordings.
+
+Usage: `flask transcode poll --interval 30`, e.g. as a service, where the pipeline does not notify
+the API (/api/transcode/notifications/) through SNS.
+"""
+import click
+import time
+from flask.cli import AppGroup
+from .. import db
+from ..models.projects import TranscodeJob
+
+transcode = AppGroup('transcode', help='Track the transcoding of session recordings.')
+
+
+def poll_pending():
+    """
+    Updates the status of all jobs that have not finished.
+
+    :return: a tuple of (the number of pending jobs, the number of jobs whose status changed)
+    """
+    jobs = TranscodeJob.query.filter(TranscodeJob.status.in_(TranscodeJob.PENDING)).all()
+    changed = 0
+    for job in jobs:
+        try:
+            changed += job.refresh()
+        except Exception as error:
+            click.echo('Reading job {} of session {} failed: {}'.format(job.job_id, job.session_id, error), err=True)
+    db.session.commit()
+    return len(jobs), changed
+
+
+@transcode.command('poll')
+@click.option('--interval', type=int, default=0, help='Poll every interval seconds, otherwise poll once.')
+def poll(interval):
+    """
+    Update the status of pending transcoder jobs.
+    """
+    while True:
+        pending, changed = poll_pending()
+        click.echo('{} pending jobs, {} changed'.format(pending, changed))
+        if not interval:
+            break
+        time.sleep(interval)
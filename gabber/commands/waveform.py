@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Generates the waveforms of session recordings (see utils/waveform.py) that were not generated on upload,
+e.g. sessions created before waveforms existed or where ffmpeg failed.
+
+Usage: `flask waveform generate` or `flask waveform generate --session <sid> --overwrite`
+"""
+import click
+import tempfile
+from flask.cli import AppGroup
+from ..models.projects import InterviewSession
+from ..utils import amazon
+from ..utils import waveform as waveforms
+
+waveform = AppGroup('waveform', help='Generate the waveforms of session recordings.')
+
+
+@waveform.command('generate')
+@click.option('--session', 'session_ids', multiple=True, help='The sessions to generate, otherwise all sessions.')
+@click.option('--overwrite', is_flag=True, help='Generate waveforms that already exist.')
+def generate(session_ids, overwrite):
+    """
+    Decode the raw recordings from S3 and store their waveforms.
+    """
+    query = InterviewSession.query.order_by(InterviewSession.created_on)
+    if session_ids:
+        query = query.filter(InterviewSession.id.in_(session_ids))
+
+    generated, failed = 0, 0
+    for session in query:
+        try:
+            if not overwrite and amazon.waveform_exists(session.project_id, session.id):
+                continue
+            with tempfile.TemporaryFile() as recording:
+                amazon.download(session.project_id, session.id, recording)
+                levels = waveforms.peaks(waveforms.decode(recording))
+            amazon.upload_waveform(waveforms.encode(levels), session.project_id, session.id)
+            generated += 1
+        except Exception as error:
+            failed += 1
+            click.echo('Session {} failed: {}'.format(session.id, error), err=True)
+    click.echo('{} waveforms generated, {} failed'.format(generated, failed))
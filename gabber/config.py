@@ -27,14 +27,43 @@ class Config:
     S3_PIPELINE_PRESET_ID = os.getenv('S3_PIPELINE_PRESET_ID', '')
     S3_ROOT_FOLDER = os.getenv('S3_APP_NAME', 'main')
     S3_PROJECT_MODE = os.environ.get('S3_APP_MODE', 'dev')
+    # Overrides the AWS endpoints, e.g. to use local stand-ins during development
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
+    TRANSCODER_ENDPOINT_URL = os.getenv('TRANSCODER_ENDPOINT_URL') or None
+    # The endpoint devices upload recordings to directly, if it differs from S3_ENDPOINT_URL, e.g. the host of
+    # a local stand-in, which is signed into the URLs of uploads
+    S3_UPLOAD_ENDPOINT_URL = os.getenv('S3_UPLOAD_ENDPOINT_URL') or None
+    # Recordings uploaded directly to S3 (see api/uploads.py): the largest (bytes), the size above which they
+    # are uploaded in parts, the size of each part, and the time (seconds) the URLs of an upload are valid for
+    UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 2 * 1024 ** 3))
+    UPLOAD_MULTIPART_THRESHOLD = int(os.getenv('UPLOAD_MULTIPART_THRESHOLD', 64 * 1024 ** 2))
+    UPLOAD_PART_SIZE = int(os.getenv('UPLOAD_PART_SIZE', 16 * 1024 ** 2))
+    UPLOAD_URL_EXPIRY = int(os.getenv('UPLOAD_URL_EXPIRY', 6 * 60 * 60))
 
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET', '')
     FCM_API_KEY = os.environ.get('FCM_API_KEY', '')
     JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(minutes=60*24*499)
+    # Embeds the user ID and a project to role map in access tokens to authorize without querying memberships
+    JWT_MEMBERSHIP_CLAIMS = os.environ.get('JWT_MEMBERSHIP_CLAIMS', '') == 'true'
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', '')
     PHOTOS_API_KEY = os.getenv('PHOTOS_API_KEY', '')
+    PHOTOS_API_URL = os.getenv('PHOTOS_API_URL', 'https://api.unsplash.com')
+    PHOTOS_API_TIMEOUT = float(os.getenv('PHOTOS_API_TIMEOUT', 3))
+    # Search results are cached per process for the TTL (seconds), and served after if the API is unavailable
+    PHOTOS_CACHE_TTL = int(os.getenv('PHOTOS_CACHE_TTL', 60*60))
+    PHOTOS_CACHE_SIZE = int(os.getenv('PHOTOS_CACHE_SIZE', 1024))
+
+    # Streams of session events (see utils/events.py) per process, each of which holds a thread of a worker;
+    # by default fewer than the threads of the worker (see events.max_streams)
+    EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', 0))
+    # Seconds between comments sent on idle streams, and after which a stream ends and the client reconnects
+    EVENTS_HEARTBEAT = int(os.getenv('EVENTS_HEARTBEAT', 15))
+    EVENTS_STREAM_LIFETIME = int(os.getenv('EVENTS_STREAM_LIFETIME', 10 * 60))
+
+    # The number of requests of a batch (see api/batch.py)
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
 
     JSONIFY_PRETTYPRINT_REGULAR = False
 
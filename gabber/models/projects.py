@@ -3,7 +3,9 @@
 ???
 """
 from .. import db
+from datetime import datetime, timedelta
 from flask_sqlalchemy import BaseQuery
+from sqlalchemy import event
 
 codes_for_connections = db.Table(
     'codes_for_connections',
@@ -12,6 +14,32 @@ codes_for_connections = db.Table(
 )
 
 
+def update_counter(column, pk, delta=1):
+    """
+    Atomically adjusts a denormalized counter column within the current transaction,
+    which is committed by the caller alongside the row that was created or soft-deleted.
+
+    :param column: the counter column, e.g. Project.num_sessions
+    :param pk: the primary key of the row to update
+    :param delta: the amount to adjust the counter by
+    """
+    model = column.class_
+    db.session.query(model).filter(model.id == pk).update({column: column + delta}, synchronize_session=False)
+
+
+def update_maximum(column, pk, value):
+    """
+    Atomically raises a denormalized maximum column to the value if it is greater, within the current transaction.
+
+    :param column: the maximum column, e.g. InterviewSession.max_annotation_length
+    :param pk: the primary key of the row to update
+    :param value: the candidate maximum
+    """
+    model = column.class_
+    db.session.query(model).filter(model.id == pk).update(
+        {column: db.case([(column < value, value)], else_=column)}, synchronize_session=False)
+
+
 class QueryWithSoftDelete(BaseQuery):
     """
     Prepends is_active to the query object SQL statement.
@@ -70,6 +98,11 @@ class Membership(db.Model):
         many-to-many: a project can have many members
         one-to-one: each membership must have one role
     """
+    __table_args__ = (
+        db.Index('ix_membership_user_id_project_id_deactivated', 'user_id', 'project_id', 'deactivated'),
+        db.Index('ix_membership_project_id_deactivated', 'project_id', 'deactivated'),
+    )
+
     id = db.Column(db.Integer, autoincrement=True, index=True, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'))
@@ -113,6 +146,18 @@ class Membership(db.Model):
         return membership
 
 
+@event.listens_for(Membership, 'after_insert')
+@event.listens_for(Membership, 'after_update')
+def invalidate_membership_claims(mapper, connection, membership):
+    """
+    Any change to a membership makes the membership claims of the users' issued JWTs stale.
+    """
+    from ..models.user import User
+    users = User.__table__
+    connection.execute(users.update().where(users.c.id == membership.user_id).values(
+        claims_version=users.c.claims_version + 1))
+
+
 class Roles(db.Model):
     """
     The roles that can be assigned to a user, and are used to support access control on projects.
@@ -148,6 +193,9 @@ class ProjectLanguage(db.Model):
     title = db.Column(db.String(64))
     slug = db.Column(db.String(256), unique=True, index=True)
 
+    # Used to sync changes to clients (see utils/sync.py)
+    updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+
     def __init__(self, pid, lid, description, title):
         from slugify import slugify
         self.project_id = pid
@@ -158,12 +206,19 @@ class ProjectLanguage(db.Model):
 
 
 class TopicLanguage(db.Model):
+    __table_args__ = (
+        db.Index('ix_topic_language_project_id', 'project_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=True)
     lang_id = db.Column(db.Integer, db.ForeignKey('supported_language.id'))
     text = db.Column(db.String(260))
     is_active = db.Column(db.SmallInteger, default=1)
 
+    # Used to sync changes, including soft-deletes, to clients (see utils/sync.py)
+    updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+
 
 class Project(db.Model):
     """
@@ -201,6 +256,12 @@ class Project(db.Model):
     members = db.relationship('Membership', back_populates='project',
                               primaryjoin='and_(Project.id==Membership.project_id, Membership.deactivated == False)')
 
+    # Denormalized count of sessions, maintained on create (see update_counter)
+    num_sessions = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # When the project was made private or deleted while public, after which clients that are not members
+    # have their copy deleted (see utils/sync.py)
+    unpublished_on = db.Column(db.DateTime)
+
     created_on = db.Column(db.DateTime, default=db.func.now())
     updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
@@ -214,11 +275,30 @@ class InterviewSession(db.Model):
         one-to-many: many participants can be involved in one interview
         one-to-many: an interview can have many connections
     """
+    __table_args__ = (
+        db.Index('ix_interview_session_project_id_created_on', 'project_id', 'created_on'),
+        db.Index('ix_interview_session_project_id_visibility', 'project_id', 'visibility', 'embargoed_until'),
+    )
+
+    # Who can view the session given the consents of its participants (see visibility_from)
+    PUBLIC = 'public'
+    MEMBERS = 'members'
+    PRIVATE = 'private'
+    # Only participants can review a conversation within this time of capturing it
+    EMBARGO = timedelta(hours=24)
+
     id = db.Column(db.String(260), primary_key=True)
     lang_id = db.Column(db.Integer)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'))
     created_on = db.Column(db.DateTime)
+    # Denormalized count of active annotations, maintained on create and soft-delete (see update_counter)
+    num_annotations = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # The longest annotation (end - start) created, which bounds time-range lookups (see Connection.overlapping)
+    max_annotation_length = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Materialized from the consents and created_on (see update_visibility) so that listings filter by index
+    visibility = db.Column(db.String(16), default=PRIVATE, server_default=PRIVATE, nullable=False)
+    embargoed_until = db.Column(db.DateTime)
 
     prompts = db.relationship('InterviewPrompts', backref='interview', lazy='joined')
     consents = db.relationship('SessionConsent', backref='interview', lazy='dynamic')
@@ -226,64 +306,107 @@ class InterviewSession(db.Model):
     connections = db.relationship(
         'Connection',
         backref='interview',
-        lazy='joined',
+        lazy='select',
         primaryjoin="and_(InterviewSession.id==Connection.session_id, Connection.is_active)"
     )
 
     def consented(self, project_is_public):
-        return self.all_members_public_consented() if project_is_public else self.all_members_private_consented()
+        return self.visibility in InterviewSession.consented_visibilities(project_is_public)
+
+    @staticmethod
+    def consented_visibilities(project_is_public):
+        """
+        The visibilities of the sessions that members (or anyone for public projects) can view once not embargoed.
+        """
+        if project_is_public:
+            return [InterviewSession.PUBLIC]
+        return [InterviewSession.PUBLIC, InterviewSession.MEMBERS]
+
+    @staticmethod
+    def viewable(project_is_public):
+        """
+        A predicate of the sessions that members (or anyone for public projects) can view, i.e.
+        that are consented and not embargoed, which is served by an index of the project's sessions.
+        """
+        from datetime import datetime
+        return db.and_(InterviewSession.visibility.in_(InterviewSession.consented_visibilities(project_is_public)),
+                       InterviewSession.embargoed_until <= datetime.now())
 
     @staticmethod
     def all_consented_sessions_by_project(project, is_creator_researcher_or_admin=False, user_sessions=False):
-        sessions = InterviewSession.query.filter_by(project_id=project.id).all()
+        sessions = InterviewSession.query.filter_by(project_id=project.id)
 
         # Project creators and admins can view all sessions.
         if is_creator_researcher_or_admin:
-            return sessions
-
-        if project.is_public:
-            data = [session for session in sessions
-                    if session.all_members_public_consented() and not session.embargoed()]
-        else:
-            data = [session for session in sessions
-                    if session.all_members_private_consented() and not session.embargoed()]
+            return sessions.all()
 
+        viewable = InterviewSession.viewable(project.is_public)
         # Users can always access their own conversations, hence not necessary to check for embargo
         if user_sessions:
-            users_sessions = [session for session in sessions if session.user_is_participant(user_sessions)]
-            return set(users_sessions + data)
-        return data
+            viewable = db.or_(viewable, InterviewSession.participants.any(
+                InterviewParticipants.user_id == user_sessions.id))
+        return sessions.filter(viewable).all()
 
     def embargoed(self):
-        from datetime import datetime, timedelta
-        return datetime.now() < (self.created_on + timedelta(hours=24))
+        from datetime import datetime
+        return datetime.now() < (self.embargoed_until or self.created_on + InterviewSession.EMBARGO)
+
+    @staticmethod
+    def visibility_from(consent_types):
+        """
+        Who can view a session given the consents of its participants.
+
+        :param consent_types: the type of each consent of the session, e.g. ['public', 'members']
+        :return: PUBLIC if all participants consented to making the recording public, PRIVATE if at
+            least one participant does not want to share it, otherwise MEMBERS.
+        """
+        unique_consents = set([str(i) for i in consent_types])
+        if unique_consents == {'public'}:
+            return InterviewSession.PUBLIC
+        if 'private' in unique_consents:
+            return InterviewSession.PRIVATE
+        return InterviewSession.MEMBERS
+
+    def update_visibility(self, consent_types=None):
+        """
+        Recomputes the visibility and the end of the embargo, whenever the session is created or its consents change,
+        within the transaction that changes them.
+
+        :param consent_types: the types of the session's consents; if not given they are read with a locking read,
+            so that the consents changed by concurrent (committed) transactions are not read from a stale snapshot.
+        """
+        if consent_types is None:
+            consent_types = [consent.type for consent in self.consents.with_for_update()]
+        self.visibility = InterviewSession.visibility_from(consent_types)
+        self.embargoed_until = self.created_on + InterviewSession.EMBARGO
 
     def all_members_public_consented(self):
         """
         If all participants provide consent, i.e. the set of consents only contains public.
         """
-        unique_consents = set([str(i.type) for i in self.consents])
-        # If only public is within the set, then all participants are in agreement to making the recording public.
-        return True if 'public' in unique_consents and len(unique_consents) == 1 else False
+        return self.visibility == InterviewSession.PUBLIC
 
     def all_members_private_consented(self):
         """
         If at least one participant does not want to share the Gabber (private), then its not for private.
         """
-        unique_consents = set([str(i.type) for i in self.consents])
-        return True if 'private' not in unique_consents else False
+        return self.visibility != InterviewSession.PRIVATE
 
     def user_is_participant(self, user):
         return True if user.id in [p.user_id for p in self.participants] else False
 
     def generate_signed_url_for_recording(self):
         """
-        Generates a timed (two-hour) URL to access the recording of this interview session
+        Generates a timed (two-hour) URL to access the recording of this interview session, which is
+        the raw (uploaded) recording until it has been transcoded.
 
         :return: signed URL for the audio recording of the interview
         """
         from ..utils import amazon
-        return amazon.signed_url(self.project_id, self.id)
+        job = TranscodeJob.query.filter_by(session_id=self.id).first()
+        # Sessions created before transcoding was tracked have no job, but were transcoded
+        is_transcoded = not job or job.status == TranscodeJob.COMPLETE
+        return amazon.signed_url(self.project_id, self.id, is_transcoded)
 
     @staticmethod
     def session_url(pid, sid):
@@ -309,6 +432,139 @@ class InterviewSession(db.Model):
             send_mail.comment_nested_response(user, session.project_id, sid)
 
 
+class SessionUpload(db.Model):
+    """
+    A claim on the upload of a recording by a user, made before the recording is uploaded to S3, so that
+    retries of an upload (and concurrent duplicates) return the session it created rather than create another.
+
+    Uploads are identified by the Idempotency-Key header of the client, if sent, and the SHA-256 of the
+    recording, each of which is unique per user (see ProjectSessions.post). Devices that upload directly
+    to S3 (see ProjectSessionUploads) may not send the SHA-256, which is then unknown.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_session_upload_user_id_idempotency_key'),
+        db.UniqueConstraint('user_id', 'project_id', 'sha256', name='uq_session_upload_user_id_project_id_sha256'),
+    )
+
+    # The device is uploading the recording directly to S3, after which the session is created
+    UPLOADING = 'uploading'
+    PENDING = 'pending'
+    COMPLETE = 'complete'
+    # A pending upload older than this was abandoned, e.g. its worker was killed, and is claimed by a retry
+    STALE = timedelta(minutes=10)
+    # As are direct uploads, whose presigned URLs expire before then
+    UPLOADING_STALE = timedelta(days=1)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    idempotency_key = db.Column(db.String(255))
+    sha256 = db.Column(db.String(64))
+    status = db.Column(db.String(16), default=PENDING, nullable=False)
+    # The ID of the session to create, which names the recording on S3 before the session exists
+    recording_id = db.Column(db.String(260))
+    # The size (bytes) of a recording uploaded directly, which the recording on S3 must be, and the S3
+    # multipart upload of a large recording
+    size = db.Column(db.BigInteger)
+    multipart_upload_id = db.Column(db.String(1024))
+    # The session created once the upload is complete
+    session_id = db.Column(db.String(260), db.ForeignKey('interview_session.id'))
+
+    created_on = db.Column(db.DateTime, default=db.func.now())
+
+    @staticmethod
+    def existing(user_id, project_id, idempotency_key, sha256):
+        """
+        :return: the upload of the same key, otherwise of the same recording to the project, or None.
+        """
+        uploads = SessionUpload.query.filter_by(user_id=user_id)
+        upload = uploads.filter_by(idempotency_key=idempotency_key).first() if idempotency_key else None
+        if upload or not sha256:
+            return upload
+        return uploads.filter_by(project_id=project_id, sha256=sha256).first()
+
+    def is_stale(self):
+        if self.status == SessionUpload.UPLOADING:
+            return datetime.now() > self.created_on + SessionUpload.UPLOADING_STALE
+        return self.status == SessionUpload.PENDING and datetime.now() > self.created_on + SessionUpload.STALE
+
+
+class TranscodeJob(db.Model):
+    """
+    The Elastic Transcoder job that transcodes the recording of an interview session,
+    whose status is updated by `flask transcode poll` or the notifications of the pipeline.
+    """
+    SUBMITTED = 'submitted'
+    PROGRESSING = 'progressing'
+    COMPLETE = 'complete'
+    CANCELED = 'canceled'
+    ERROR = 'error'
+    PENDING = [SUBMITTED, PROGRESSING]
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(64), unique=True, nullable=False)
+    session_id = db.Column(db.String(260), db.ForeignKey('interview_session.id'), unique=True, nullable=False)
+    status = db.Column(db.String(16), default=SUBMITTED, nullable=False, index=True)
+    # The reason the job failed, as reported by Elastic Transcoder
+    error = db.Column(db.String(255))
+
+    session = db.relationship('InterviewSession')
+
+    created_on = db.Column(db.DateTime, default=db.func.now())
+    updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+
+    def update_from(self, job):
+        """
+        Updates the status from the job as described by Elastic Transcoder (see amazon.transcode_job)
+
+        :return: True if the status changed
+        """
+        status = job['Status'].lower()
+        changed = status != self.status
+        self.status = status
+        if status == TranscodeJob.ERROR:
+            outputs = job.get('Outputs') or [job.get('Output') or {}]
+            self.error = (outputs[0].get('StatusDetail') or '')[:255] or None
+        return changed
+
+    def refresh(self):
+        """
+        Updates the status from Elastic Transcoder, which the caller commits.
+
+        :return: True if the status changed
+        """
+        from ..utils import amazon
+        return self.update_from(amazon.transcode_job(self.job_id))
+
+
+class ProjectExport(db.Model):
+    """
+    An export of a project (see utils/export.py) that is written to S3 in the background, as
+    exporting very large projects would exceed the timeout of a request.
+    """
+    PENDING = 'pending'
+    COMPLETE = 'complete'
+    ERROR = 'error'
+    # Exports run in a thread of a worker, which ends with the worker when it is recycled or killed, hence
+    # running exports update updated_on every HEARTBEAT, and those without a heartbeat for STALE failed
+    HEARTBEAT = timedelta(minutes=1)
+    STALE = timedelta(minutes=10)
+
+    id = db.Column(db.String(32), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    # The user who requested the export, whose visibility of sessions applies
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    format = db.Column(db.String(16), nullable=False)
+    status = db.Column(db.String(16), default=PENDING, nullable=False)
+
+    created_on = db.Column(db.DateTime, default=db.func.now())
+    updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+
+    def is_stale(self):
+        last_heartbeat = self.updated_on or self.created_on
+        return self.status == ProjectExport.PENDING and datetime.now() > last_heartbeat + ProjectExport.STALE
+
+
 class InterviewPrompts(db.Model):
     """
     These are the annotations created during the capture of an interview, which differ
@@ -317,6 +573,10 @@ class InterviewPrompts(db.Model):
     Backref:
         Can refer to associated interview with 'interview'
     """
+    __table_args__ = (
+        db.Index('ix_interview_prompts_interview_id', 'interview_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     prompt_id = db.Column(db.Integer, db.ForeignKey('topic_language.id'))
     interview_id = db.Column(db.String(260), db.ForeignKey('interview_session.id'))
@@ -334,6 +594,10 @@ class InterviewParticipants(db.Model):
     Backref:
         Can refer to associated interview with 'interview'
     """
+    __table_args__ = (
+        db.Index('ix_interview_participants_interview_id_user_id', 'interview_id', 'user_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     interview_id = db.Column(db.String(260), db.ForeignKey('interview_session.id'))
@@ -364,6 +628,12 @@ class Connection(db.Model):
     """
     query_class = QueryWithSoftDelete
 
+    __table_args__ = (
+        # Also serves time-range lookups of a session (see overlapping)
+        db.Index('ix_connection_session_id_is_active_intervals',
+                 'session_id', 'is_active', 'start_interval', 'end_interval'),
+    )
+
     # TODO: this should be renamed to UserAnnotation as connection is outdated
     id = db.Column(db.Integer, primary_key=True)
     # Although many are chosen, a general justification by the user must be provided.
@@ -372,6 +642,8 @@ class Connection(db.Model):
     start_interval = db.Column(db.Integer)
     end_interval = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    # Denormalized count of active comments (including replies), maintained on create and soft-delete
+    num_comments = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     # A connection can be associated with many codes
     tags = db.relationship("Code", secondary=codes_for_connections, backref="connections")
@@ -388,6 +660,25 @@ class Connection(db.Model):
     created_on = db.Column(db.DateTime, default=db.func.now())
     updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
+    @staticmethod
+    def overlapping(session, start=None, end=None):
+        """
+        The annotations of a session that overlap the time range [start, end], where either bound is optional.
+
+        An annotation that overlaps start must begin at most max_annotation_length before it, hence both
+        bounds are a range over start_interval of the index, rather than a scan of all annotations before end.
+
+        :param session: the InterviewSession of the annotations
+        :return: a query of the annotations
+        """
+        query = Connection.query.filter_by(session_id=session.id)
+        if start is not None:
+            query = query.filter(Connection.start_interval >= start - session.max_annotation_length,
+                                 Connection.end_interval >= start)
+        if end is not None:
+            query = query.filter(Connection.start_interval <= end)
+        return query
+
 
 class ConnectionComments(db.Model):
     """
@@ -398,6 +689,10 @@ class ConnectionComments(db.Model):
         A comment can refer to the connection its associated with via 'connection'
     """
     __tablename__ = 'connection_comments'
+    __table_args__ = (
+        db.Index('ix_connection_comments_parent_id', 'parent_id'),
+        db.Index('ix_connection_comments_connection_id_parent_id', 'connection_id', 'parent_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(1024), default=None)
@@ -422,6 +717,29 @@ class ConnectionComments(db.Model):
         self.connection_id = aid
 
 
+class SessionEvent(db.Model):
+    """
+    An annotation or comment created or deleted on a session, written in the transaction of the change
+    and streamed to clients of the session (see utils/events.py).
+    """
+    __table_args__ = (
+        db.Index('ix_session_event_session_id_id', 'session_id', 'id'),
+    )
+
+    ANNOTATION_CREATED = 'annotation.created'
+    ANNOTATION_DELETED = 'annotation.deleted'
+    COMMENT_CREATED = 'comment.created'
+    COMMENT_DELETED = 'comment.deleted'
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(260), db.ForeignKey('interview_session.id'), nullable=False)
+    type = db.Column(db.String(32), nullable=False)
+    # The created annotation or comment as serialized by the API, or the ID of the deleted one, as JSON
+    data = db.Column(db.Text, nullable=False)
+
+    created_on = db.Column(db.DateTime, default=db.func.now(), index=True)
+
+
 class Codebook(db.Model):
     """
     Holds a set of codes related to a project; acts as qualitative codebook.
@@ -452,3 +770,6 @@ class Code(db.Model):
     text = db.Column(db.String(64))
     is_active = db.Column(db.SmallInteger, default=1)
     codebook_id = db.Column(db.Integer, db.ForeignKey('codebook.id'))
+
+    # Used to sync changes, including soft-deletes, to clients (see utils/sync.py)
+    updated_on = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
@@ -25,6 +25,10 @@ class SessionConsent(db.Model):
         members: only members of the project can view/listen to the recording
         private: only participants of the project can view/listen to the recording
     """
+    __table_args__ = (
+        db.Index('ix_session_consent_session_id', 'session_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     # Options include: public, private, none.
     type = db.Column(db.String(50), default='none')
@@ -57,6 +61,8 @@ class User(db.Model):
     verified = db.Column(db.Boolean, default=False)
 
     fcm_token = db.Column(db.String(256), default=None)
+    # Incremented whenever a membership of this user changes, which invalidates the claims of issued JWTs
+    claims_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     participant_of = db.relationship("InterviewParticipants", lazy='joined')
     member_of = db.relationship("Membership", back_populates="user", lazy='dynamic')
@@ -94,7 +100,10 @@ class User(db.Model):
         :param pid: the project id to search for
         :return: True if this user is a member, otherwise False.
         """
-        match = [i.role_id for i in self.member_of if int(i.project_id) == int(pid) if not i.deactivated]
+        claimed = self.claimed_projects()
+        if claimed is not None:
+            return str(int(pid)) in claimed
+        match = [i.role_id for i in self.memberships() if int(i.project_id) == int(pid) if not i.deactivated]
         return True if match else False
 
     def role_for_project(self, pid):
@@ -104,6 +113,52 @@ class User(db.Model):
         :param pid: the project id to search for
         :return: The type of role (such as admin, staff, or user), otherwise None
         """
+        claimed = self.claimed_projects()
+        if claimed is not None:
+            return claimed.get(str(int(pid))) or 'participant'
         from ..models.projects import Roles
-        match = [i.role_id for i in self.member_of if i.project_id == pid if i.confirmed and not i.deactivated]
+        match = [i.role_id for i in self.memberships() if i.project_id == pid if i.confirmed and not i.deactivated]
         return Roles.query.get(match[0]).name if match else 'participant'
+
+    def memberships(self):
+        """
+        The memberships of this user, which are read once for all requests of a batch (see api/batch.py)
+        while none of them change data, and otherwise on each call.
+        """
+        from flask import g
+        cache = getattr(g, 'batch_memberships', None)
+        if cache is None:
+            return self.member_of.all()
+        if self.id not in cache:
+            cache[self.id] = self.member_of.all()
+        return cache[self.id]
+
+    def membership_claims(self):
+        """
+        The compact claims embedded in access tokens when JWT_MEMBERSHIP_CLAIMS is enabled, e.g.
+
+            {"uid": 1, "ver": 3, "projects": {"12": "administrator", "14": null}}
+
+        Each active membership maps its project to the role name, or null if it is not yet confirmed.
+        """
+        from ..models.projects import Membership
+        projects = {}
+        # The earliest confirmed membership of a project takes precedence, as in role_for_project
+        for membership in self.member_of.filter_by(deactivated=False).order_by(Membership.id.desc()):
+            pid = str(membership.project_id)
+            if membership.confirmed or pid not in projects:
+                projects[pid] = membership.role.name if membership.confirmed else None
+        return {'uid': self.id, 'ver': self.claims_version, 'projects': projects}
+
+    def claimed_projects(self):
+        """
+        The project to role map from the claims of the current JWT, which lets authorization
+        checks avoid querying memberships and roles.
+
+        :return: the map if the claims belong to this user and are not stale, otherwise None.
+        """
+        from flask_jwt_extended import get_jwt_claims
+        claims = get_jwt_claims()
+        if claims.get('uid') == self.id and claims.get('ver') == self.claims_version:
+            return claims.get('projects')
+        return None
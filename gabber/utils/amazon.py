@@ -2,18 +2,65 @@
 """
 Handles uploading and access writes (ACL) for files in the Gabber bucket
 """
-import base64
-import boto3
-import botocore.client
 from flask import current_app as app
-from uuid import uuid4
+from . import clients, images
 
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=app.config['S3_KEY'],
-    aws_secret_access_key=app.config['S3_SECRET'],
-    config=botocore.client.Config(signature_version='s3')
-)
+# The codes of a missing key: without s3:ListBucket, S3 responds with 403 (AccessDenied) rather than 404
+# (NoSuchKey), where responses to HEAD have no body, hence their code is the HTTP status
+MISSING_KEY_ERRORS = ('404', 'NoSuchKey', '403', 'AccessDenied')
+
+
+def s3():
+    """
+    The S3 client of this process, which is created on first use as importing boto3 is slow.
+    """
+    def create():
+        import boto3
+        import botocore.client
+        return boto3.client(
+            "s3",
+            aws_access_key_id=app.config['S3_KEY'],
+            aws_secret_access_key=app.config['S3_SECRET'],
+            endpoint_url=app.config['S3_ENDPOINT_URL'],
+            config=botocore.client.Config(signature_version='s3')
+        )
+    return clients.get('s3', create)
+
+
+def s3_uploads():
+    """
+    The S3 client that signs the URLs devices upload recordings to, i.e. S3_UPLOAD_ENDPOINT_URL if set.
+    """
+    if not app.config['S3_UPLOAD_ENDPOINT_URL']:
+        return s3()
+
+    def create():
+        import boto3
+        import botocore.client
+        return boto3.client(
+            "s3",
+            aws_access_key_id=app.config['S3_KEY'],
+            aws_secret_access_key=app.config['S3_SECRET'],
+            endpoint_url=app.config['S3_UPLOAD_ENDPOINT_URL'],
+            config=botocore.client.Config(signature_version='s3')
+        )
+    return clients.get('s3_uploads', create)
+
+
+def transcoder():
+    """
+    The Elastic Transcoder client of this process.
+    """
+    def create():
+        import boto3
+        return boto3.client(
+            'elastictranscoder',
+            app.config['S3_REGION'],
+            aws_access_key_id=app.config['S3_KEY'],
+            aws_secret_access_key=app.config['S3_SECRET'],
+            endpoint_url=app.config['TRANSCODER_ENDPOINT_URL']
+        )
+    return clients.get('elastictranscoder', create)
 
 
 def __get_path(project_id, session_id, is_transcoded=False):
@@ -36,15 +83,9 @@ def transcode(project_id, session_id):
 
     :param project_id: which project does the recording belong to?
     :param session_id: which recording is it?
+    :return: the ID of the transcoder job
     """
-    transcoder = boto3.client(
-        'elastictranscoder',
-        app.config['S3_REGION'],
-        aws_access_key_id=app.config['S3_KEY'],
-        aws_secret_access_key=app.config['S3_SECRET']
-    )
-
-    transcoder.create_job(
+    response = transcoder().create_job(
         PipelineId=app.config['S3_PIPELINE_ID'],
         Input={'Key': __get_path(project_id, session_id)},
         Outputs=[{
@@ -52,19 +93,28 @@ def transcode(project_id, session_id):
             'PresetId': app.config['S3_PIPELINE_PRESET_ID']
         }]
     )
+    return response['Job']['Id']
 
 
-def signed_url(project_id, session_id):
+def transcode_job(job_id):
+    """
+    :return: the transcoder job, including its Status (Submitted, Progressing, Complete, Canceled or Error)
+    """
+    return transcoder().read_job(Id=job_id)['Job']
+
+
+def signed_url(project_id, session_id, is_transcoded=True):
     """
     Generates a signed URL for a given file (which includes its path) on S3.
 
     :param project_id: The ID of the project associated with the file to upload
     :param session_id: The ID of the session associated with the file to upload.
+    :param is_transcoded: whether to sign the transcoded or the raw (uploaded) recording.
     :return: A temporary (2 hour) URL for a given file on S3.
     """
-    return s3.generate_presigned_url(
+    return s3().generate_presigned_url(
         ClientMethod='get_object',
-        Params={'Bucket': app.config['S3_BUCKET'], 'Key': __get_path(project_id, session_id, is_transcoded=True)},
+        Params={'Bucket': app.config['S3_BUCKET'], 'Key': __get_path(project_id, session_id, is_transcoded)},
         ExpiresIn=3600*2)
 
 
@@ -77,33 +127,223 @@ def upload(the_file, project_id, session_id):
     :param session_id: The ID of the session associated with the file to upload.
     :return: True if the file uploaded successfully, otherwise False
     """
-    s3.upload_fileobj(
+    s3().upload_fileobj(
         the_file,
         app.config['S3_BUCKET'],
         __get_path(project_id, session_id)
     )
 
 
+def presigned_recording_post(project_id, session_id, size):
+    """
+    A form that uploads the raw recording of a session directly to S3 (a POST of multipart/form-data), where the
+    recording is the last field, i.e. "file". S3 rejects recordings that are not the given size (bytes).
+
+    :return: a dictionary of the URL and the fields of the form
+    """
+    return s3_uploads().generate_presigned_post(
+        Bucket=app.config['S3_BUCKET'],
+        Key=__get_path(project_id, session_id),
+        Conditions=[['content-length-range', size, size]],
+        ExpiresIn=app.config['UPLOAD_URL_EXPIRY'])
+
+
+def create_multipart_recording(project_id, session_id):
+    """
+    Starts a multipart upload of the raw recording of a session, for recordings too large for one request.
+
+    :return: the ID of the multipart upload
+    """
+    return s3().create_multipart_upload(
+        Bucket=app.config['S3_BUCKET'], Key=__get_path(project_id, session_id))['UploadId']
+
+
+def presigned_recording_parts(project_id, session_id, upload_id, num_parts):
+    """
+    :return: the URLs that each part of a multipart upload is uploaded to (a PUT of its bytes), in order.
+    """
+    return [s3_uploads().generate_presigned_url(
+        ClientMethod='upload_part',
+        Params={'Bucket': app.config['S3_BUCKET'], 'Key': __get_path(project_id, session_id),
+                'UploadId': upload_id, 'PartNumber': part_number},
+        ExpiresIn=app.config['UPLOAD_URL_EXPIRY']) for part_number in range(1, num_parts + 1)]
+
+
+def complete_multipart_recording(project_id, session_id, upload_id, size):
+    """
+    Completes a multipart upload from the parts S3 has received, hence devices do not send the ETag of each part.
+    S3 completes an upload from any of its parts, hence it is only completed once the parts are the given size.
+
+    :return: False if parts are missing, otherwise True, including an upload that was completed before
+    (e.g. by a finalize that failed after).
+    """
+    from botocore.exceptions import ClientError
+    bucket, key = app.config['S3_BUCKET'], __get_path(project_id, session_id)
+    try:
+        parts = [part for page in s3().get_paginator('list_parts').paginate(Bucket=bucket, Key=key, UploadId=upload_id)
+                 for part in page.get('Parts', [])]
+    except ClientError as error:
+        if error.response['Error']['Code'] == 'NoSuchUpload':
+            return True
+        raise
+    if not parts or sum(part['Size'] for part in parts) != size:
+        return False
+    s3().complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={
+        'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]})
+    return True
+
+
+def recording_size(project_id, session_id):
+    """
+    :return: the size (bytes) of the raw recording of a session on S3, or None if it was not uploaded.
+    """
+    from botocore.exceptions import ClientError
+    try:
+        return s3().head_object(
+            Bucket=app.config['S3_BUCKET'], Key=__get_path(project_id, session_id))['ContentLength']
+    except ClientError:
+        return None
+
+
+def delete_recording(project_id, session_id):
+    s3().delete_object(Bucket=app.config['S3_BUCKET'], Key=__get_path(project_id, session_id))
+
+
+def __waveform_path(project_id, session_id):
+    """
+    The waveform (see utils/waveform.py) is stored next to the raw recording.
+    """
+    return __get_path(project_id, session_id) + '.waveform'
+
+
+def upload_waveform(data, project_id, session_id):
+    """
+    :param data: the waveform of the recording of the session, as bytes
+    """
+    s3().put_object(
+        Bucket=app.config['S3_BUCKET'],
+        Key=__waveform_path(project_id, session_id),
+        Body=data,
+        ContentType='application/octet-stream'
+    )
+
+
+def download_waveform(project_id, session_id):
+    """
+    :return: the waveform of the recording of the session as bytes, or None if it does not exist
+        (see waveform_exists).
+    """
+    from botocore.exceptions import ClientError
+    try:
+        response = s3().get_object(Bucket=app.config['S3_BUCKET'], Key=__waveform_path(project_id, session_id))
+    except ClientError as error:
+        if error.response.get('Error', {}).get('Code') in MISSING_KEY_ERRORS:
+            return None
+        raise
+    return response['Body'].read()
+
+
+def waveform_exists(project_id, session_id):
+    """
+    Whether the waveform of the recording of the session exists, without downloading it.
+    """
+    from botocore.exceptions import ClientError
+    try:
+        s3().head_object(Bucket=app.config['S3_BUCKET'], Key=__waveform_path(project_id, session_id))
+    except ClientError as error:
+        if error.response.get('Error', {}).get('Code') in MISSING_KEY_ERRORS:
+            return False
+        raise
+    return True
+
+
+def download(project_id, session_id, the_file):
+    """
+    Downloads the raw recording of a session into the given file.
+    """
+    s3().download_fileobj(app.config['S3_BUCKET'], __get_path(project_id, session_id), the_file)
+
+
+def __export_path(project_id, export_id, extension):
+    return '{}/{}/{}/exports/{}.{}'.format(
+        app.config['S3_ROOT_FOLDER'], app.config['S3_PROJECT_MODE'], project_id, export_id, extension)
+
+
+def upload_export(the_file, project_id, export_id, extension):
+    """
+    Uploads the export of a project (see utils/export.py), which is private to the user who requested it.
+    """
+    s3().upload_fileobj(the_file, app.config['S3_BUCKET'], __export_path(project_id, export_id, extension))
+
+
+def signed_export_url(project_id, export_id, extension):
+    """
+    :return: A temporary (2 hour) URL to download the export of a project.
+    """
+    return s3().generate_presigned_url(
+        ClientMethod='get_object',
+        Params={'Bucket': app.config['S3_BUCKET'], 'Key': __export_path(project_id, export_id, extension)},
+        ExpiresIn=3600*2)
+
+
 def __static_path():
     return '{}/{}/static/'.format(app.config['S3_ROOT_FOLDER'], app.config['S3_PROJECT_MODE'])
 
 
-def static_file_by_name(name):
+def static_file_by_name(name, rendition=None):
+    """
+    The public URL of a project image.
+
+    :param name: the name of the image, where None is the default image.
+    :param rendition: the name of a resized copy (see images.RENDITIONS), otherwise the original.
+    """
     path = 'https://{}.s3.amazonaws.com/{}'.format(app.config['S3_BUCKET'], __static_path())
+    if rendition and images.has_renditions(name):
+        return path + images.rendition_name(name, rendition)
     return path + (name or 'default')
 
 
+def __exists(key):
+    from botocore.exceptions import ClientError
+    try:
+        s3().head_object(Bucket=app.config['S3_BUCKET'], Key=key)
+        return True
+    except ClientError:
+        return False
+
+
 def upload_base64(data):
-    filename = uuid4().hex
+    """
+    Stores an image and its renditions, unless an image with the same content has been stored before.
+
+    :param data: the base-64 encoded image
+    :return: the name of the image (the SHA-256 of its content), or 'default' if the image is invalid or failed to upload.
+    """
     try:
-        s3.put_object(
-            ACL='public-read',
-            Bucket=app.config['S3_BUCKET'],
-            Key=__static_path() + filename,
-            Body=base64.b64decode(data),
-            ContentType='image/jpeg',
-            ContentEncoding='base64'
-        )
-    except Exception:
-        filename = 'default'
+        content, filename = images.decode_base64(data)
+    except ValueError:
+        return 'default'
+
+    with content:
+        # The last rendition is uploaded after the original, hence it only exists if all of them do
+        last = images.rendition_name(filename, sorted(images.RENDITIONS)[-1])
+        if __exists(__static_path() + last):
+            return filename
+        try:
+            mime_type, renditions = images.renditions(content)
+        except IOError:
+            return 'default'
+
+        # Content-addressed objects never change, hence can be cached by clients indefinitely
+        extra_args = {'ACL': 'public-read', 'CacheControl': 'public, max-age=31536000, immutable'}
+        try:
+            s3().upload_fileobj(content, app.config['S3_BUCKET'], __static_path() + filename,
+                                ExtraArgs=dict(extra_args, ContentType=mime_type))
+            for name in sorted(renditions):
+                with renditions[name] as rendition:
+                    s3().upload_fileobj(rendition, app.config['S3_BUCKET'],
+                                        __static_path() + images.rendition_name(filename, name),
+                                        ExtraArgs=dict(extra_args, ContentType='image/jpeg'))
+        except Exception:
+            filename = 'default'
     return filename
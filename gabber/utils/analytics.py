@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Aggregates over the annotations of a project or a session, computed with NumPy from rows that are fetched in bulk.
+
+Results are cached per process, keyed on a signature query that changes whenever the aggregated rows
+change, so a cached result is never stale and is recomputed at most once per change.
+"""
+from collections import OrderedDict
+from .. import db
+from . import cache, clients
+from ..models.projects import InterviewSession, InterviewPrompts, TopicLanguage, Connection, Codebook, Code, \
+    codes_for_connections
+
+# The number of annotations whose pairs of codes are counted at a time
+COOCCURRENCE_CHUNK = 10000
+# The number of annotations joined against all prompts of a session at a time
+INTERVAL_JOIN_CHUNK = 10000
+
+
+def results_cache():
+    return clients.get('analytics_cache', lambda: cache.Cache(ttl=24 * 60 * 60, max_size=128))
+
+
+def _tagged_annotations(project_id):
+    """
+    The association rows of the active annotations of the project, as a query of (annotation, code, session).
+    """
+    return db.session.query(
+        codes_for_connections.c.connection_id, codes_for_connections.c.code_id, Connection.session_id
+    ).join(
+        Connection, Connection.id == codes_for_connections.c.connection_id
+    ).join(
+        InterviewSession, InterviewSession.id == Connection.session_id
+    ).filter(InterviewSession.project_id == project_id, Connection.is_active == True)
+
+
+def _codes(project_id):
+    return db.session.query(Code.id, Code.text, Code.is_active).join(
+        Codebook, Codebook.id == Code.codebook_id
+    ).filter(Codebook.project_id == project_id).order_by(Code.id).all()
+
+
+def codebook_stats(project_id):
+    """
+    Per code frequencies, per session distributions and code x code co-occurrence of the project's annotations.
+
+    Tags only change when annotations are created or soft-deleted, or when codes are created or edited,
+    hence the signature is the number and latest change of the tagged annotations, and the codes.
+
+    :return: a dictionary, see CodebookStats.get
+    """
+    codes = _codes(project_id)
+    tagged = _tagged_annotations(project_id).subquery()
+    signature = db.session.query(
+        db.func.count(), db.func.max(Connection.id), db.func.max(Connection.updated_on)
+    ).select_from(tagged).join(Connection, Connection.id == tagged.c.connection_id).one()
+    key = ('codebook_stats', project_id, tuple(signature), tuple(tuple(code) for code in codes))
+    return results_cache().get(key, lambda: _compute_codebook_stats(project_id, codes))
+
+
+def _cooccurrence(annotation_index, code_index, num_codes):
+    """
+    The code x code counts of the pairs of codes of each annotation (including each code with itself), from the
+    (annotation, code) pairs sorted by annotation: the k-th copy of an annotation's i-th code is paired with its
+    k-th code, and each pair is one index of the flattened code x code matrix.
+    """
+    import numpy as np
+
+    _, starts, sizes = np.unique(annotation_index, return_index=True, return_counts=True)
+    # For each code of each annotation: the number of codes of its annotation, and where they start
+    sizes, starts = np.repeat(sizes, sizes), np.repeat(starts, sizes)
+    copies = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    left, right = np.repeat(code_index, sizes), code_index[np.repeat(starts, sizes) + copies]
+    return np.bincount(left * num_codes + right, minlength=num_codes ** 2).reshape(num_codes, num_codes)
+
+
+def _compute_codebook_stats(project_id, codes):
+    import numpy as np
+
+    # Codes of another project's codebook are ignored, hence there is nothing to count without codes
+    if not codes:
+        return {'annotations': 0, 'codes': [], 'sessions': [], 'cooccurrence': []}
+
+    rows = _tagged_annotations(project_id).all()
+    code_ids = np.array([code.id for code in codes], dtype=np.int64)
+    num_codes = len(code_ids)
+
+    if rows:
+        annotation_ids, tag_ids, session_ids = zip(*rows)
+        tag_ids = np.array(tag_ids, dtype=np.int64)
+        # Codes of another project's codebook cannot be indexed, and are ignored
+        code_index = np.searchsorted(code_ids, tag_ids)
+        known = (code_index < num_codes) & (code_ids[np.minimum(code_index, num_codes - 1)] == tag_ids)
+        code_index = code_index[known]
+        _, annotation_index = np.unique(np.array(annotation_ids)[known], return_inverse=True)
+        sessions, session_index = np.unique(np.array(session_ids)[known], return_inverse=True)
+    else:
+        code_index = annotation_index = session_index = np.array([], dtype=np.int64)
+        sessions = np.array([])
+
+    frequencies = np.bincount(code_index, minlength=num_codes)
+    # Each (session, code) pair as one index of the flattened session x code matrix
+    per_session = np.bincount(session_index * num_codes + code_index,
+                              minlength=len(sessions) * num_codes).reshape(len(sessions), num_codes)
+
+    # C = M.T * M, where M is the binary annotation x code matrix, counted from the pairs of codes of each
+    # annotation rather than multiplied, in chunks of annotations as each has as many pairs as its codes squared
+    num_annotations = int(annotation_index.max()) + 1 if len(annotation_index) else 0
+    # Unique (annotation, code) pairs sorted by annotation, as M is binary
+    tags = np.unique(annotation_index * num_codes + code_index)
+    annotation_index, sorted_codes = tags // num_codes, tags % num_codes
+    cooccurrence = np.zeros((num_codes, num_codes), dtype=np.int64)
+    for start in range(0, num_annotations, COOCCURRENCE_CHUNK):
+        lo, hi = np.searchsorted(annotation_index, [start, start + COOCCURRENCE_CHUNK])
+        cooccurrence += _cooccurrence(annotation_index[lo:hi], sorted_codes[lo:hi], num_codes)
+
+    return {
+        'annotations': num_annotations,
+        'codes': [{'id': code.id, 'text': code.text, 'is_active': bool(code.is_active), 'count': int(count)}
+                  for code, count in zip(codes, frequencies)],
+        'sessions': [{'session_id': session_id, 'counts': counts}
+                     for session_id, counts in zip(sessions.tolist(), per_session.tolist())],
+        # Ordered as codes, where the diagonal is the number of annotations tagged with each code
+        'cooccurrence': cooccurrence.tolist()
+    }
+
+
+def session_timeline(session, bins):
+    """
+    Where in the recording of a session annotations cluster: a histogram of the number of annotations that
+    cover each bin of the recording, and the annotations that overlap each topic discussed.
+
+    Annotations only change when created or soft-deleted (which maintain num_annotations) or edited,
+    hence the signature is the number of annotations and their latest change.
+
+    :param bins: the number of bins the recording is divided into
+    :return: a dictionary, see SessionTimeline.get
+    """
+    last_update = db.session.query(db.func.max(Connection.updated_on)).filter(
+        Connection.session_id == session.id).scalar()
+    key = ('session_timeline', session.id, session.num_annotations, last_update, bins)
+    return results_cache().get(key, lambda: _compute_session_timeline(session.id, bins))
+
+
+def _compute_session_timeline(session_id, bins):
+    import numpy as np
+
+    # Intervals are nullable: annotations without a start are not in the recording, and those without an end
+    # are of a moment
+    annotations = np.array(db.session.query(
+        Connection.start_interval, db.func.coalesce(Connection.end_interval, Connection.start_interval)
+    ).filter(
+        Connection.session_id == session_id, Connection.is_active == True, Connection.start_interval != None
+    ).all(), dtype=np.int64).reshape(-1, 2)
+    prompts = db.session.query(
+        InterviewPrompts.prompt_id, TopicLanguage.text, InterviewPrompts.start_interval, InterviewPrompts.end_interval
+    ).outerjoin(TopicLanguage, TopicLanguage.id == InterviewPrompts.prompt_id).filter(
+        InterviewPrompts.interview_id == session_id).order_by(InterviewPrompts.start_interval).all()
+    segments = np.array([(prompt.start_interval or 0, prompt.end_interval or 0) for prompt in prompts],
+                        dtype=np.int64).reshape(-1, 2)
+
+    # An annotation of a moment (where start equals end) covers the second it was made at
+    starts = annotations[:, 0]
+    ends = np.maximum(annotations[:, 1], starts + 1)
+    # Intervals are in seconds, and the recording is not read to find its length
+    duration = int(max(ends.max() if len(ends) else 0, segments[:, 1].max() if len(segments) else 0, 1))
+    width = -(-duration // bins)
+    num_bins = -(-duration // width)
+
+    # Difference array: +1 at the first bin each annotation covers and -1 after its last, then a running sum
+    first_bins, last_bins = starts // width, (ends - 1) // width
+    changes = np.bincount(first_bins, minlength=num_bins + 1) - np.bincount(last_bins + 1, minlength=num_bins + 1)
+    density = np.cumsum(changes)[:num_bins]
+
+    # Interval join of prompts x annotations, where an annotation overlaps a prompt if neither ends before the
+    # other starts, joined in chunks of annotations to bound the size of the (prompts x chunk) matrices
+    counts = np.zeros(len(segments), dtype=np.int64)
+    overlap = np.zeros(len(segments), dtype=np.int64)
+    for start in range(0, len(starts), INTERVAL_JOIN_CHUNK):
+        chunk_starts, chunk_ends = starts[start:start + INTERVAL_JOIN_CHUNK], ends[start:start + INTERVAL_JOIN_CHUNK]
+        seconds = np.minimum(segments[:, 1:], chunk_ends) - np.maximum(segments[:, :1], chunk_starts)
+        counts += (seconds > 0).sum(axis=1)
+        overlap += np.clip(seconds, 0, None).sum(axis=1)
+
+    # Topics may be discussed in several segments of the same session
+    topics = OrderedDict()
+    for prompt, segment, count, seconds in zip(prompts, segments.tolist(), counts.tolist(), overlap.tolist()):
+        topic = topics.setdefault(prompt.prompt_id, {
+            'topic_id': prompt.prompt_id, 'text': prompt.text, 'segments': [], 'duration': 0,
+            'annotations': 0, 'annotated_seconds': 0
+        })
+        topic['segments'].append(segment)
+        topic['duration'] += segment[1] - segment[0]
+        topic['annotations'] += count
+        topic['annotated_seconds'] += seconds
+
+    return {
+        'duration': duration,
+        'bin_width': int(width),
+        'annotations': len(starts),
+        'density': density.tolist(),
+        'topics': list(topics.values())
+    }
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+An in-process cache for the results of slow or rate limited calls to external APIs.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight(object):
+    """
+    A call to fetch the value of a key, which concurrent requests for the same key wait on.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Cache(object):
+    """
+    A thread-safe cache with a time to live (TTL) and least recently used (LRU) eviction.
+
+    Concurrent misses for the same key are coalesced so that only one call is made (single-flight),
+    and expired values are kept (until evicted) to be served when fetching a new value fails.
+    """
+    def __init__(self, ttl, max_size, wait_timeout=10, retry_after=30):
+        """
+        :param ttl: how long (seconds) a value is fresh.
+        :param max_size: the maximum number of keys, after which the least recently used key is evicted.
+        :param wait_timeout: how long (seconds) to wait for the value of an in-flight call.
+        :param retry_after: how long (seconds) an expired value is served without calling fetch after it failed.
+        """
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """
+        :return: a tuple of (the cached value or None, whether the value is fresh). Must hold the lock.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None, False
+        # Re-inserting the entry marks it as the most recently used
+        self._entries[key] = entry
+        value, expires = entry
+        return value, expires > time.time()
+
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key, fetch):
+        """
+        The value of the key, where fetch is called to get the value if it is not cached or has expired.
+
+        :param key: a hashable key, which should be normalized by the caller.
+        :param fetch: a function with no arguments that returns the value for the key.
+        :return: the fresh value, otherwise the expired value if fetch raises an exception.
+        :raises: the exception of fetch if there is no expired value to serve.
+        """
+        with self._lock:
+            value, fresh = self._lookup(key)
+            if fresh:
+                return value
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+
+        if not is_leader:
+            flight.done.wait(self.wait_timeout)
+            if flight.done.is_set() and flight.error is None:
+                return flight.value
+            if value is not None:
+                return value
+            raise flight.error or RuntimeError('Timed out waiting for %r' % (key,))
+
+        try:
+            flight.value = fetch()
+            self._store(key, flight.value, self.ttl)
+            return flight.value
+        except Exception as error:
+            flight.error = error
+            if value is not None:
+                # Back off from the failing API rather than calling it on every request
+                self._store(key, value, min(self.ttl, self.retry_after))
+                return value
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
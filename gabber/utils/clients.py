@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Lazily created clients for external services (S3, Elastic Transcoder, FCM, etc.)
+
+A client is created on first use rather than at import time, which keeps application startup fast
+and lets modules that use the clients be imported outside of an application context. Clients are
+shared by the threads of a process, but not across processes, as the connection pools of a client
+created before a (pre)fork must not be used by the workers.
+"""
+import os
+import threading
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get(name, factory):
+    """
+    The client of this process for the given name, which is created by calling factory if it does not exist.
+
+    :param name: a unique name for the client, e.g. 's3'
+    :param factory: a function with no arguments that creates the client.
+    """
+    key = (os.getpid(), name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def reset():
+    """
+    Removes all clients, e.g. after the configuration has changed.
+    """
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Events of annotations and comments created or deleted on a session, streamed to clients as
+server-sent events (see SessionEvents) rather than clients polling all annotations of a session.
+
+Events are written to the session_event table (an outbox) in the transaction of the change, hence an
+event is only published if the change is committed, and is seen by the streams of every process and
+pool of workers, which the database is the only broker shared by. Each process has one relay thread
+that reads new events once per POLL_INTERVAL while it has streams, and passes them to the queue of
+each stream of the event's session. Streams do not hold a connection to the database while idle.
+
+Events have increasing IDs, which clients send as Last-Event-ID when they reconnect, so that the
+events they missed are replayed from the table. Events are kept for RETENTION.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from .. import db
+from . import clients
+from ..models.projects import SessionEvent
+
+try:
+    from queue import Queue, Full, Empty
+except ImportError:
+    from Queue import Queue, Full, Empty
+
+# How often (seconds) the relay reads new events while there are streams
+POLL_INTERVAL = 1.0
+# The number of events a stream can be behind before it is ended, and the client reconnects to replay them
+QUEUE_SIZE = 256
+# The number of events replayed to a client that reconnects, beyond which it should fetch the session again
+REPLAY_LIMIT = 500
+RETENTION = timedelta(days=1)
+PRUNE_INTERVAL = 60 * 60
+# A transaction may commit an event after one with a higher ID was read, hence missing IDs are read
+# again until they appear or GAP_TIMEOUT (seconds) has passed, e.g. IDs of transactions that rolled back
+GAP_TIMEOUT = 30
+MAX_GAP = 1000
+# Threads of a worker that streams cannot hold, so that other requests are served and streams beyond
+# the limit are refused (503) rather than waiting for a thread
+RESERVED_THREADS = 4
+# The threads of a worker when not run by uWSGI, e.g. `flask run`
+DEFAULT_THREADS = 8
+
+
+def publish(session_id, event_type, data):
+    """
+    Adds an event to the current transaction, which is streamed to clients once committed.
+
+    :param event_type: one of the types of SessionEvent, e.g. SessionEvent.ANNOTATION_CREATED
+    :param data: the annotation or comment as serialized by the API, or a dictionary of its ID once deleted.
+    """
+    db.session.add(SessionEvent(session_id=session_id, type=event_type, data=json.dumps(data)))
+
+
+def max_streams(app):
+    """
+    The streams of this process: EVENTS_MAX_STREAMS, otherwise all but RESERVED_THREADS of the threads of the
+    worker (or half of them if it has few).
+    """
+    if app.config['EVENTS_MAX_STREAMS']:
+        return app.config['EVENTS_MAX_STREAMS']
+    try:
+        import uwsgi
+        threads = int(uwsgi.opt.get('threads', 1))
+    except ImportError:
+        threads = DEFAULT_THREADS
+    return max(threads // 2, threads - RESERVED_THREADS)
+
+
+def since(session_id, last_id, until, exclude=()):
+    """
+    The events of a session after an event that a client has seen, up to and including an event ID.
+
+    :param exclude: the IDs of events that the relay queues once they are committed (see Subscription.late)
+    :return: a list of events, or None if there are more than REPLAY_LIMIT.
+    """
+    criteria = [SessionEvent.session_id == session_id, SessionEvent.id > last_id, SessionEvent.id <= until]
+    if exclude:
+        criteria.append(~SessionEvent.id.in_(list(exclude)))
+    events = SessionEvent.query.filter(*criteria).order_by(SessionEvent.id).limit(REPLAY_LIMIT + 1).all()
+    return None if len(events) > REPLAY_LIMIT else events
+
+
+def format_event(event_id, event_type, data):
+    """
+    :param data: JSON
+    :return: an event of the stream as bytes
+    """
+    return ('id: %s\nevent: %s\ndata: %s\n\n' % (event_id, event_type, data)).encode('utf-8')
+
+
+class Subscription(object):
+    """
+    The queue of events of a session for one stream.
+    """
+    def __init__(self, session_id, cursor, late=frozenset()):
+        self.session_id = session_id
+        # The ID of the last event read before the stream subscribed, after which all events are queued
+        self.cursor = cursor
+        # The IDs up to the cursor that were not committed when the relay read them, which are queued
+        # rather than replayed if they are committed later
+        self.late = late
+        self.queue = Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except Full:
+            self.overflowed = True
+
+
+class Relay(object):
+    """
+    Reads new events from the table and passes them to the subscriptions of this process.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.num_subscriptions = 0
+        self.last_id = None
+        self.missing = {}
+        self.last_prune = 0
+        self.thread = None
+
+    def subscribe(self, session_id, max_subscriptions, last_event_id=None):
+        """
+        :param last_event_id: the ID of the last event the client received, if it reconnects
+        :return: a Subscription, or None if this process has max_subscriptions.
+        """
+        with self.lock:
+            if self.num_subscriptions >= max_subscriptions:
+                return None
+            if self.last_id is None:
+                self.last_id = db.session.query(db.func.coalesce(db.func.max(SessionEvent.id), 0)).scalar()
+                self.missing = {}
+            subscription = Subscription(session_id, self.last_id, frozenset(
+                event_id for event_id in self.missing if last_event_id is None or event_id > last_event_id))
+            self.subscriptions.setdefault(session_id, set()).add(subscription)
+            self.num_subscriptions += 1
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run)
+                self.thread.daemon = True
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.session_id, set())
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                self.num_subscriptions -= 1
+            if not subscriptions:
+                self.subscriptions.pop(subscription.session_id, None)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                time.sleep(POLL_INTERVAL)
+                with self.lock:
+                    # Events are not read while there are no streams; the next stream reads the latest ID again
+                    if not self.subscriptions:
+                        self.last_id, self.thread = None, None
+                        return
+                try:
+                    self._poll()
+                    if time.time() - self.last_prune > PRUNE_INTERVAL:
+                        self.last_prune = time.time()
+                        SessionEvent.query.filter(SessionEvent.created_on < datetime.now() - RETENTION).delete()
+                        db.session.commit()
+                except Exception:
+                    self.app.logger.exception('Reading session events failed')
+                    db.session.rollback()
+                finally:
+                    # Each read is its own transaction, so that events committed since the last read are seen
+                    db.session.remove()
+
+    def _poll(self):
+        condition = SessionEvent.id > self.last_id
+        if self.missing:
+            condition = db.or_(condition, SessionEvent.id.in_(list(self.missing)))
+        events = db.session.query(
+            SessionEvent.id, SessionEvent.session_id, SessionEvent.type, SessionEvent.data
+        ).filter(condition).order_by(SessionEvent.id).all()
+
+        now = time.time()
+        with self.lock:
+            for event in events:
+                self.missing.pop(event.id, None)
+                if event.id > self.last_id:
+                    if event.id - self.last_id <= MAX_GAP:
+                        self.missing.update((missing, now) for missing in range(self.last_id + 1, event.id))
+                    self.last_id = event.id
+                for subscription in self.subscriptions.get(event.session_id, ()):
+                    if event.id > subscription.cursor or event.id in subscription.late:
+                        subscription.put((event.id, event.type, event.data))
+            self.missing = dict((missing, seen) for missing, seen in self.missing.items()
+                                if now - seen < GAP_TIMEOUT)
+
+
+def relay(app):
+    return clients.get('events_relay', lambda: Relay(app))
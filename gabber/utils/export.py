@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of the sessions of a project with their prompts, participants, consents, annotations (with codes)
+and comments, for offline analysis by researchers.
+
+Sessions are read in chunks (keyset pagination over their ID) and the rows related to a chunk are read with
+one query per table, hence memory is bounded by the chunk size rather than the size of the project, and the
+number of queries by the number of chunks rather than the number of rows.
+
+Two formats are written:
+    ndjson: one JSON object per line, where "type" is the table, e.g. {"type": "sessions", "id": ...}
+    csv: a zip archive of one CSV file per table, where rows refer to each other by ID.
+"""
+import csv
+import json
+import sys
+import zipfile
+from collections import OrderedDict
+from sqlalchemy.orm import lazyload
+from tempfile import NamedTemporaryFile
+from .. import db
+from ..models.projects import InterviewSession, InterviewPrompts, InterviewParticipants, TopicLanguage, \
+    Connection, ConnectionComments, Code, codes_for_connections
+from ..models.user import SessionConsent
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('application/zip', 'zip')
+}
+
+# The columns of each table, in the order they are written
+TABLES = OrderedDict([
+    ('sessions', ['id', 'project_id', 'lang_id', 'creator_id', 'created_on', 'num_annotations']),
+    ('prompts', ['id', 'session_id', 'topic_id', 'topic', 'start_interval', 'end_interval']),
+    ('participants', ['id', 'session_id', 'user_id', 'role']),
+    ('consents', ['id', 'session_id', 'participant_id', 'type']),
+    ('annotations', ['id', 'session_id', 'user_id', 'content', 'start_interval', 'end_interval', 'codes',
+                     'created_on']),
+    ('comments', ['id', 'session_id', 'annotation_id', 'parent_id', 'user_id', 'content', 'created_on']),
+])
+
+CHUNK_SIZE = 100
+# The maximum number of values of an IN clause, e.g. SQLite limits statements to 999 parameters
+MAX_IN = 500
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _select_in(query, column, values):
+    """
+    Runs the query for each batch of values (see MAX_IN) and yields the rows of all batches.
+    """
+    for start in range(0, len(values), MAX_IN):
+        for row in query.filter(column.in_(values[start:start + MAX_IN])):
+            yield row
+
+
+def _group_by(rows, key):
+    groups = OrderedDict()
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    return groups
+
+
+class Visibility(object):
+    """
+    Which sessions of a project a user can view, following the rules of ProjectSessions.get
+    (see InterviewSession.all_consented_sessions_by_project), from rows that were read in bulk.
+    """
+    def __init__(self, project, user):
+        self.project = project
+        self.user_id = user.id if user else None
+        self.all_sessions = bool(user) and (
+            user.role_for_project(project.id) in ['administrator', 'researcher'] or project.creator == user.id)
+
+    def allows(self, session, participants):
+        if self.all_sessions:
+            return True
+        # Users can always access their own conversations, hence not necessary to check for embargo
+        if self.user_id in [participant.user_id for participant in participants]:
+            return True
+        return not session.embargoed() and session.consented(self.project.is_public)
+
+
+def records(project, user, chunk_size=CHUNK_SIZE, heartbeat=None):
+    """
+    The rows of the export that the user can view, where the rows of each session follow the session.
+
+    :param heartbeat: a function called before each chunk of sessions is read, e.g. to show the export runs
+
+    :return: a generator of (table, row as a dictionary) tuples, where table is a key of TABLES.
+    """
+    visibility = Visibility(project, user)
+    last_id = ''
+    while True:
+        if heartbeat:
+            heartbeat()
+        # Relationships are loaded in bulk below, rather than eagerly joined or lazily per session
+        sessions = InterviewSession.query.options(lazyload('*')).filter(
+            InterviewSession.project_id == project.id, InterviewSession.id > last_id
+        ).order_by(InterviewSession.id).limit(chunk_size).all()
+        if not sessions:
+            return
+        last_id = sessions[-1].id
+        ids = [session.id for session in sessions]
+
+        consents = _group_by(_select_in(
+            SessionConsent.query, SessionConsent.session_id, ids), lambda c: c.session_id)
+        participants = _group_by(_select_in(
+            InterviewParticipants.query.options(lazyload('*')), InterviewParticipants.interview_id, ids),
+            lambda p: p.interview_id)
+        sessions = [session for session in sessions
+                    if visibility.allows(session, participants.get(session.id, []))]
+        ids = [session.id for session in sessions]
+
+        prompts = _group_by(_select_in(
+            db.session.query(InterviewPrompts, TopicLanguage.text).options(lazyload('*')).outerjoin(
+                TopicLanguage, TopicLanguage.id == InterviewPrompts.prompt_id),
+            InterviewPrompts.interview_id, ids), lambda row: row[0].interview_id)
+        annotations = list(_select_in(
+            Connection.query.options(lazyload('*')).order_by(Connection.start_interval), Connection.session_id, ids))
+        annotation_ids = [annotation.id for annotation in annotations]
+        codes = _group_by(_select_in(
+            db.session.query(codes_for_connections.c.connection_id, Code.text).join(
+                Code, Code.id == codes_for_connections.c.code_id),
+            codes_for_connections.c.connection_id, annotation_ids), lambda row: row[0])
+        comments = _group_by(_select_in(
+            ConnectionComments.query.options(lazyload('*')).filter(
+                ConnectionComments.is_active == True).order_by(ConnectionComments.id),
+            ConnectionComments.connection_id, annotation_ids), lambda c: c.connection_id)
+        annotations = _group_by(annotations, lambda a: a.session_id)
+
+        for session in sessions:
+            yield 'sessions', {
+                'id': session.id,
+                'project_id': session.project_id,
+                'lang_id': session.lang_id,
+                'creator_id': session.creator_id,
+                'created_on': _isoformat(session.created_on),
+                'num_annotations': session.num_annotations
+            }
+            for prompt, topic in prompts.get(session.id, []):
+                yield 'prompts', {
+                    'id': prompt.id,
+                    'session_id': session.id,
+                    'topic_id': prompt.prompt_id,
+                    'topic': topic,
+                    'start_interval': prompt.start_interval,
+                    'end_interval': prompt.end_interval
+                }
+            for participant in participants.get(session.id, []):
+                yield 'participants', {
+                    'id': participant.id,
+                    'session_id': session.id,
+                    'user_id': participant.user_id,
+                    'role': 'interviewer' if participant.role else 'interviewee'
+                }
+            for consent in consents.get(session.id, []):
+                yield 'consents', {
+                    'id': consent.id,
+                    'session_id': session.id,
+                    'participant_id': consent.participant_id,
+                    'type': consent.type
+                }
+            for annotation in annotations.get(session.id, []):
+                yield 'annotations', {
+                    'id': annotation.id,
+                    'session_id': session.id,
+                    'user_id': annotation.user_id,
+                    'content': annotation.content,
+                    'start_interval': annotation.start_interval,
+                    'end_interval': annotation.end_interval,
+                    'codes': [text for _, text in codes.get(annotation.id, [])],
+                    'created_on': _isoformat(annotation.created_on)
+                }
+                for comment in comments.get(annotation.id, []):
+                    yield 'comments', {
+                        'id': comment.id,
+                        'session_id': session.id,
+                        'annotation_id': annotation.id,
+                        'parent_id': comment.parent_id,
+                        'user_id': comment.user_id,
+                        'content': comment.content,
+                        'created_on': _isoformat(comment.created_on)
+                    }
+        # Rows are not needed once written, which keeps the identity map (and memory) from growing
+        db.session.expunge_all()
+
+
+def ndjson(rows):
+    """
+    :return: a generator of the rows as lines of JSON (bytes)
+    """
+    for table, row in rows:
+        row['type'] = table
+        yield (json.dumps(row, sort_keys=True) + '\n').encode('utf-8')
+
+
+if sys.version_info[0] == 2:
+    from cStringIO import StringIO as _CsvBuffer
+
+    def _csv_value(value):
+        return value.encode('utf-8') if isinstance(value, unicode) else value  # noqa: F821
+else:
+    from io import StringIO as _CsvBuffer
+
+    def _csv_value(value):
+        return value
+
+
+def _csv_line(values):
+    """
+    A row of CSV as UTF-8 bytes (the csv module writes bytes in Python 2 and text in Python 3)
+    """
+    buffer = _CsvBuffer()
+    csv.writer(buffer).writerow([_csv_value(value) for value in values])
+    line = buffer.getvalue()
+    return line if isinstance(line, bytes) else line.encode('utf-8')
+
+
+def write_csv_zip(rows, output):
+    """
+    Writes the rows as a zip archive of one CSV file per table. Each table is written to a temporary
+    file on disk first, as the archive needs the complete file of a table before the next is added.
+
+    :param output: a seekable binary file to write the archive to.
+    """
+    files = OrderedDict((table, NamedTemporaryFile(suffix='.csv')) for table in TABLES)
+    try:
+        for table, columns in TABLES.items():
+            files[table].write(_csv_line(columns))
+        for table, row in rows:
+            if table == 'annotations':
+                row['codes'] = ';'.join(row['codes'])
+            files[table].write(_csv_line([row[column] for column in TABLES[table]]))
+
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for table, table_file in files.items():
+                table_file.flush()
+                archive.write(table_file.name, table + '.csv')
+    finally:
+        for table_file in files.values():
+            table_file.close()
+
+
+def write(rows, output, export_format):
+    """
+    Writes the rows to a binary file in the given format (a key of FORMATS).
+    """
+    if export_format == 'csv':
+        write_csv_zip(rows, output)
+    else:
+        for line in ndjson(rows):
+            output.write(line)
@@ -2,9 +2,9 @@
 """
 Handles sending notifications through Firebase Cloud Messaging
 """
-from pyfcm import FCMNotification
 from ...models.language import SupportedLanguage
 from ...models.projects import InterviewSession
+from .. import clients
 
 # Store these here while #Notifications is small
 locales = {
@@ -47,6 +47,17 @@ locales = {
 }
 
 
+def push_service():
+    """
+    The FCM client of this process, which is created on first use.
+    """
+    def create():
+        from flask import current_app as app
+        from pyfcm import FCMNotification
+        return FCMNotification(api_key=app.config['FCM_API_KEY'])
+    return clients.get('fcm', create)
+
+
 def notify_participants_user_commented(pid, sid):
     for participant in InterviewSession.query.get(sid).participants:
         if participant.user.fcm_token:
@@ -54,12 +65,9 @@ def notify_participants_user_commented(pid, sid):
 
 
 def notify_user_commented(user, pid, sid):
-    from flask import current_app as app
-
     content = locales[SupportedLanguage.query.get(user.lang).code]['commented']
-    push_service = FCMNotification(api_key=app.config['FCM_API_KEY'])
 
-    push_service.notify_single_device(
+    push_service().notify_single_device(
         registration_id=user.fcm_token,
         message_title=content['title'],
         message_body=content['body'],
@@ -1,4 +1,5 @@
-from flask import jsonify
+from flask import jsonify, json, stream_with_context, Response
+from itertools import islice
 from .. import jwt
 
 
@@ -45,3 +46,46 @@ def custom_response(status_code, data=None, errors=None):
     )
     response.status_code = status_code
     return response
+
+
+def keyset_chunks(query, column, chunk_size=100):
+    """
+    The rows of a query that is ordered by a unique column descending, fetched in chunks where each is
+    its own query of the rows after the last one (keyset pagination).
+
+    Note: yield_per cannot be used to stream rows whose serialization lazy-loads relations, as those queries
+    run while its cursor is open on the same connection, which drains the unbuffered cursor of MySQL.
+    """
+    last = None
+    while True:
+        chunk = (query if last is None else query.filter(column < last)).limit(chunk_size).all()
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        last = getattr(chunk[-1], column.key)
+
+
+def streamed_response(status_code, rows, dump, chunk_size=100, errors=None):
+    """
+    Creates the same response as custom_response for a list of data, but the rows are serialized
+    and written out in chunks so that the ORM objects, the dumped rows and the encoded payload are
+    never all held in memory at once.
+
+    :param rows: an iterable of the rows to serialize, e.g. a generator such as keyset_chunks.
+    :param dump: serializes a list of rows, e.g. Schema(many=True).dump
+    :param chunk_size: how many rows are serialized at a time.
+    """
+    meta = {"success": status_code in [200, 201, 204], "messages": errors or []}
+
+    def generate():
+        yield '{"data":['
+        rows_iter, separator = iter(rows), ''
+        chunk = list(islice(rows_iter, chunk_size))
+        while chunk:
+            yield separator + ','.join(json.dumps(item, separators=(',', ':')) for item in dump(chunk))
+            separator = ','
+            chunk = list(islice(rows_iter, chunk_size))
+        yield '],"meta":' + json.dumps(meta, separators=(',', ':')) + '}\n'
+
+    return Response(stream_with_context(generate()), status=status_code, mimetype='application/json')
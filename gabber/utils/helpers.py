@@ -2,9 +2,26 @@ from ..models.projects import Project
 from ..utils.general import CustomException
 from ..models.user import User
 from ..models.projects import InterviewSession, ConnectionComments
+from flask import g
 from flask_jwt_extended import get_jwt_identity
 
 
+def current_user():
+    """
+    The user of the JWT of the request, or None if there is no JWT or the user does not exist.
+
+    The user is kept on the application context, hence it is read once for all requests of a batch,
+    which share the application context (see api/batch.py).
+    """
+    email = get_jwt_identity()
+    if not email:
+        return None
+    cached = getattr(g, 'current_user', None)
+    if not cached or cached[0] != email:
+        cached = g.current_user = (email, User.query.filter_by(email=email).first())
+    return cached[1]
+
+
 def abort_if_not_admin_or_staff(user, project_id, action="UPDATE"):
     role = user.role_for_project(project_id)
     if not role or role == 'participant':
@@ -12,7 +29,7 @@ def abort_if_not_admin_or_staff(user, project_id, action="UPDATE"):
 
 
 def abort_on_unknown_project_id(pid):
-    if pid not in [p.id for p in Project.query.all()]:
+    if not Project.query.get(pid):
         raise CustomException(400, errors=['general.PROJECT_404'])
 
 
@@ -46,16 +63,34 @@ def abort_if_unknown_session(session):
         raise CustomException(401, errors=['general.SESSION_404'])
 
 
+def abort_if_session_not_viewable(user, project, session):
+    """
+    The same rules as viewing a session (see ProjectSession.get), for content derived from its recording.
+    """
+    is_participant = user and session.user_is_participant(user)
+    # In the first 24 hours of capturing a conversation only participants of the conversation can review it
+    if session.embargoed():
+        if not is_participant:
+            raise CustomException(400, errors=['general.EMBARGO'])
+        return
+    if user and (user.role_for_project(project.id) in ['administrator', 'researcher'] or
+                 project.creator == user.id or is_participant):
+        return
+    if not session.consented(project.is_public):
+        raise CustomException(404, errors=['general.SESSION_404'])
+
+
 def abort_if_unknown_user(user):
-    if not user or user.email.lower() not in [user.email.lower() for user in User.query.all()]:
+    if not user:
         raise CustomException(400, errors=['general.UNKNOWN_USER'])
 
 
 def abort_if_unknown_comment(cid, aid):
-    if cid not in [i.id for i in ConnectionComments.query.all()]:
+    comment = ConnectionComments.query.get(cid)
+    if not comment:
         raise CustomException(400, errors=['general.COMMENTS_404'])
 
-    if aid != ConnectionComments.query.get(cid).connection_id:
+    if aid != comment.connection_id:
         raise CustomException(400, errors=['general.COMMENTS_NOT_IN_SESSION'])
 
 
@@ -98,8 +133,7 @@ def abort_if_unauthorized(project):
         - GENERAL_UNKNOWN_USER
         - PROJECT_UNAUTHORIZED
     """
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(email=current_user).first()
+    user = current_user()
     abort_if_unknown_user(user)
     abort_on_unknown_project_id(project.id)
     abort_if_not_a_member_and_private(user, project)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Decodes, hashes and resizes the (base-64) images uploaded for projects.
+
+Images are stored by the SHA-256 of their content, which deduplicates identical uploads, alongside
+renditions that are sized for how clients show them, i.e. as thumbnails in lists and on project cards.
+"""
+import base64
+import binascii
+import hashlib
+from tempfile import SpooledTemporaryFile
+
+# The maximum (width, height) of each rendition, where the aspect ratio of the original is preserved.
+RENDITIONS = {
+    'thumb': (160, 160),
+    'card': (640, 400)
+}
+
+# Multiple of four so that each chunk of base-64 decodes independently
+CHUNK_SIZE = 4 * 16 * 1024
+# Images smaller than this are kept in memory, otherwise they are spooled to disk
+MAX_IN_MEMORY = 2 * 1024 * 1024
+
+
+def has_renditions(name):
+    """
+    Only content-addressed images (named by their SHA-256) have renditions; the default image and
+    images uploaded before renditions existed (named by a UUID) only have the original.
+    """
+    return bool(name) and len(name) == hashlib.sha256().digest_size * 2
+
+
+def rendition_name(name, rendition):
+    return '{}-{}'.format(name, rendition)
+
+
+def decode_base64(data):
+    """
+    Decodes base-64 data in chunks into a temporary file, hashing the content as it is written.
+
+    :param data: the base-64 encoded image, optionally as a data URL, e.g. data:image/jpeg;base64,...
+    :return: a tuple of (the decoded content as a file, the hex SHA-256 of the content)
+    :raises: ValueError if the data is not valid base-64
+    """
+    if data.startswith('data:'):
+        data = data.partition(',')[2]
+    # Whitespace (e.g. line breaks) would misalign the chunks
+    data = ''.join(data.split())
+
+    content, digest = SpooledTemporaryFile(max_size=MAX_IN_MEMORY), hashlib.sha256()
+    try:
+        for start in range(0, len(data), CHUNK_SIZE):
+            chunk = base64.b64decode(data[start:start + CHUNK_SIZE])
+            digest.update(chunk)
+            content.write(chunk)
+    except (TypeError, binascii.Error) as error:
+        content.close()
+        raise ValueError(str(error))
+    content.seek(0)
+    return content, digest.hexdigest()
+
+
+def renditions(content):
+    """
+    Resized copies of the image as JPEG.
+
+    :param content: the image as a file
+    :return: a tuple of (the MIME type of the original, dict of rendition name to a file of the rendition)
+    :raises: IOError if the content is not an image
+    """
+    from PIL import Image
+
+    image = Image.open(content)
+    mime_type = Image.MIME.get(image.format, 'application/octet-stream')
+    # Transparent and palette images cannot be saved as JPEG
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    resized = {}
+    for name, size in RENDITIONS.items():
+        copy = image.copy()
+        copy.thumbnail(size, Image.LANCZOS)
+        output = SpooledTemporaryFile(max_size=MAX_IN_MEMORY)
+        copy.save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+        output.seek(0)
+        resized[name] = output
+    content.seek(0)
+    return mime_type, resized
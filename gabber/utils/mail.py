@@ -95,9 +95,8 @@ class MailClient:
         content['subject'] = content['subject'].format(admin_name, self.brand)
         content['name'] = user.fullname
 
-        num_sessions = len(InterviewSession.query.filter_by(project_id=project.id).all())
         pl = ProjectLanguage.query.filter_by(project_id=project.id, lang_id=project.default_lang).first()
-        content['body'] = content['body'].format(pl.title, admin_name, num_sessions)
+        content['body'] = content['body'].format(pl.title, admin_name, project.num_sessions)
 
         content['footer'] = content['footer'].format(self.brand, self.contact)
         return content
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Changes to the projects a user can access since a cursor, so that clients that keep a copy of projects
+(i.e. the mobile app) download what changed rather than every project (see Projects.get).
+
+A cursor is the time of the database when changes were read. Rows created, updated or soft-deleted
+since OVERLAP before the cursor are returned, as a transaction may commit rows whose update time is
+before the cursor of a concurrent sync. Clients upsert rows by ID, hence rows returned twice are harmless.
+
+Rows that were soft-deleted, or projects the user can no longer access, are returned as tombstones,
+i.e. only their IDs in "deleted". Memberships are changed when accepted or deactivated (date_accepted).
+Tombstones of projects are only of those the user may have a copy of: projects the user is a member of
+(or whose membership changed since the cursor), and projects that stopped being public since the cursor.
+"""
+from datetime import datetime, timedelta
+from .. import db
+from ..models.projects import Project, ProjectLanguage, TopicLanguage, Membership, Roles, Codebook, Code
+
+CURSOR_FORMAT = '%Y%m%dT%H%M%S.%f'
+OVERLAP = timedelta(seconds=60)
+
+
+def parse_cursor(cursor):
+    """
+    :return: the time of the cursor, or None for an empty cursor, i.e. a sync of everything.
+    :raises: ValueError if the cursor is invalid.
+    """
+    return datetime.strptime(cursor, CURSOR_FORMAT) if cursor else None
+
+
+def _project(project):
+    from . import amazon
+    return {
+        'id': project.id,
+        'image': amazon.static_file_by_name(project.image, 'card'),
+        'privacy': 'public' if project.is_public else 'private',
+        'creator_id': project.creator,
+        'organisation_id': project.organisation,
+        'default_lang': project.default_lang,
+        'sessions': project.num_sessions
+    }
+
+
+def _member(membership, with_access):
+    """
+    The names and emails of members are shown following the rules of ProjectModelSchema._members.
+    """
+    member = {
+        'id': membership.id,
+        'project_id': membership.project_id,
+        'user_id': membership.user_id,
+        'role': membership.role.name
+    }
+    if with_access or membership.role.name == 'researcher':
+        member['fullname'] = membership.user.fullname
+        member['email'] = membership.user.email
+    return member
+
+
+def changes(user, since):
+    """
+    :param user: the user to sync projects for, or None for public projects only.
+    :param since: the time of the cursor (see parse_cursor)
+    :return: a dictionary of the changed rows of each table, the tombstones and the cursor of the next sync.
+    """
+    now = db.session.query(db.func.now()).scalar()
+    since = since - OVERLAP if since else None
+
+    def changed(column, query):
+        return query.filter(column >= since) if since else query
+
+    # The roles of the user by project (of which only confirmed ones are roles, as in User.role_for_project,
+    # while invited members can access the project), and the projects the user created
+    roles, confirmed_roles, creators = {}, {}, set()
+    access = Project.is_public == True
+    if user:
+        memberships = db.session.query(Membership.project_id, Membership.role_id, Membership.confirmed).filter(
+            Membership.user_id == user.id, Membership.deactivated == False).all()
+        roles = dict((row.project_id, row.role_id) for row in memberships)
+        confirmed_roles = dict((row.project_id, row.role_id) for row in memberships if row.confirmed)
+        creators = set(row.id for row in db.session.query(Project.id).filter(Project.creator == user.id))
+        if roles:
+            access = db.or_(access, Project.id.in_(list(roles)))
+    accessible = db.session.query(Project.id).filter(Project.is_active == True, access)
+    accessible_ids = set(row.id for row in accessible)
+    data = {'projects': [], 'content': [], 'topics': [], 'codes': [], 'members': []}
+    deleted = {'projects': [], 'topics': [], 'codes': [], 'members': []}
+
+    # Projects whose membership of the user changed, e.g. they joined or left, are changed for the user
+    member_of, left_or_joined = set(roles) | creators, set()
+    if user and since:
+        left_or_joined = set(row.project_id for row in db.session.query(Membership.project_id).filter(
+            Membership.user_id == user.id, Membership.date_accepted >= since))
+        member_of |= left_or_joined
+    visible = db.and_(Project.is_active == True, access)
+    if since:
+        visible = db.or_(visible, Project.unpublished_on >= since)
+        if member_of:
+            visible = db.or_(visible, Project.id.in_(list(member_of)))
+    projects = changed(Project.updated_on, db.session.query(Project).filter(visible)).all()
+    if left_or_joined:
+        projects += db.session.query(Project).filter(Project.id.in_(list(left_or_joined))).all()
+    for project in sorted(set(projects), key=lambda p: p.id, reverse=True):
+        if project.id in accessible_ids:
+            data['projects'].append(_project(project))
+        elif since:
+            deleted['projects'].append(project.id)
+
+    for content in changed(ProjectLanguage.updated_on, ProjectLanguage.query.filter(
+            ProjectLanguage.project_id.in_(accessible.subquery()))):
+        data['content'].append({
+            'id': content.id, 'project_id': content.project_id, 'lang_id': content.lang_id,
+            'title': content.title, 'description': content.description, 'slug': content.slug
+        })
+
+    for topic in changed(TopicLanguage.updated_on, TopicLanguage.query.filter(
+            TopicLanguage.project_id.in_(accessible.subquery()))):
+        if topic.is_active:
+            data['topics'].append({
+                'id': topic.id, 'project_id': topic.project_id, 'lang_id': topic.lang_id, 'text': topic.text
+            })
+        elif since:
+            deleted['topics'].append(topic.id)
+
+    for code, project_id in changed(Code.updated_on, db.session.query(Code, Codebook.project_id).join(
+            Codebook, Codebook.id == Code.codebook_id).filter(Codebook.project_id.in_(accessible.subquery()))):
+        if code.is_active:
+            data['codes'].append({
+                'id': code.id, 'project_id': project_id, 'codebook_id': code.codebook_id, 'text': code.text
+            })
+        elif since:
+            deleted['codes'].append(code.id)
+
+    # The names and emails of members are shown to administrators, researchers and the creator of a project
+    staff = set(role.id for role in Roles.query.filter(Roles.name.in_(['administrator', 'researcher'])))
+    for membership in changed(Membership.date_accepted, Membership.query.options(
+            db.joinedload(Membership.role), db.joinedload(Membership.user)).filter(
+            Membership.project_id.in_(accessible.subquery()))):
+        if not membership.deactivated:
+            with_access = confirmed_roles.get(membership.project_id) in staff or membership.project_id in creators
+            data['members'].append(_member(membership, with_access))
+        elif since:
+            deleted['members'].append(membership.id)
+
+    data['deleted'] = deleted
+    data['cursor'] = now.strftime(CURSOR_FORMAT)
+    return data
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed waveform peaks of session recordings, so that players can draw a waveform without the audio.
+
+A recording is decoded once (with ffmpeg) to mono PCM, from which the min/max of each block of samples
+is computed at multiple resolutions. Each level halves the resolution of the previous, and the peaks
+are stored as 8-bit integers in a binary sidecar next to the recording on S3:
+
+    header: magic (4 bytes), version, sample rate, samples per peak of the first level, number of levels
+    levels: the number of peaks of each level (uint32), followed by the peaks of each level as
+            interleaved min/max pairs (int8)
+
+All values are little-endian. The response of the API follows the JSON format of audiowaveform
+(https://github.com/bbc/audiowaveform), which peaks.js and other players can draw directly.
+"""
+import struct
+import subprocess
+import tempfile
+
+MAGIC = b'GWAV'
+VERSION = 1
+HEADER = struct.Struct('<4sHIIH')
+
+# The recording is decoded at a low sample rate as peaks do not need high frequencies
+SAMPLE_RATE = 8000
+# 31.25 peaks per second at the highest resolution
+SAMPLES_PER_PEAK = 256
+# Levels are halved until they would have fewer peaks than this
+MIN_PEAKS = 64
+
+
+def decode(recording):
+    """
+    Decodes a recording to mono 16-bit PCM at SAMPLE_RATE.
+
+    The recording is written to a temporary file, as MP4 files may store their index (moov atom)
+    at the end of the file, which ffmpeg cannot seek to when reading from a pipe.
+
+    :param recording: the recording as a file
+    :return: the samples as a NumPy array of int16
+    :raises: OSError if ffmpeg is not installed, subprocess.CalledProcessError if decoding failed.
+    """
+    import numpy as np
+
+    with tempfile.NamedTemporaryFile(suffix='.audio') as source:
+        recording.seek(0)
+        for chunk in iter(lambda: recording.read(64 * 1024), b''):
+            source.write(chunk)
+        source.flush()
+        recording.seek(0)
+        pcm = subprocess.check_output([
+            'ffmpeg', '-v', 'error', '-nostdin', '-i', source.name,
+            '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1'
+        ])
+    return np.frombuffer(pcm, dtype='<i2')
+
+
+def peaks(samples):
+    """
+    :param samples: int16 samples, e.g. from decode.
+    :return: a list of levels (highest resolution first), each an int8 array of shape (peaks, 2) of min/max.
+    """
+    import numpy as np
+
+    count = -(-len(samples) // SAMPLES_PER_PEAK)
+    # The last block is padded with silence so that all blocks are the same size
+    blocks = np.zeros(count * SAMPLES_PER_PEAK, dtype=np.int16)
+    blocks[:len(samples)] = samples
+    blocks = blocks.reshape(count, SAMPLES_PER_PEAK)
+    # Scale 16 to 8 bits: the arithmetic shift maps [-32768, 32767] to [-128, 127]
+    level = np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1) >> 8
+    level = level.astype(np.int8)
+
+    levels = [level]
+    while len(level) // 2 >= MIN_PEAKS:
+        # Each pair of peaks is merged, which is the same as computing the peaks of twice as many samples
+        if len(level) % 2:
+            level = np.concatenate([level, level[-1:]])
+        level = np.stack([
+            np.minimum(level[0::2, 0], level[1::2, 0]),
+            np.maximum(level[0::2, 1], level[1::2, 1])
+        ], axis=1)
+        levels.append(level)
+    return levels
+
+
+def encode(levels):
+    """
+    :return: the levels as the binary sidecar (see the module documentation).
+    """
+    header = HEADER.pack(MAGIC, VERSION, SAMPLE_RATE, SAMPLES_PER_PEAK, len(levels))
+    counts = struct.pack('<%iI' % len(levels), *[len(level) for level in levels])
+    return header + counts + b''.join(level.tobytes() for level in levels)
+
+
+def load(data):
+    """
+    The inverse of encode.
+
+    :return: a tuple of (sample rate, samples per peak of the first level, the levels)
+    :raises: ValueError if the data is not a waveform sidecar.
+    """
+    import numpy as np
+
+    if len(data) < HEADER.size:
+        raise ValueError('The waveform is truncated')
+    magic, version, sample_rate, samples_per_peak, num_levels = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Unsupported waveform (%r, version %i)' % (magic, version))
+    counts = struct.unpack_from('<%iI' % num_levels, data, HEADER.size)
+    offset = HEADER.size + 4 * num_levels
+    levels = []
+    for count in counts:
+        levels.append(np.frombuffer(data, dtype=np.int8, count=count * 2, offset=offset).reshape(count, 2))
+        offset += count * 2
+    return sample_rate, samples_per_peak, levels
+
+
+def view(sample_rate, samples_per_peak, levels, points):
+    """
+    Downsamples the waveform to (at most) the given number of peaks, as the JSON format of audiowaveform.
+
+    :param points: the number of min/max pairs, e.g. the width in pixels of the player.
+    """
+    import numpy as np
+
+    # The coarsest level that has enough peaks, where each level has half the peaks of the previous
+    index = 0
+    while index + 1 < len(levels) and len(levels[index + 1]) >= points:
+        index += 1
+    level = levels[index]
+
+    if len(level) > points:
+        starts = np.linspace(0, len(level), num=points, endpoint=False).astype(np.intp)
+        level = np.stack([np.minimum.reduceat(level[:, 0], starts), np.maximum.reduceat(level[:, 1], starts)], axis=1)
+        samples_per_pixel = samples_per_peak * (2 ** index) * len(levels[index]) // points
+    else:
+        samples_per_pixel = samples_per_peak * (2 ** index)
+
+    return {
+        'version': 2,
+        'channels': 1,
+        'sample_rate': sample_rate,
+        'samples_per_pixel': int(samples_per_pixel),
+        'bits': 8,
+        'length': len(level),
+        'data': level.ravel().tolist()
+    }
@@ -0,0 +1,40 @@
+"""composite indexes for the hottest access patterns
+
+Revision ID: 3f1c2a7d9e10
+Revises: 9b43170c92b7
+Create Date: 2026-10-19 07:02:15.412077
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9e10'
+down_revision = '9b43170c92b7'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns): the same indexes are declared on the models in __table_args__
+INDEXES = [
+    ('ix_connection_session_id_is_active', 'connection', ['session_id', 'is_active']),
+    ('ix_connection_comments_parent_id', 'connection_comments', ['parent_id']),
+    ('ix_connection_comments_connection_id_parent_id', 'connection_comments', ['connection_id', 'parent_id']),
+    ('ix_session_consent_session_id', 'session_consent', ['session_id']),
+    ('ix_interview_participants_interview_id_user_id', 'interview_participants', ['interview_id', 'user_id']),
+    ('ix_membership_user_id_project_id_deactivated', 'membership', ['user_id', 'project_id', 'deactivated']),
+    ('ix_membership_project_id_deactivated', 'membership', ['project_id', 'deactivated']),
+    ('ix_interview_session_project_id_created_on', 'interview_session', ['project_id', 'created_on']),
+    ('ix_topic_language_project_id', 'topic_language', ['project_id']),
+    ('ix_interview_prompts_interview_id', 'interview_prompts', ['interview_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,39 @@
+"""denormalized counters for sessions, annotations and comments
+
+Revision ID: 5a8e4c1b7d22
+Revises: 3f1c2a7d9e10
+Create Date: 2026-10-19 08:14:52.630918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a8e4c1b7d22'
+down_revision = '3f1c2a7d9e10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('project', sa.Column('num_sessions', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('interview_session', sa.Column('num_annotations', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('connection', sa.Column('num_comments', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the source tables; afterwards `flask counters repair` can be used to recompute them.
+    op.execute('UPDATE project SET num_sessions = ('
+               'SELECT COUNT(interview_session.id) FROM interview_session '
+               'WHERE interview_session.project_id = project.id)')
+    op.execute('UPDATE interview_session SET num_annotations = ('
+               'SELECT COUNT(connection.id) FROM connection '
+               'WHERE connection.session_id = interview_session.id AND connection.is_active = 1)')
+    op.execute('UPDATE connection SET num_comments = ('
+               'SELECT COUNT(connection_comments.id) FROM connection_comments '
+               'WHERE connection_comments.connection_id = connection.id AND connection_comments.is_active = 1)')
+
+
+def downgrade():
+    op.drop_column('connection', 'num_comments')
+    op.drop_column('interview_session', 'num_annotations')
+    op.drop_column('project', 'num_sessions')
@@ -0,0 +1,24 @@
+"""version of the membership claims embedded in JWTs
+
+Revision ID: 7c2d9f3a4b51
+Revises: 5a8e4c1b7d22
+Create Date: 2026-10-19 09:03:27.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d9f3a4b51'
+down_revision = '5a8e4c1b7d22'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('claims_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'claims_version')
@@ -0,0 +1,39 @@
+"""transcoder jobs of session recordings
+
+Revision ID: 8d4b2e6f1a93
+Revises: 7c2d9f3a4b51
+Create Date: 2026-10-19 10:12:45.903117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b2e6f1a93'
+down_revision = '7c2d9f3a4b51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'transcode_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=64), nullable=False),
+        sa.Column('session_id', sa.String(length=260), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('error', sa.String(length=255), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('updated_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['interview_session.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id'),
+        sa.UniqueConstraint('session_id')
+    )
+    op.create_index(op.f('ix_transcode_job_status'), 'transcode_job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_transcode_job_status'), table_name='transcode_job')
+    op.drop_table('transcode_job')
@@ -0,0 +1,36 @@
+"""index the time range of annotations
+
+Revision ID: a1e5c3f7b024
+Revises: 8d4b2e6f1a93
+Create Date: 2026-10-19 11:26:03.551879
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1e5c3f7b024'
+down_revision = '8d4b2e6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('interview_session',
+                  sa.Column('max_annotation_length', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        'UPDATE interview_session SET max_annotation_length = ('
+        'SELECT COALESCE(MAX(connection.end_interval - connection.start_interval), 0) '
+        'FROM connection WHERE connection.session_id = interview_session.id)'
+    )
+    # The new index has the same prefix, hence also serves the lookups of the index it replaces
+    op.create_index('ix_connection_session_id_is_active_intervals', 'connection',
+                    ['session_id', 'is_active', 'start_interval', 'end_interval'], unique=False)
+    op.drop_index('ix_connection_session_id_is_active', table_name='connection')
+
+
+def downgrade():
+    op.create_index('ix_connection_session_id_is_active', 'connection', ['session_id', 'is_active'], unique=False)
+    op.drop_index('ix_connection_session_id_is_active_intervals', table_name='connection')
+    op.drop_column('interview_session', 'max_annotation_length')
@@ -0,0 +1,34 @@
+"""uploads of session recordings directly to S3
+
+Revision ID: a6d4e1b8c327
+Revises: f3c7a2e9b516
+Create Date: 2026-10-19 19:40:12.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d4e1b8c327'
+down_revision = 'f3c7a2e9b516'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Batch mode recreates the table on SQLite, which cannot alter columns
+    with op.batch_alter_table('session_upload') as batch_op:
+        batch_op.add_column(sa.Column('recording_id', sa.String(length=260), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('multipart_upload_id', sa.String(length=1024), nullable=True))
+        batch_op.alter_column('sha256', existing_type=sa.String(length=64), nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM session_upload WHERE sha256 IS NULL")
+    with op.batch_alter_table('session_upload') as batch_op:
+        batch_op.alter_column('sha256', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_column('multipart_upload_id')
+        batch_op.drop_column('size')
+        batch_op.drop_column('recording_id')
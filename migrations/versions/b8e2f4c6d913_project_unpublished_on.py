@@ -0,0 +1,25 @@
+"""when projects stopped being public, for the tombstones of syncs
+
+Revision ID: b8e2f4c6d913
+Revises: a6d4e1b8c327
+Create Date: 2026-10-19 21:05:37.204816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4c6d913'
+down_revision = 'a6d4e1b8c327'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('project', sa.Column('unpublished_on', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('project') as batch_op:
+        batch_op.drop_column('unpublished_on')
@@ -0,0 +1,49 @@
+"""materialized visibility of sessions
+
+Revision ID: c4a8e2f6b193
+Revises: b7f2d4a9c316
+Create Date: 2026-10-19 14:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f6b193'
+down_revision = 'b7f2d4a9c316'
+branch_labels = None
+depends_on = None
+
+# The end of the embargo (24 hours after capture) by dialect, as date arithmetic is not standard SQL
+EMBARGO = {
+    'mysql': 'DATE_ADD(created_on, INTERVAL 24 HOUR)',
+    'sqlite': "datetime(created_on, '+24 hours')",
+    'postgresql': "created_on + INTERVAL '24 hours'",
+}
+
+
+def upgrade():
+    op.add_column('interview_session', sa.Column('visibility', sa.String(length=16), server_default='private',
+                                                 nullable=False))
+    op.add_column('interview_session', sa.Column('embargoed_until', sa.DateTime(), nullable=True))
+    op.create_index('ix_interview_session_project_id_visibility', 'interview_session',
+                    ['project_id', 'visibility', 'embargoed_until'], unique=False)
+
+    # Backfill from the consents; afterwards `flask counters repair` can be used to recompute them.
+    op.execute("UPDATE interview_session SET visibility = CASE "
+               "WHEN EXISTS (SELECT 1 FROM session_consent WHERE session_consent.session_id = interview_session.id "
+               "AND session_consent.type = 'private') THEN 'private' "
+               "WHEN EXISTS (SELECT 1 FROM session_consent WHERE session_consent.session_id = interview_session.id) "
+               "AND NOT EXISTS (SELECT 1 FROM session_consent WHERE session_consent.session_id = interview_session.id "
+               "AND (session_consent.type != 'public' OR session_consent.type IS NULL)) THEN 'public' "
+               "ELSE 'members' END")
+    embargo = EMBARGO.get(op.get_bind().dialect.name)
+    if embargo:
+        op.execute('UPDATE interview_session SET embargoed_until = %s' % embargo)
+
+
+def downgrade():
+    op.drop_index('ix_interview_session_project_id_visibility', table_name='interview_session')
+    op.drop_column('interview_session', 'embargoed_until')
+    op.drop_column('interview_session', 'visibility')
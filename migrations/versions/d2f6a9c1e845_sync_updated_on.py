@@ -0,0 +1,29 @@
+"""update times of project content, topics and codes to sync changes
+
+Revision ID: d2f6a9c1e845
+Revises: c4a8e2f6b193
+Create Date: 2026-10-19 15:21:09.364827
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f6a9c1e845'
+down_revision = 'c4a8e2f6b193'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows have no update time, hence they are only synced by a sync of everything (an empty cursor)
+    op.add_column('project_language', sa.Column('updated_on', sa.DateTime(), nullable=True))
+    op.add_column('topic_language', sa.Column('updated_on', sa.DateTime(), nullable=True))
+    op.add_column('code', sa.Column('updated_on', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('code', 'updated_on')
+    op.drop_column('topic_language', 'updated_on')
+    op.drop_column('project_language', 'updated_on')
@@ -0,0 +1,37 @@
+"""events of annotations and comments on sessions, streamed to clients
+
+Revision ID: e8b3c5d1f702
+Revises: d2f6a9c1e845
+Create Date: 2026-10-19 16:02:41.518207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3c5d1f702'
+down_revision = 'd2f6a9c1e845'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'session_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(length=260), nullable=False),
+        sa.Column('type', sa.String(length=32), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['interview_session.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_session_event_session_id_id', 'session_event', ['session_id', 'id'], unique=False)
+    op.create_index(op.f('ix_session_event_created_on'), 'session_event', ['created_on'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_session_event_created_on'), table_name='session_event')
+    op.drop_index('ix_session_event_session_id_id', table_name='session_event')
+    op.drop_table('session_event')
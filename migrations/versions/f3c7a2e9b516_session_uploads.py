@@ -0,0 +1,40 @@
+"""claims on uploads of session recordings, to deduplicate retries
+
+Revision ID: f3c7a2e9b516
+Revises: e8b3c5d1f702
+Create Date: 2026-10-19 17:12:05.940318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c7a2e9b516'
+down_revision = 'e8b3c5d1f702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'session_upload',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=255), nullable=True),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('session_id', sa.String(length=260), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+        sa.ForeignKeyConstraint(['session_id'], ['interview_session.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'idempotency_key', name='uq_session_upload_user_id_idempotency_key'),
+        sa.UniqueConstraint('user_id', 'project_id', 'sha256', name='uq_session_upload_user_id_project_id_sha256')
+    )
+
+
+def downgrade():
+    op.drop_table('session_upload')